@@ -0,0 +1,420 @@
+import asyncio
+import contextvars
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from flask import g, has_request_context, jsonify, request
+
+import authClaims
+import metrics
+import resilience
+
+# Admission control: per-client rate limits and a cap on concurrent upstream calls.
+# Every request takes a token from the bucket for (route, client) before it runs; a client is the
+# token subject when the request is authenticated, otherwise its IP address. A client that has
+# used up its bucket gets 429 with Retry-After until a token refills, so one client flooding a heavy
+# route can't spend the Supabase quota every other tenant shares.
+# Separately, at most UPSTREAM_MAX_CONCURRENCY data backend calls run at once per process; a call
+# that can't get a slot within UPSTREAM_QUEUE_TIMEOUT seconds fails and the request answers 503.
+# Background jobs wait for a slot instead of failing.
+#
+#   RATE_LIMIT_ENABLED=1                       0 turns rate limiting off
+#   RATE_LIMIT_DEFAULT=20:40                   requests per second : burst, for routes not in ROUTE_LIMITS
+#   RATE_LIMIT_<ENDPOINT>=rate:burst           per route override, e.g. RATE_LIMIT_GET_ALL_PROJECTS=1:5
+#                                              ("off" exempts the route)
+#   RATE_LIMIT_STORE=memory (default) | sqlite | redis
+#   RATE_LIMIT_DB_PATH=ratelimit.sqlite3       the sqlite store's file, shared by every worker process
+#   RATE_LIMIT_REDIS_URL=redis://localhost:6379/0
+#   RATE_LIMIT_TRUST_PROXY=0                   1 to key anonymous clients on X-Forwarded-For
+#   UPSTREAM_MAX_CONCURRENCY=32                0 for no cap
+#   UPSTREAM_QUEUE_TIMEOUT=2
+#
+# The memory store is per process, so with N workers a client gets up to N times its limit; the
+# sqlite and redis stores share one bucket per client across all of them.
+
+ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "1") not in ("0", "false", "no")
+STORE = os.environ.get("RATE_LIMIT_STORE", "memory").lower()
+DB_PATH = os.environ.get("RATE_LIMIT_DB_PATH", "ratelimit.sqlite3")
+REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+TRUST_PROXY = os.environ.get("RATE_LIMIT_TRUST_PROXY", "0") not in ("0", "false", "no")
+UPSTREAM_MAX_CONCURRENCY = int(os.environ.get("UPSTREAM_MAX_CONCURRENCY", 32))
+UPSTREAM_QUEUE_TIMEOUT = float(os.environ.get("UPSTREAM_QUEUE_TIMEOUT", 2))
+
+# Requests per second and burst for routes that fan out to many rows or upstream calls. The list
+# routes' bursts fit the frontend's cursor walk (fetchAllPages, at PAGE_SIZE_MAX rows a page) over
+# a tenant of up to 10 000 rows in one screen load
+ROUTE_LIMITS = {
+    "get_all_projects": (2, 10),
+    "get_all_companies": (2, 10),
+    "add_users_to_project": (0.5, 5),
+    "bulk_import": (0.1, 2),
+    "export_table": (0.2, 3),
+    "company_dashboard": (2, 10),
+}
+
+# Never limited: the frontend bundle, preflights, the scrape endpoint and the health probes
+EXEMPT_ENDPOINTS = {"home", "frontend", "prometheus_metrics", "healthz", "readyz"}
+
+# Bucket entries kept by the memory store before full (idle) buckets are dropped
+MAX_MEMORY_KEYS = 100_000
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class UpstreamBusy(resilience.NotSent):
+    # No upstream slot came free in time; answered with 503
+    def __init__(self, retry_after):
+        super().__init__("Too many upstream calls in flight")
+        self.retry_after = retry_after
+
+
+def _parse_limit(value):
+    if value.strip().lower() in ("off", "0", "none"):
+        return None
+    rate, _, burst = value.partition(":")
+    rate = float(rate)
+    return rate, float(burst) if burst else max(rate, 1.0)
+
+
+def _limits_from_env():
+    default = _parse_limit(os.environ.get("RATE_LIMIT_DEFAULT", "20:40"))
+    limits = dict(ROUTE_LIMITS)
+    for name, value in os.environ.items():
+        if name.startswith("RATE_LIMIT_") and name[len("RATE_LIMIT_"):].lower() not in (
+                "enabled", "default", "store", "db_path", "redis_url", "trust_proxy"):
+            limits[name[len("RATE_LIMIT_"):].lower()] = _parse_limit(value)
+    return default, limits
+
+
+DEFAULT_LIMIT, LIMITS = _limits_from_env()
+
+
+def limit_for(endpoint):
+    # (rate, burst) or None for unlimited
+    if endpoint is None or endpoint in EXEMPT_ENDPOINTS:
+        return None
+    return LIMITS.get(endpoint, DEFAULT_LIMIT)
+
+
+def _refill(tokens, stamp, now, rate, burst):
+    return min(burst, tokens + (now - stamp) * rate)
+
+
+def _verdict(tokens, rate):
+    # (allowed, seconds until the next token) for a bucket already refilled to `tokens`
+    if tokens >= 1:
+        return True, 0.0
+    return False, (1 - tokens) / rate
+
+
+class MemoryBuckets:
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, stamp, seconds to refill completely)
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp, _ = self._buckets.get(key, (burst, now, 0))
+            tokens = _refill(tokens, stamp, now, rate, burst)
+            allowed, retry_after = _verdict(tokens, rate)
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now, burst / rate)
+            if len(self._buckets) > MAX_MEMORY_KEYS:
+                self._prune(now)
+            return allowed, retry_after
+
+    def _prune(self, now):
+        # A bucket idle long enough to have refilled completely holds no state worth keeping
+        for key in [k for k, (_, stamp, full) in self._buckets.items() if now - stamp >= full]:
+            del self._buckets[key]
+
+
+class SqliteBuckets:
+    SCHEMA = "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, stamp REAL NOT NULL)"
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        # One connection per process; a forked worker must not reuse its parent's
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(self.SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def take(self, key, rate, burst):
+        # Wall-clock time: the stamps are compared across processes
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, stamp FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = burst if row is None else _refill(row[0], row[1], now, rate, burst)
+                allowed, retry_after = _verdict(tokens, rate)
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, stamp) VALUES (?, ?, ?)",
+                    (key, tokens - 1 if allowed else tokens, now),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return allowed, retry_after
+
+
+class RedisBuckets:
+    # Any Redis-protocol server (Redis, Valkey, KeyDB); the refill-and-take runs atomically server-side
+    SCRIPT = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local tokens = tonumber(bucket[1]) or burst
+    local stamp = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + (now - stamp) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'stamp', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url=REDIS_URL):
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_STORE=redis needs the redis package")
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst):
+        allowed, tokens = self._take(keys=[f"ratelimit:{key}"], args=[rate, burst, time.time()])
+        if allowed:
+            return True, 0.0
+        return _verdict(float(tokens), rate)
+
+
+def create_store():
+    if STORE == "memory":
+        return MemoryBuckets()
+    if STORE == "sqlite":
+        return SqliteBuckets()
+    if STORE == "redis":
+        return RedisBuckets()
+    raise ValueError(f"Unknown RATE_LIMIT_STORE: {STORE}")
+
+
+buckets = create_store()
+
+shed_total = metrics.registry.register(metrics.Counter(
+    "admission_shed_total", "Requests turned away, by endpoint and reason.", ("endpoint", "reason")))
+
+
+def check(endpoint, client):
+    # Returns seconds to wait before retrying, or None if the request may proceed
+    if not ENABLED:
+        return None
+    limit = limit_for(endpoint)
+    if limit is None:
+        return None
+    allowed, retry_after = buckets.take(f"{endpoint}:{client}", *limit)
+    return None if allowed else retry_after
+
+
+def _retry_after(seconds):
+    return str(max(1, math.ceil(seconds)))
+
+
+# -- upstream concurrency cap ----------------------------------------------
+
+# Per process, like the Supabase client: a semaphore inherited mid-acquire across a fork stays taken
+_slots = None
+_slots_pid = None
+_slots_lock = threading.Lock()
+
+
+def _semaphore():
+    global _slots, _slots_pid
+    pid = os.getpid()
+    if _slots is None or _slots_pid != pid:
+        with _slots_lock:
+            if _slots is None or _slots_pid != pid:
+                _slots = threading.BoundedSemaphore(UPSTREAM_MAX_CONCURRENCY)
+                _slots_pid = pid
+    return _slots
+
+
+# Set by AdmissionMiddleware for native ASGI requests: a list a shed upstream call appends to
+_async_shed = contextvars.ContextVar("admission_async_shed", default=None)
+
+
+def _shed_upstream():
+    if has_request_context():
+        g.upstream_shed = True
+    marks = _async_shed.get()
+    if marks is not None:
+        marks.append(True)
+    return UpstreamBusy(UPSTREAM_QUEUE_TIMEOUT)
+
+
+@contextmanager
+def upstream_slot():
+    if UPSTREAM_MAX_CONCURRENCY <= 0:
+        yield
+        return
+    slots = _semaphore()
+    # Request handlers give up after the queue timeout; background work just waits its turn
+    timeout = UPSTREAM_QUEUE_TIMEOUT if has_request_context() else None
+    if not slots.acquire(timeout=timeout):
+        raise _shed_upstream()
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+@asynccontextmanager
+async def upstream_slot_async():
+    # Same cap for the async client; polls instead of blocking so the event loop keeps running
+    if UPSTREAM_MAX_CONCURRENCY <= 0:
+        yield
+        return
+    slots = _semaphore()
+    deadline = time.monotonic() + UPSTREAM_QUEUE_TIMEOUT
+    while not slots.acquire(blocking=False):
+        if time.monotonic() >= deadline:
+            raise _shed_upstream()
+        await asyncio.sleep(0.005)
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+# -- Flask --------------------------------------------------------------------
+
+def client_key(remote_addr, forwarded_for, principal):
+    if principal is not None:
+        return f"sub:{principal.subject}"
+    if TRUST_PROXY and forwarded_for:
+        return f"ip:{forwarded_for.split(',')[0].strip()}"
+    return f"ip:{remote_addr}"
+
+
+def _too_many(retry_after):
+    response = jsonify({"error": "Too many requests, retry later"})
+    response.status_code = 429
+    response.headers["Retry-After"] = _retry_after(retry_after)
+    return response
+
+
+def _busy():
+    response = jsonify({"error": "Server busy, retry later"})
+    response.status_code = 503
+    response.headers["Retry-After"] = _retry_after(UPSTREAM_QUEUE_TIMEOUT)
+    return response
+
+
+def init_app(app):
+    # Register after authClaims.init_app so authenticated callers are keyed on their token subject
+    @app.before_request
+    def _admit():
+        if request.method == "OPTIONS":
+            return None
+        key = client_key(request.remote_addr, request.headers.get("X-Forwarded-For"), authClaims.current_principal())
+        retry_after = check(request.endpoint, key)
+        if retry_after is None:
+            return None
+        shed_total.inc(request.endpoint, "rate_limited")
+        return _too_many(retry_after)
+
+    @app.errorhandler(UpstreamBusy)
+    def _upstream_busy(e):
+        return _busy()
+
+    @app.after_request
+    def _shed(response):
+        # Routes catch their own exceptions and answer 500; a 500 caused by a shed upstream call is
+        # load being turned away, which the client should retry
+        if g.get("upstream_shed") and response.status_code >= 500:
+            shed_total.inc(request.endpoint or "unmatched", "upstream_busy")
+            return _busy()
+        return response
+
+
+# -- ASGI ---------------------------------------------------------------------
+
+def _asgi_json(payload, status_code, retry_after):
+    from starlette.responses import JSONResponse
+    headers = {"Retry-After": _retry_after(retry_after), "Access-Control-Allow-Origin": "*"}
+    return JSONResponse(payload, status_code=status_code, headers=headers)
+
+
+class AdmissionMiddleware:
+    # asyncApp's native routes get the same buckets and the same 503 for shed upstream calls
+    # (the mounted Flask app handles both itself)
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    def _endpoint(self, scope):
+        from starlette.routing import Match, Route
+        for route in self.routes:
+            if isinstance(route, Route) and route.matches(scope)[0] == Match.FULL:
+                return route.name
+        return None
+
+    def _client(self, scope):
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        principal = None
+        authorization = headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            try:
+                principal = authClaims.Principal(authClaims.verify_token(authorization[7:].strip())["sub"])
+            except authClaims.TokenError:
+                pass  # the route answers 401 itself
+        client = scope.get("client")
+        return client_key(client[0] if client else None, headers.get("x-forwarded-for"), principal)
+
+    async def __call__(self, scope, receive, send):
+        endpoint = self._endpoint(scope) if scope["type"] == "http" and scope["method"] != "OPTIONS" else None
+        if endpoint is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = self._client(scope)
+        # The shared stores do blocking I/O; keep it off the event loop
+        retry_after = check(endpoint, key) if STORE == "memory" else await asyncio.to_thread(check, endpoint, key)
+        if retry_after is not None:
+            shed_total.inc(endpoint, "rate_limited")
+            await _asgi_json({"error": "Too many requests, retry later"}, 429, retry_after)(scope, receive, send)
+            return
+
+        marks = []
+        _async_shed.set(marks)
+        replaced = False
+
+        async def send_or_shed(message):
+            nonlocal replaced
+            if message["type"] == "http.response.start" and marks and message["status"] >= 500:
+                replaced = True
+                shed_total.inc(endpoint, "upstream_busy")
+                busy = _asgi_json({"error": "Server busy, retry later"}, 503, UPSTREAM_QUEUE_TIMEOUT)
+                await busy(scope, receive, send)
+                return
+            if not replaced:
+                await send(message)
+
+        await self.app(scope, receive, send_or_shed)
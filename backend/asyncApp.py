@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import os
+import uuid
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import admission
+import authClaims
+import dashboard
+import jsonProvider
+import metrics
+import readiness
+import resilience
+import singleFlight
+import structuredLog
+import main
+import supabaseInit
+from conditional import DEFAULT_CACHE_CONTROL, etag_for, etag_matches
+from compression import CompressionMiddleware
+from commentStream import STREAM_HEADERS, async_events, broker, parse_last_event_id
+from fieldsets import FieldsetError, select_fields
+from main import STREAM_BACKLOG_LIMIT, app as flask_app
+from pagination import PaginationError, page_params, paginate_async
+from upstream import UpstreamClient
+
+# ASGI serving mode: `uvicorn asyncApp:app --port 8080`
+# Routes that wait on several upstream calls are served natively on the async Supabase client,
+# so a single process keeps hundreds of requests in flight while they wait on Supabase.
+# Every other route is handed to the Flask app unchanged, on a pool of WSGI_WORKERS threads.
+#
+#   WSGI_WORKERS=40   Flask requests in flight at once (what starlette's WSGI bridge allowed)
+
+WSGI_WORKERS = int(os.environ.get("WSGI_WORKERS", 40))
+
+logger = logging.getLogger(__name__)
+
+supabaseClient = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global supabaseClient
+    structuredLog.configure()
+    try:
+        seconds = await asyncio.to_thread(readiness.state.warm_up)
+        logger.info("Upstream connection warmed up in %.3fs", seconds)
+    except Exception as e:
+        # /readyz stays 503 and keeps checking until the upstream answers
+        logger.warning("Upstream warm-up failed: %s", e)
+    supabaseClient = UpstreamClient(await supabaseInit.create_async_supabase())
+    main.jobs.resume()
+    yield
+
+
+class FastJSONResponse(JSONResponse):
+    # Same encoder (and bytes) as the Flask app's jsonify
+    def render(self, content):
+        return jsonProvider.dumps_bytes(content)
+
+
+def _json(payload, status_code=200):
+    # Flask-CORS covers the mounted app; native routes add the same header themselves
+    return FastJSONResponse(payload, status_code=status_code, headers={"Access-Control-Allow-Origin": "*"})
+
+
+def _conditional(request, response):
+    # Same ETag / 304 handling as conditional.conditional_get for the Flask routes
+    if response.status_code != 200:
+        return response
+    etag = etag_for(response.body)
+    headers = {"ETag": etag, "Cache-Control": DEFAULT_CACHE_CONTROL, "Access-Control-Allow-Origin": "*"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
+
+
+async def _principal(request):
+    # Same token handling as authClaims' Flask middleware; the permission lookup (if the token
+    # doesn't carry one and it isn't cached) runs on a worker thread
+    header = request.headers.get("authorization", "")
+    if not header.lower().startswith("bearer "):
+        return None
+    claims = authClaims.verify_token(header[7:].strip())
+    return await asyncio.to_thread(authClaims.principal_from_claims, claims, main.supabaseClient)
+
+
+async def get_staff(request):
+    try:
+        user_id = request.query_params.get('user_id')
+        company_name = request.query_params.get('company_name')
+        header = request.headers.get("authorization", "")
+
+        def staff_query():
+            return supabaseClient.table("users").select("id", "name", "company").eq("company_name", company_name).execute()
+
+        # The caller's permission lookup and the staff query don't depend on each other, so they run
+        # together; the staff rows are only sent once the caller is known to be an admin of the company
+        if header.lower().startswith("bearer "):
+            if not company_name:
+                return _json({"error": "Company name is required"}, 400)
+            try:
+                claims = authClaims.verify_token(header[7:].strip())
+            except authClaims.TokenError as e:
+                return _json({"error": f"Invalid access token: {e}"}, 401)
+            principal, staff_response = await asyncio.gather(
+                asyncio.to_thread(authClaims.principal_from_claims, claims, main.supabaseClient),
+                staff_query(),
+            )
+            role, user_company = principal.role, principal.company
+        else:
+            if not user_id or not company_name:
+                return _json({"error": "User ID and company name are required"}, 400)
+
+            try:
+                user_uuid = uuid.UUID(user_id)
+            except ValueError:
+                return _json({"error": "Invalid User ID format. Must be a valid UUID."}, 400)
+
+            user_response, staff_response = await asyncio.gather(
+                supabaseClient.table("users").select("role", "company_name").eq("id", str(user_uuid)).execute(),
+                staff_query(),
+            )
+
+            if not user_response.data:
+                return _json({"error": "User not found"}, 404)
+
+            role, user_company = user_response.data[0]["role"], user_response.data[0]["company_name"]
+
+        if role != 'admin' or company_name != user_company:
+            return _json({"error": "You are not authorized to view this staff data"}, 403)
+
+        if not staff_response.data:
+            return _json({"error": "No staff found for this company"}, 404)
+
+        return _json({"staff": staff_response.data})
+
+    except Exception as e:
+        return _json({"error": str(e)}, 500)
+
+
+async def get_comments_by_project(request):
+    try:
+        limit, after = page_params(request.query_params)
+        columns = select_fields("comments", request.query_params, required=("id", "userAuthId"))
+    except (PaginationError, FieldsetError) as e:
+        return _json({"error": str(e)}, 400)
+
+    async def load():
+        query = supabaseClient.table("comments").select(columns).eq("projectId", request.query_params.get('project_id'))
+        comments, next_cursor = await paginate_async(query, limit, after)
+        if not comments:
+            return {"comments": [], "next_cursor": None}
+        # Names depend on which users commented, so this lookup has to follow the page fetch
+        return {"comments": await attach_user_names(comments), "next_cursor": next_cursor}
+
+    try:
+        # Identical concurrent reads share one set of upstream calls (see singleFlight.py)
+        key = singleFlight.request_key("get_comments_by_project", {}, request.query_params.multi_items())
+        if singleFlight.ENABLED:
+            payload, shared = await singleFlight.async_flights.do_async(key, load)
+            singleFlight.requests_total.inc("get_comments_by_project", "follower" if shared else "leader")
+        else:
+            payload = await load()
+        return _conditional(request, _json(payload))
+
+    except Exception as e:
+        return _json({"error": str(e)}, 500)
+
+
+async def attach_user_names(comments):
+    user_ids = list({comment["userAuthId"] for comment in comments})
+    users_response = await supabaseClient.table("users").select("authId, name").in_("authId", user_ids).execute()
+    user_dict = {user["authId"]: user["name"] for user in users_response.data}
+
+    for comment in comments:
+        comment["userName"] = user_dict.get(comment["userAuthId"], "Unknown")
+    return comments
+
+
+async def stream_project_comments(request):
+    # Same contract as the Flask route; here an idle watcher is a parked coroutine, not a thread
+    project_id = request.path_params["project_id"]
+    subscription = broker.subscribe(project_id, loop=asyncio.get_running_loop())
+
+    backlog = []
+    last_event_id = parse_last_event_id(request.headers.get("last-event-id"))
+    if last_event_id is not None:
+        try:
+            response = await supabaseClient.table("comments").select("*").eq("projectId", project_id) \
+                .gt("id", last_event_id).order("id").limit(STREAM_BACKLOG_LIMIT).execute()
+            backlog = response.data
+            if backlog:
+                await attach_user_names(backlog)
+        except Exception as e:
+            broker.unsubscribe(subscription)
+            return _json({"error": str(e)}, 500)
+
+    headers = dict(STREAM_HEADERS, **{"Access-Control-Allow-Origin": "*"})
+    return StreamingResponse(async_events(subscription, backlog), media_type="text/event-stream", headers=headers)
+
+
+async def company_dashboard(request):
+    company = request.path_params["company"]
+    try:
+        principal = await _principal(request)
+    except authClaims.TokenError as e:
+        return _json({"error": f"Invalid access token: {e}"}, 401)
+    except Exception as e:
+        return _json({"error": str(e)}, 500)  # the permission lookup failed; see ResilienceMiddleware
+    if principal is not None and not principal.is_admin and principal.company != company:
+        return _json({"error": "You are not authorized to view this company"}, 403)
+
+    try:
+        limit, _ = page_params(request.query_params)
+    except PaginationError as e:
+        return _json({"error": str(e)}, 400)
+
+    try:
+        # Members load alongside the projects (and their counts)
+        (projects, projects_next), (members, members_next) = await asyncio.gather(
+            paginate_async(dashboard.projects_query(supabaseClient, company), limit),
+            paginate_async(dashboard.members_query(supabaseClient, company), limit),
+        )
+        payload = dashboard.document(company, projects, projects_next, members, members_next)
+        return _conditional(request, _json(payload))
+
+    except Exception as e:
+        return _json({"error": str(e)}, 500)
+
+
+routes = [
+    Route("/getStaff", get_staff, methods=["GET"]),
+    Route("/getCommentsByProject", get_comments_by_project, methods=["GET"]),
+    Route("/dashboard/{company}", company_dashboard, methods=["GET"]),
+    Route("/projects/{project_id}/comments/stream", stream_project_comments, methods=["GET"]),
+    # Everything else (including CORS preflights) is served by the Flask app in a worker thread
+    Mount("/", app=WSGIMiddleware(flask_app, workers=WSGI_WORKERS)),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[
+        # Request ids and access lines; outermost, so early answers below are logged too
+        Middleware(structuredLog.RequestLogMiddleware, routes=routes),
+        # Latency, status and upstream calls in /metrics, as the Flask app records its own
+        Middleware(metrics.RequestMetricsMiddleware, routes=routes),
+        # Compresses the native routes' responses; the Flask app compresses its own
+        Middleware(CompressionMiddleware),
+        # Rate limits and upstream shedding for the native routes; the Flask app admits its own
+        Middleware(admission.AdmissionMiddleware, routes=routes),
+        # Upstream deadlines, and 503/504 instead of 500 when the upstream fails for good
+        Middleware(resilience.ResilienceMiddleware, routes=routes),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+
+from flask import g, jsonify, request
+
+import supabaseInit
+from queryCache import cache
+
+# Local verification of Supabase access tokens.
+# A request carrying "Authorization: Bearer <access_token>" is verified in-process (HS256 with the
+# project's JWT secret, or RS256/ES256 against the project's JWKS, fetched once and cached), and the
+# caller's role and company are attached as g.principal, so routes can authorize without a users
+# query. Requests without a token are left alone and routes fall back to their own lookups.
+# The login routes and the frontend bundle never look at the token: a stale one left in the browser
+# must not stop its owner from loading the app and signing in again.
+
+ALGORITHMS = ("HS256", "RS256", "ES256")
+AUDIENCE = "authenticated"
+LEEWAY_SECONDS = 30
+JWKS_LIFESPAN_SECONDS = int(os.environ.get("JWKS_CACHE_SECONDS", 600))
+
+# Per-subject permissions read from the users table when the token doesn't carry them.
+# Cached under the "users" table so user writes invalidate them with everything else.
+PERMISSION_TTL_SECONDS = int(os.environ.get("PERMISSION_CACHE_SECONDS", 30))
+
+# Served the same with or without a valid token
+PUBLIC_ENDPOINTS = {"home", "frontend", "login_admin", "login_client", "healthz", "readyz"}
+
+_jwks_client = None
+_jwks_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+class Principal:
+    def __init__(self, subject, email=None, role=None, company=None, claims=None):
+        self.subject = subject
+        self.email = email
+        self.role = role
+        self.company = company
+        self.claims = claims or {}
+
+    @property
+    def is_admin(self):
+        return (self.role or "").lower() == "admin"
+
+
+class TokenError(Exception):
+    pass
+
+
+def _hs256_secret():
+    if supabaseInit.DATA_BACKEND == "sqlite":
+        import localStore
+        return localStore.JWT_SECRET
+    return supabaseInit.SUPABASE_JWT_SECRET
+
+
+def _jwks():
+    import jwt
+    global _jwks_client
+    if _jwks_client is None:
+        with _jwks_lock:
+            if _jwks_client is None:
+                _jwks_client = jwt.PyJWKClient(
+                    supabaseInit.SUPABASE_JWKS_URL, cache_keys=True, lifespan=JWKS_LIFESPAN_SECONDS
+                )
+    return _jwks_client
+
+
+def verify_token(token):
+    # PyJWT (and the cryptography backend it loads) is imported on the first token, or by readiness.warm_up
+    import jwt
+    try:
+        algorithm = jwt.get_unverified_header(token).get("alg")
+        if algorithm not in ALGORITHMS:
+            raise TokenError(f"Unsupported token algorithm: {algorithm}")
+        if algorithm == "HS256":
+            key = _hs256_secret()
+            if not key:
+                raise TokenError("HS256 tokens need SUPABASE_JWT_SECRET to be configured")
+        else:
+            key = _jwks().get_signing_key_from_jwt(token).key
+        return jwt.decode(token, key, algorithms=[algorithm], audience=AUDIENCE, leeway=LEEWAY_SECONDS)
+    except jwt.PyJWTError as e:
+        raise TokenError(str(e))
+
+
+def _load_permissions(subject, client):
+    def load():
+        rows = client.table("users").select("role, company, company_name").eq("authId", subject).execute().data
+        return rows[0] if rows else {}
+    return cache.get_or_load("users", ("permissions", subject), load, ttl=PERMISSION_TTL_SECONDS)
+
+
+def principal_from_claims(claims, client):
+    # Only app_metadata is trusted for authorization: users can edit their own user_metadata
+    app_metadata = claims.get("app_metadata") or {}
+    role = app_metadata.get("role")
+    company = app_metadata.get("company")
+    if role is None or company is None:
+        permissions = _load_permissions(claims["sub"], client)
+        role = role if role is not None else permissions.get("role")
+        company = company if company is not None else (permissions.get("company_name") or permissions.get("company"))
+    return Principal(claims["sub"], claims.get("email"), role, company, claims)
+
+
+def current_principal():
+    return g.get("principal")
+
+
+def init_app(app, client):
+    @app.before_request
+    def _authenticate():
+        g.principal = None
+        header = request.headers.get("Authorization", "")
+        if not header.lower().startswith("bearer ") or request.endpoint in PUBLIC_ENDPOINTS:
+            return None
+        try:
+            claims = verify_token(header[7:].strip())
+        except TokenError as e:
+            return jsonify({"error": f"Invalid access token: {e}"}), 401
+        try:
+            g.principal = principal_from_claims(claims, client)
+        except Exception:
+            # Answered like a route's own failure: resilience.py turns a 500 after an upstream
+            # failure into 503/504 with Retry-After
+            logger.exception("Permission lookup failed")
+            return jsonify({"error": "Could not load the caller's permissions"}), 500
+        return None
@@ -0,0 +1,447 @@
+import argparse
+import contextvars
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Endpoint benchmark: seeds a synthetic tenant dataset into the local SQLite backend, drives every
+# route in main.py at a configurable concurrency and reports latency percentiles, throughput and
+# upstream (data backend) calls per request. Results are written as JSON so runs from different
+# commits can be compared with --compare. Routes that answer 202 with a job are timed (and their
+# upstream calls counted) until the job finishes. Routes that need a token are sent one for an
+# admin of a seeded company.
+#
+# Not driven: GET /projects/<id>/comments/stream, which holds its response open until the client
+# leaves; there is no request latency to time (the comment it delivers is timed as addComment).
+#
+#   python benchmark.py --companies 20 --requests 200 --concurrency 8 --output bench.json
+#   python benchmark.py --compare bench.json
+
+# Never point the benchmark at the hosted project
+os.environ["DATA_BACKEND"] = "sqlite"
+# Measure the routes, not the rate limiter (set RATE_LIMIT_ENABLED=1 to include it)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+# Per-request access lines would interleave with the report
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import jwt  # noqa: E402
+
+import jobQueue  # noqa: E402
+import localStore  # noqa: E402
+import main  # noqa: E402
+import seedData  # noqa: E402
+import structuredLog  # noqa: E402
+from queryCache import cache  # noqa: E402
+
+# The server's log pipeline, so its cost is part of what is measured
+structuredLog.configure()
+
+# Upstream calls made for the request in flight; a context variable rather than a thread local so
+# calls a route fans out to fanout.py's pool (which copies the context) are counted too
+_calls = contextvars.ContextVar("benchmark_calls", default=None)
+
+
+def _count_call():
+    calls = _calls.get()
+    if calls is not None:
+        calls.append(1)
+
+
+class _CountingQuery:
+    def __init__(self, query):
+        self._query = query
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if not callable(attr):
+            return attr
+
+        def chain(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return self if result is self._query else result
+        return chain
+
+    def execute(self):
+        _count_call()
+        return self._query.execute()
+
+
+class _CountingAuth:
+    def __init__(self, auth):
+        self._auth = auth
+
+    def __getattr__(self, name):
+        attr = getattr(self._auth, name)
+
+        def call(*args, **kwargs):
+            _count_call()
+            return attr(*args, **kwargs)
+        return call
+
+
+class ContextJobQueue(jobQueue.JobQueue):
+    # Runs thread jobs in the submitting request's context, so their upstream calls count toward it
+    def _dispatch(self, job_id):
+        if self.executor != "thread":
+            return super()._dispatch(job_id)
+        context = contextvars.copy_context()
+        self._workers().submit(context.run, self._run, job_id)
+
+
+class CountingClient:
+    # Counts upstream calls per request; Flask's test client runs each request on the calling thread
+    def __init__(self, client):
+        self._client = client
+        self.auth = _CountingAuth(client.auth)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def table(self, name):
+        return _CountingQuery(self._client.table(name))
+
+
+# Routes that fail on every call because of a bug in the route itself, not because of load.
+# Their rows are marked in the report and left out of --compare.
+KNOWN_FAILURES = {
+    "addCompany": "create_company indexes the response as a dict (response['status']), so it answers 500 "
+                  "after every insert",
+}
+
+# How often a job-backed route's /jobs/<id> is polled, and for how long at most
+JOB_POLL_INTERVAL = 0.002
+JOB_TIMEOUT = 60
+
+
+# -- scenarios ------------------------------------------------------------
+# Each scenario returns (method, path, body) or (method, path, body, headers); a dict or list body
+# is sent as JSON, a str as is. Write scenarios use fresh values so repeated runs don't erode the
+# seeded dataset the read scenarios depend on.
+
+def _user(ds, rng):
+    return rng.choice(ds.users)
+
+
+def _project(ds, rng):
+    return rng.choice(ds.projects)
+
+
+def _company(ds, rng):
+    return rng.choice(ds.companies)
+
+
+def _unique():
+    return uuid.uuid4().hex[:12]
+
+
+def _admin(company):
+    # Authorization header for an admin of `company`, signed like the local auth stub's tokens
+    now = int(time.time())
+    claims = {
+        "sub": str(uuid.uuid4()), "email": "bench-admin@bench.example", "role": "authenticated",
+        "aud": "authenticated", "iat": now, "exp": now + 3600,
+        "app_metadata": {"role": "admin", "company": company},
+    }
+    return {"Authorization": f"Bearer {jwt.encode(claims, localStore.JWT_SECRET, algorithm='HS256')}"}
+
+
+def _ndjson(rows):
+    return "".join(json.dumps(row) + "\n" for row in rows)
+
+
+IMPORT_ROWS = 10
+
+
+def _import_users(ds, rng):
+    company = _company(ds, rng)
+    rows = [{"name": "Bench User", "email": f"{_unique()}@bench.example", "company": company, "role": "client",
+             "password": "bench"} for _ in range(IMPORT_ROWS)]
+    return "POST", "/import/users?format=ndjson", _ndjson(rows), _admin(company)
+
+
+def _import_projects(ds, rng):
+    company = _company(ds, rng)
+    rows = [{"name": f"Bench {_unique()}", "company": company, "start_date": "2025-01-01",
+             "end_date": "2025-02-01", "description": "benchmark"} for _ in range(IMPORT_ROWS)]
+    return "POST", "/import/projects?format=ndjson", _ndjson(rows), _admin(company)
+
+
+SCENARIOS = {
+    "home": lambda ds, rng: ("GET", "/", None),
+    "loginAdmin": lambda ds, rng: ("POST", "/loginAdmin", {"login": True}),
+    "loginClient": lambda ds, rng: ("POST", "/loginClient", {"login": True}),
+    "getProjectsByCompany": lambda ds, rng: ("GET", f"/getProjectsByCompany?company_name={_company(ds, rng)}", None),
+    "addCompany": lambda ds, rng: ("POST", "/addCompany", {"name": f"Bench {_unique()}"}),
+    "getProjectById": lambda ds, rng: ("GET", f"/getProjectById?id={_project(ds, rng)['id']}", None),
+    "getUser": lambda ds, rng: ("GET", f"/getUser?user_id={_user(ds, rng)['authId']}", None),
+    "isAdmin": lambda ds, rng: ("GET", f"/isAdmin?authId={_user(ds, rng)['authId']}", None),
+    "getStaff": lambda ds, rng: (
+        lambda admin: ("GET", f"/getStaff?user_id={admin['id']}&company_name={admin['company']}", None)
+    )(ds.admins[_company(ds, rng)]),
+    "getClientsProjects": lambda ds, rng: ("POST", "/getClientsProjects", {"authId": _user(ds, rng)["authId"]}),
+    "updateUser": lambda ds, rng: (
+        lambda user: ("PUT", "/api/update-user", {
+            "id": user["id"], "name": f"Renamed {_unique()}", "email": user["email"],
+            "role": "staff", "company": user["company"],
+        })
+    )(_user(ds, rng)),
+    "createProject": lambda ds, rng: ("POST", "/createProject", {
+        "name": f"Bench {_unique()}", "description": "benchmark", "start_date": "2025-01-01",
+        "end_date": "2025-02-01", "company": _company(ds, rng),
+    }),
+    "addUser": lambda ds, rng: ("POST", "/addUser", {
+        "username": "Bench User", "company": _company(ds, rng), "email": f"{_unique()}@bench.example",
+        "password": "bench", "role": "client",
+    }),
+    "addProject": lambda ds, rng: ("POST", "/addProject", {
+        "project": f"Bench {_unique()}", "start_date": "2025-01-01", "end_date": "2025-02-01",
+        "description": "benchmark", "company": _company(ds, rng),
+    }),
+    "deleteUser": lambda ds, rng: ("DELETE", "/api/delete-user", {"email": f"{_unique()}@missing.example"}),
+    "getCompanies": lambda ds, rng: ("GET", "/getCompanies", None),
+    "getUsersByCompany": lambda ds, rng: ("GET", f"/getUsersByCompany?company_name={_company(ds, rng)}", None),
+    "addUserToCompany": lambda ds, rng: ("POST", "/addUserToCompany", {
+        "name": "Bench User", "email": f"{_unique()}@bench.example", "role": "staff",
+        "company_name": _company(ds, rng),
+    }),
+    "create_user": lambda ds, rng: ("POST", "/create_user", {
+        "name": "Bench User", "authId": f"{_unique()}@bench.example", "companyId": _company(ds, rng),
+    }),
+    "get_companies": lambda ds, rng: ("GET", "/get_companies", None),
+    "getAllCompanies": lambda ds, rng: ("GET", "/getAllCompanies", None),
+    "getAllProjects": lambda ds, rng: ("GET", "/getAllProjects", None),
+    "getUsersByProject": lambda ds, rng: ("GET", f"/getUsersByProject?project_id={_project(ds, rng)['id']}", None),
+    "addUsersToProject": lambda ds, rng: (
+        lambda project: ("POST", "/addUsersToProject", {
+            "project_id": project["id"],
+            "user_ids": [u["id"] for u in rng.sample(ds.users, min(20, len(ds.users)))],
+        })
+    )(_project(ds, rng)),
+    "removeUserFromProject": lambda ds, rng: (
+        lambda user: ("POST", "/removeUserFromProject", {"user_id": user["id"], "project_id": user["project"]})
+    )(_user(ds, rng)),
+    "getCommentsByProject": lambda ds, rng: ("GET", f"/getCommentsByProject?project_id={_project(ds, rng)['id']}", None),
+    "addComment": lambda ds, rng: (
+        lambda user: ("POST", "/addComment", {"project_id": user["project"], "comment": "benchmark", "sender": user["authId"]})
+    )(_user(ds, rng)),
+    "dashboard": lambda ds, rng: ("GET", f"/dashboard/{_company(ds, rng)}", None),
+    "exportProjects": lambda ds, rng: (
+        lambda company: ("GET", f"/export/projects?company={company}", None, _admin(company))
+    )(_company(ds, rng)),
+    "importUsers": _import_users,
+    "importProjects": _import_projects,
+    "search": lambda ds, rng: ("GET", f"/search?company={_company(ds, rng)}&q={rng.choice(seedData.WORDS)}", None),
+    "getUserNameById": lambda ds, rng: ("GET", f"/getUserNameById?user_id={_user(ds, rng)['authId']}", None),
+    "searchReindex": lambda ds, rng: ("POST", "/search/reindex", None, _admin(_company(ds, rng))),
+    "getJob": lambda ds, rng: ("GET", ds.job_url, None),
+    "cacheStats": lambda ds, rng: ("GET", "/cacheStats", None),
+    "healthz": lambda ds, rng: ("GET", "/healthz", None),
+    "readyz": lambda ds, rng: ("GET", "/readyz", None),
+    "metrics": lambda ds, rng: ("GET", "/metrics", None),
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def wait_for_job(client, response, headers=None):
+    # A 202 from a job-backed route only means the job was queued: poll it until it finishes and
+    # report the job's own status code, so the sample covers the work rather than the hand-off
+    status_url = response.get_json()["status_url"]
+    deadline = time.perf_counter() + JOB_TIMEOUT
+    while time.perf_counter() < deadline:
+        job = client.get(status_url, headers=headers).get_json()
+        if job["status"] not in (jobQueue.QUEUED, jobQueue.RUNNING):
+            return job["status_code"]
+        time.sleep(JOB_POLL_INTERVAL)
+    return 504
+
+
+def finished_job(dataset):
+    # Status URL of a job that has run, for the getJob scenario to poll
+    project = dataset.projects[0]
+    client = main.app.test_client()
+    response = client.post("/addUsersToProject", json={"project_id": project["id"], "user_ids": [dataset.users[0]["id"]]})
+    wait_for_job(client, response)
+    return response.get_json()["status_url"]
+
+
+def run_scenario(name, dataset, requests, concurrency, seed_value, headers=None):
+    build = SCENARIOS[name]
+
+    def worker(worker_id, count):
+        rng = random.Random(f"{seed_value}-{name}-{worker_id}")
+        client = main.app.test_client()
+        samples = []
+        for _ in range(count):
+            method, path, body, *extra = build(dataset, rng)
+            request_headers = dict(headers or {}, **(extra[0] if extra else {}))
+            payload = {"data": body} if isinstance(body, str) else {"json": body}
+            calls = []
+            _calls.set(calls)
+            started = time.perf_counter()
+            response = client.open(path, method=method, headers=request_headers, **payload)
+            status = response.status_code
+            if status == 202 and "status_url" in (response.get_json(silent=True) or {}):
+                status = wait_for_job(client, response, request_headers)
+            elapsed = time.perf_counter() - started
+            response.close()
+            samples.append((elapsed, status, len(calls), len(response.data)))
+        return samples
+
+    shares = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency), shares))
+    wall = time.perf_counter() - started
+
+    samples = [sample for result in results for sample in result]
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    statuses = {}
+    for _, status, _, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, status, _, _ in samples if status >= 500),
+        "status_counts": statuses,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "throughput_rps": round(len(samples) / wall, 1) if wall else None,
+        "upstream_calls_per_request": round(sum(s[2] for s in samples) / len(samples), 2),
+        "mean_response_bytes": round(sum(s[3] for s in samples) / len(samples)),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current, threshold):
+    # Prints p95 / upstream call changes per route; returns the routes that regressed
+    regressions = []
+    print(f"\n{'route':<24}{'p95 before':>12}{'p95 after':>12}{'change':>10}{'calls':>14}")
+    for name, after in current["routes"].items():
+        before = previous.get("routes", {}).get(name)
+        if not before or name in KNOWN_FAILURES:
+            continue
+        change = (after["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        calls = f"{before['upstream_calls_per_request']}->{after['upstream_calls_per_request']}"
+        flag = ""
+        if change > threshold or after["upstream_calls_per_request"] > before["upstream_calls_per_request"]:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<24}{before['p95_ms']:>12}{after['p95_ms']:>12}{change:>+10.0%}{calls:>14}{flag}")
+    return regressions
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the API routes against a synthetic local dataset")
+    parser.add_argument("--companies", type=int, default=10)
+    parser.add_argument("--users-per-company", type=int, default=50)
+    parser.add_argument("--projects-per-company", type=int, default=10)
+    parser.add_argument("--comments-per-project", type=int, default=100)
+    parser.add_argument("--projects-per-user", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=100, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--routes", help="comma-separated scenario names (default: all)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--disable-cache", action="store_true", help="bypass the reference-data cache")
+    parser.add_argument("--accept-encoding", default="",
+                        help="Accept-Encoding header to send, e.g. 'br, gzip' (default: none, identity)")
+    parser.add_argument("--output", help="write results JSON to this path")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    names = args.routes.split(",") if args.routes else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)}")
+
+    if args.disable_cache:
+        cache.ttls = {}
+        cache.default_ttl = 0
+
+    client = main.supabaseClient
+    started = time.perf_counter()
+    dataset = seedData.seed(
+        client,
+        companies=args.companies,
+        users_per_company=args.users_per_company,
+        projects_per_company=args.projects_per_company,
+        comments_per_project=args.comments_per_project,
+        projects_per_user=args.projects_per_user,
+        seed_value=args.seed,
+    )
+    seed_seconds = time.perf_counter() - started
+    main.supabaseClient = CountingClient(client)
+    main.jobs = ContextJobQueue(main.jobs.store)
+    dataset.job_url = finished_job(dataset)
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "dataset": dataset.summary(),
+            "seed_seconds": round(seed_seconds, 2),
+            "requests_per_route": args.requests,
+            "concurrency": args.concurrency,
+            "cache": not args.disable_cache,
+            "json_encoder": "orjson" if main.jsonProvider.ORJSON_ENABLED else "stdlib",
+            "accept_encoding": args.accept_encoding or None,
+        },
+        "routes": {},
+    }
+
+    headers = {"Accept-Encoding": args.accept_encoding} if args.accept_encoding else None
+    print(f"{'route':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>10}{'calls/req':>11}{'bytes':>10}{'5xx':>6}")
+    for name in names:
+        stats = run_scenario(name, dataset, args.requests, args.concurrency, args.seed, headers)
+        if name in KNOWN_FAILURES:
+            stats["known_failure"] = KNOWN_FAILURES[name]
+        results["routes"][name] = stats
+        print(f"{name:<24}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+              f"{stats['throughput_rps']:>10}{stats['upstream_calls_per_request']:>11}"
+              f"{stats['mean_response_bytes']:>10}{stats['errors']:>6}{'  *' if name in KNOWN_FAILURES else ''}")
+
+    known = [name for name in names if name in KNOWN_FAILURES]
+    if known:
+        print("\n* Fails on every call because of a bug in the route, not under load:")
+        for name in known:
+            print(f"  {name}: {KNOWN_FAILURES[name]}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if compare(previous, results, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
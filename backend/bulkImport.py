@@ -0,0 +1,336 @@
+import codecs
+import contextvars
+import csv
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import searchIndex
+from queryCache import cache
+
+# Streaming bulk import of users and projects from CSV or NDJSON uploads.
+# Rows are read from the request body one at a time and handled in batches: each batch costs one
+# duplicate check (for users, one per EMAIL_CHECK_CHUNK emails) and one insert, and one result line
+# per row is streamed back as soon as its batch is done. Only the current batch is held in memory.
+# Duplicates against rows imported by earlier batches are caught by the next batch's check, since
+# those rows are stored by then.
+
+DEFAULT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", 500))
+MAX_BATCH_SIZE = 5000
+# Sign-ups run on a small pool of their own, so a large import can't take over the fan-out pool
+# the request routes share
+SIGN_UP_WORKERS = int(os.environ.get("IMPORT_SIGN_UP_WORKERS", 4))
+# Emails per duplicate-check query; each one is a case-insensitive match in the query string
+EMAIL_CHECK_CHUNK = 100
+
+ROLES = ("admin", "client", "staff")
+
+CSV_TYPES = ("text/csv", "application/csv")
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json")
+
+
+class BulkImportError(ValueError):
+    pass
+
+
+# One pool per process, like the Supabase client: threads don't survive a fork
+_sign_up_executor = None
+_sign_up_executor_pid = None
+_sign_up_executor_lock = threading.Lock()
+
+
+def _sign_up_pool():
+    global _sign_up_executor, _sign_up_executor_pid
+    pid = os.getpid()
+    if _sign_up_executor is None or _sign_up_executor_pid != pid:
+        with _sign_up_executor_lock:
+            if _sign_up_executor is None or _sign_up_executor_pid != pid:
+                _sign_up_executor = ThreadPoolExecutor(max_workers=SIGN_UP_WORKERS, thread_name_prefix="import")
+                _sign_up_executor_pid = pid
+    return _sign_up_executor
+
+
+def batch_size_param(args):
+    raw = args.get("batch_size")
+    if raw is None:
+        return DEFAULT_BATCH_SIZE
+    try:
+        size = int(raw)
+    except ValueError:
+        raise BulkImportError("batch_size must be an integer")
+    if size < 1 or size > MAX_BATCH_SIZE:
+        raise BulkImportError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+    return size
+
+
+def upload_format(args, content_type):
+    requested = (args.get("format") or "").lower()
+    if requested in ("csv", "ndjson"):
+        return requested
+    if requested:
+        raise BulkImportError("format must be csv or ndjson")
+    mimetype = (content_type or "").split(";")[0].strip().lower()
+    if mimetype in CSV_TYPES:
+        return "csv"
+    if mimetype in NDJSON_TYPES:
+        return "ndjson"
+    raise BulkImportError("Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson")
+
+
+def _lines(stream):
+    # Decodes the binary upload incrementally; a BOM from spreadsheet exports is dropped
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    while True:
+        chunk = stream.read(64 * 1024)
+        if not chunk:
+            break
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def read_rows(stream, fmt):
+    # Yields (line number, row dict or None, parse error or None)
+    if fmt == "csv":
+        reader = csv.DictReader(_lines(stream))
+        for row in reader:
+            yield reader.line_num, {k.strip(): (v or "").strip() for k, v in row.items() if k}, None
+        return
+    for line_no, line in enumerate(_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "Each line must be a JSON object"
+            continue
+        yield line_no, row, None
+
+
+def _text(row, *names):
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ""):
+            return str(value).strip()
+    return None
+
+
+def _batches(rows, size):
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _result(line, status, **fields):
+    return dict({"line": line, "status": status}, **fields)
+
+
+# -- users ----------------------------------------------------------------
+
+def validate_user(row):
+    user = {
+        "name": _text(row, "name", "username"),
+        "email": (_text(row, "email") or "").lower(),
+        "company": _text(row, "company", "company_name"),
+        "role": (_text(row, "role") or "").lower(),
+    }
+    missing = [field for field, value in user.items() if not value]
+    if missing:
+        raise BulkImportError(f"Missing required fields: {', '.join(missing)}")
+    if "@" not in user["email"]:
+        raise BulkImportError("Invalid email address")
+    if user["role"] not in ROLES:
+        raise BulkImportError(f"Invalid role. Choose from {', '.join(ROLES)}")
+    user["company_name"] = user["company"]
+    return user, _text(row, "password")
+
+
+def _sign_up(client, email, password):
+    return client.auth.sign_up({"email": email, "password": password}).user.id
+
+
+def _like_literal(value):
+    # An ilike pattern matching `value` only, quoted for PostgREST's or=(...) syntax
+    pattern = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return '"' + pattern.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _taken_emails(client, emails):
+    # Lowercased emails of `emails` already in the users table. Imports store emails lowercased, but
+    # rows added through the other routes keep the case they were typed in, so match with ilike.
+    taken = set()
+    for start in range(0, len(emails), EMAIL_CHECK_CHUNK):
+        chunk = emails[start:start + EMAIL_CHECK_CHUNK]
+        filters = ",".join(f"email.ilike.{_like_literal(email)}" for email in chunk)
+        taken.update(row["email"].lower() for row in client.table("users").select("email").or_(filters).execute().data)
+    return taken
+
+
+def import_users(client, rows, batch_size):
+    # Rows with a password get an auth account (as /addUser does); rows without one are added as
+    # roster-only users (as /addUserToCompany does). Sign-ups are one call each, so a batch's
+    # sign-ups run concurrently, SIGN_UP_WORKERS at a time.
+    for batch in _batches(rows, batch_size):
+        results = {}
+        candidates = []  # (line, user, password)
+        seen = set()
+        for line, row, error in batch:
+            if error is None:
+                try:
+                    user, password = validate_user(row)
+                except BulkImportError as e:
+                    error = str(e)
+            if error is not None:
+                results[line] = _result(line, "invalid", error=error)
+            elif user["email"] in seen:
+                results[line] = _result(line, "duplicate", email=user["email"], error="Email repeated in this upload")
+            else:
+                seen.add(user["email"])
+                candidates.append((line, user, password))
+
+        if candidates:
+            # One query per EMAIL_CHECK_CHUNK emails finds the batch's emails that are already taken
+            taken = _taken_emails(client, [user["email"] for _, user, _ in candidates])
+            pending = []
+            for line, user, password in candidates:
+                if user["email"] in taken:
+                    results[line] = _result(line, "duplicate", email=user["email"], error="Email already exists")
+                else:
+                    pending.append((line, user, password))
+
+            # In a copy of the request's context, as fanout.submit does
+            sign_ups = {line: _sign_up_pool().submit(contextvars.copy_context().run, _sign_up, client, user["email"], password)
+                        for line, user, password in pending if password}
+            new_users = []
+            for line, user, password in pending:
+                if line in sign_ups:
+                    try:
+                        user["authId"] = sign_ups[line].result()
+                    except Exception as e:
+                        results[line] = _result(line, "failed", email=user["email"], error=f"Sign-up failed: {e}")
+                        continue
+                new_users.append((line, user))
+
+            _insert_batch(client, "users", new_users, results, lambda user: {"email": user["email"]})
+
+        for line, _, _ in batch:
+            yield results[line]
+
+
+# -- projects -------------------------------------------------------------
+
+def _date(value, field):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        raise BulkImportError(f"Invalid {field}. Use YYYY-MM-DD.")
+
+
+def validate_project(row):
+    project = {
+        "name": _text(row, "name", "project"),
+        "company": _text(row, "company"),
+        "start_date": _text(row, "start_date"),
+        "end_date": _text(row, "end_date"),
+    }
+    missing = [field for field, value in project.items() if not value]
+    if missing:
+        raise BulkImportError(f"Missing required fields: {', '.join(missing)}")
+    project["start_date"] = _date(project["start_date"], "start_date")
+    project["end_date"] = _date(project["end_date"], "end_date")
+    if project["end_date"] < project["start_date"]:
+        raise BulkImportError("end_date is before start_date")
+    project["description"] = _text(row, "description") or ""
+    return project
+
+
+def import_projects(client, rows, batch_size):
+    # A project is a duplicate when its company already has a project with the same name
+    for batch in _batches(rows, batch_size):
+        results = {}
+        candidates = []  # (line, project)
+        seen = set()
+        for line, row, error in batch:
+            if error is None:
+                try:
+                    project = validate_project(row)
+                except BulkImportError as e:
+                    error = str(e)
+            if error is not None:
+                results[line] = _result(line, "invalid", error=error)
+                continue
+            key = (project["company"], project["name"])
+            if key in seen:
+                results[line] = _result(line, "duplicate", name=project["name"], error="Project repeated in this upload")
+            else:
+                seen.add(key)
+                candidates.append((line, project))
+
+        if candidates:
+            names = list({project["name"] for _, project in candidates})
+            companies = list({project["company"] for _, project in candidates})
+            existing = client.table("projects").select("name, company") \
+                .in_("company", companies).in_("name", names).execute().data
+            taken = {(row["company"], row["name"]) for row in existing}
+            new_projects = []
+            for line, project in candidates:
+                if (project["company"], project["name"]) in taken:
+                    results[line] = _result(line, "duplicate", name=project["name"], error="Project already exists")
+                else:
+                    new_projects.append((line, project))
+
+            inserted = _insert_batch(client, "projects", new_projects, results, lambda project: {"name": project["name"]})
+            searchIndex.index.add_projects(inserted)
+
+        for line, _, _ in batch:
+            yield results[line]
+
+
+def _insert_batch(client, table, items, results, describe):
+    # One insert for the whole batch; if the backend rejects it, every row of it is reported failed.
+    # Returns the inserted rows.
+    if not items:
+        return []
+    try:
+        inserted = client.table(table).insert([record for _, record in items]).execute().data or []
+    except Exception as e:
+        for line, record in items:
+            results[line] = _result(line, "failed", error=str(e), **describe(record))
+        return []
+    cache.invalidate(table)
+    for i, (line, record) in enumerate(items):
+        row = inserted[i] if i < len(inserted) else {}
+        results[line] = _result(line, "created", id=row.get("id"), **describe(record))
+    return inserted
+
+
+def ndjson_results(results):
+    # Serializes the per-row results and ends the stream with a summary line. The status line has
+    # already gone out, so a failure mid-import is reported in the body; rows before it are stored.
+    counts = {}
+    error = None
+    try:
+        for result in results:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+            yield json.dumps(result, default=str) + "\n"
+    except Exception as e:
+        error = str(e)
+    summary = dict(counts, total=sum(counts.values()))
+    if error is not None:
+        summary["error"] = f"Import stopped: {error}"
+    yield json.dumps({"summary": summary}) + "\n"
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+import queue
+import threading
+
+# In-process fan-out of new project comments to Server-Sent Events subscribers.
+# /addComment publishes each stored comment (user name already resolved) once, and every watcher of
+# that project gets it from memory, so idle watchers cost no database queries at all.
+# The broker is per process, so watchers only see comments posted through the same process;
+# serve streams from a single process (e.g. the ASGI mode) when running several workers.
+
+HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get("SSE_QUEUE_SIZE", 100))
+RETRY_MS = 3000
+
+STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # stop nginx-style proxies from buffering the stream
+}
+
+
+class Subscription:
+    # Thread subscribers block on a queue.Queue; ASGI subscribers await an asyncio.Queue on their loop
+    def __init__(self, project_id, maxsize, loop=None):
+        self.project_id = project_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize) if loop else queue.Queue(maxsize)
+        self.dropped = 0
+
+    def offer(self, event):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._put, event)
+        else:
+            self._put(event)
+
+    def _put(self, event):
+        # A watcher that can't keep up loses its oldest events rather than stalling publishers;
+        # it can catch up by reconnecting with Last-Event-ID
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except (queue.Full, asyncio.QueueFull):
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except (queue.Empty, asyncio.QueueEmpty):
+                    pass
+
+
+class CommentBroker:
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = {}  # project id -> set of Subscription
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, project_id, loop=None):
+        subscription = Subscription(str(project_id), self.queue_size, loop)
+        with self._lock:
+            self._subscribers.setdefault(subscription.project_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            watchers = self._subscribers.get(subscription.project_id)
+            if watchers is not None:
+                watchers.discard(subscription)
+                if not watchers:
+                    del self._subscribers[subscription.project_id]
+
+    def has_subscribers(self, project_id):
+        with self._lock:
+            return str(project_id) in self._subscribers
+
+    def publish(self, project_id, comment):
+        with self._lock:
+            watchers = list(self._subscribers.get(str(project_id), ()))
+            self.published += 1
+        for subscription in watchers:
+            subscription.offer(comment)
+        return len(watchers)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(watchers) for watchers in self._subscribers.values())
+
+
+broker = CommentBroker()
+
+
+def format_event(comment):
+    return f"id: {comment['id']}\nevent: comment\ndata: {json.dumps(comment, default=str)}\n\n"
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _backlog_high_water(backlog):
+    # Live events up to here were already sent from the backlog (the watcher subscribed first)
+    return max((comment["id"] for comment in backlog), default=None)
+
+
+def sync_events(subscription, backlog=()):
+    # Generator for Flask streaming responses
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        for comment in backlog:
+            yield format_event(comment)
+        high_water = _backlog_high_water(backlog)
+        while True:
+            try:
+                comment = subscription.queue.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                # Comment lines keep proxies from timing out idle connections and surface disconnects
+                yield ": keep-alive\n\n"
+                continue
+            if high_water is None or comment["id"] > high_water:
+                yield format_event(comment)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def async_events(subscription, backlog=()):
+    # Async generator for the ASGI app's streaming responses
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        for comment in backlog:
+            yield format_event(comment)
+        high_water = _backlog_high_water(backlog)
+        while True:
+            try:
+                comment = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if high_water is None or comment["id"] > high_water:
+                yield format_event(comment)
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,147 @@
+import gzip
+import os
+
+from flask import request
+
+from conditional import weak_etag
+
+# Negotiated response compression for large bodies.
+# Responses at or above COMPRESS_MIN_BYTES with a compressible type are encoded with brotli (when
+# the brotli package is installed and the client accepts it) or gzip. Small bodies are sent as is:
+# below about a kilobyte the encoding overhead outweighs the savings. Streamed responses (SSE,
+# exports, imports) are left alone so their chunks keep flowing as they are produced.
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", 5))
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/javascript", "application/x-ndjson",
+    "text/html", "text/css", "text/csv", "text/plain", "text/javascript", "image/svg+xml",
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _accepted(accept_encoding):
+    # Content codings the client accepts, with their q-values
+    accepted = {}
+    for part in (accept_encoding or "").lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip()] = q
+    return accepted
+
+
+def negotiate(accept_encoding, available=None):
+    # Picks br over gzip when both are equally acceptable; returns None for identity
+    accepted = _accepted(accept_encoding)
+    if available is None:
+        available = ("br", "gzip") if brotli is not None else ("gzip",)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body, coding):
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compressible(mimetype, length):
+    return length >= COMPRESS_MIN_BYTES and (mimetype or "").split(";")[0].strip() in COMPRESSIBLE_TYPES
+
+
+def _vary(headers):
+    vary = headers.get("Vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+def init_app(app):
+    @app.after_request
+    def _compress(response):
+        if response.is_streamed or response.direct_passthrough or "Content-Encoding" in response.headers:
+            return response
+        if request.method == "HEAD" or response.status_code < 200 or response.status_code in (204, 304):
+            return response
+        body = response.get_data()
+        if not compressible(response.mimetype, len(body)):
+            return response
+
+        _vary(response.headers)
+        coding = negotiate(request.headers.get("Accept-Encoding"))
+        if coding is None:
+            return response
+        response.set_data(compress(body, coding))
+        response.headers["Content-Encoding"] = coding
+        if "ETag" in response.headers:
+            response.headers["ETag"] = weak_etag(response.headers["ETag"])
+        return response
+
+
+class CompressionMiddleware:
+    # ASGI counterpart for the native routes in asyncApp: compresses single-message responses and
+    # passes through anything already encoded (the mounted Flask app) or streamed
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = dict(scope["headers"])
+        coding = negotiate(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                if b"content-encoding" in headers or scope["method"] == "HEAD":
+                    await send(message)
+                    return
+                start = message
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            pending, start = start, None
+            body = message.get("body", b"")
+            headers = [(k, v) for k, v in pending.get("headers", []) if k.lower() != b"content-length"]
+            content_type = dict((k.lower(), v) for k, v in headers).get(b"content-type", b"").decode("latin-1")
+            if message.get("more_body") or not compressible(content_type, len(body)):
+                await send(pending)
+                await send(message)
+                return
+
+            headers.append((b"vary", b"Accept-Encoding"))
+            if coding is not None:
+                body = compress(body, coding)
+                headers.append((b"content-encoding", coding.encode()))
+                headers = [(k, weak_etag(v.decode("latin-1")).encode("latin-1") if k.lower() == b"etag" else v)
+                           for k, v in headers]
+            headers.append((b"content-length", str(len(body)).encode()))
+            await send(dict(pending, headers=headers))
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,50 @@
+import hashlib
+from functools import wraps
+
+from flask import current_app, request
+
+# Conditional GETs for read endpoints that clients poll.
+# The ETag is a hash of the serialized body; when the client's If-None-Match still matches, the
+# response becomes a bodiless 304, so an unchanged poll costs headers only on the wire.
+
+DEFAULT_CACHE_CONTROL = "private, no-cache"  # clients may keep a copy but must revalidate it
+
+
+def etag_for(body):
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def weak_etag(etag):
+    # A compressed body is a different byte sequence, so its tag is only weakly equal to ours;
+    # etag_matches() ignores the W/ prefix, so revalidation still hits
+    return etag if etag.startswith("W/") else "W/" + etag
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: proxies that re-encode the body may mark our tag as W/
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates
+
+
+def conditional_get(cache_control=DEFAULT_CACHE_CONTROL):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = current_app.make_response(view(*args, **kwargs))
+            if request.method != "GET" or response.status_code != 200 or response.is_streamed:
+                return response
+
+            etag = etag_for(response.get_data())
+            response.headers["ETag"] = etag
+            response.headers["Cache-Control"] = cache_control
+            if etag_matches(request.headers.get("If-None-Match"), etag):
+                response.status_code = 304
+                response.set_data(b"")
+                response.headers.pop("Content-Type", None)
+            return response
+        return wrapper
+    return decorator
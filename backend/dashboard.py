@@ -0,0 +1,35 @@
+# Company dashboard document: projects (each with its comment count) and members in one response.
+# The query builders are shared by the Flask route (thread pool) and the ASGI route (asyncio), which
+# each run them concurrently; only .execute() differs between the sync and async clients.
+# Comment counts are embedded in the projects query (PostgREST counts them through the
+# comments.projectId foreign key), so a page of projects costs one upstream call, not one per project.
+
+PROJECT_COLUMNS = "id, name, description, company, start_date, end_date"
+MEMBER_COLUMNS = "id, authId, name, email, role, company"
+
+
+def projects_query(client, company):
+    return client.table("projects").select(PROJECT_COLUMNS + ", comments(count)").eq("company", company)
+
+
+def members_query(client, company):
+    return client.table("users").select(MEMBER_COLUMNS).eq("company", company)
+
+
+def _with_comment_count(project):
+    # The embed arrives as [{"count": n}]
+    project = dict(project)
+    counted = project.pop("comments", None) or [{}]
+    project["comment_count"] = counted[0].get("count") or 0
+    return project
+
+
+def document(company, projects, projects_next, members, members_next):
+    # The next cursors continue with /getProjectsByCompany and /getUsersByCompany (same id keys)
+    return {
+        "company": company,
+        "projects": [_with_comment_count(project) for project in projects],
+        "projects_next_cursor": projects_next,
+        "members": members,
+        "members_next_cursor": members_next,
+    }
@@ -0,0 +1,43 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Runs a request's independent upstream calls side by side on a shared thread pool.
+# Each call runs in a copy of the submitting thread's context, so Flask's request and app context
+# (and with them g.principal and the per-request upstream call log behind Server-Timing) are
+# visible on the worker thread. Calls must not submit further work and wait on it: a full pool
+# would deadlock.
+
+FANOUT_WORKERS = int(os.environ.get("FANOUT_WORKERS", 16))
+
+# One pool per process, like the Supabase client: threads don't survive a fork
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+                _executor_pid = pid
+    return _executor
+
+
+def submit(call, *args, **kwargs):
+    context = contextvars.copy_context()
+    return executor().submit(context.run, call, *args, **kwargs)
+
+
+def run_parallel(calls):
+    # Results come back in the order of `calls`; the first failure is raised once every call is done
+    futures = [submit(call) for call in calls]
+    errors = [future.exception() for future in futures]
+    for error in errors:
+        if error is not None:
+            raise error
+    return [future.result() for future in futures]
@@ -0,0 +1,34 @@
+# Sparse fieldsets: lets callers ask for only the columns they need with ?fields=a,b,c.
+# Requested columns are checked against a per-table allowlist and pushed down into the
+# Supabase select, so unused columns are never fetched, transferred or serialized.
+
+TABLE_FIELDS = {
+    "companies": {"id", "name", "created_at"},
+    "projects": {"id", "name", "description", "start_date", "end_date", "company", "created_at"},
+    "users": {"id", "authId", "name", "email", "role", "company", "company_name", "project", "created_at"},
+    "comments": {"id", "projectId", "content", "created_at", "userAuthId"},
+}
+
+
+class FieldsetError(ValueError):
+    pass
+
+
+def select_fields(table, args, default="*", required=()):
+    # Returns the column list to pass to .select(); `required` columns are always included
+    # because the route itself needs them (pagination keys, join columns)
+    raw = args.get("fields")
+    if not raw:
+        return default
+
+    requested = [field.strip() for field in raw.split(",") if field.strip()]
+    if not requested:
+        raise FieldsetError("fields must name at least one column")
+
+    allowed = TABLE_FIELDS[table]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise FieldsetError(f"Unknown field(s) for {table}: {', '.join(unknown)}")
+
+    columns = list(dict.fromkeys(list(required) + requested))
+    return ", ".join(columns)
@@ -0,0 +1,41 @@
+import os
+
+import readiness
+import structuredLog
+
+# gunicorn -c gunicorn.conf.py main:app
+# The app is imported once in the master (preload_app) so workers fork with every module already
+# loaded (including the client libraries main itself imports lazily, see on_starting); each worker
+# then builds its own Supabase client and connection pool and opens a connection before it starts
+# accepting requests. /readyz answers 200 once that has worked.
+
+bind = os.environ.get("BIND", "0.0.0.0:8080")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+preload_app = True
+
+# Before the app is preloaded, so its import-time records go through the same pipeline; the
+# workers inherit the handler (its writer thread is restarted per process)
+structuredLog.configure()
+
+
+def on_starting(server):
+    readiness.preload()
+
+
+def post_worker_init(worker):
+    try:
+        seconds = readiness.state.warm_up()
+        worker.log.info("Supabase connection warmed up in %.3fs", seconds)
+    except Exception as e:
+        # A cold pool is still usable; the first request just pays for the connection, and /readyz
+        # keeps checking until the upstream answers
+        worker.log.warning("Supabase warm-up failed: %s", e)
+
+    # Background jobs left queued by a previous run (JOB_STORE=sqlite); the shared store hands
+    # each one to exactly one worker
+    import main
+    resumed = main.jobs.resume()
+    if resumed:
+        worker.log.info("Resumed %d queued background jobs", resumed)
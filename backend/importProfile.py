@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Import-time profile: how long a fresh interpreter takes to import the app, and which modules
+# that time goes to. Runs `python -X importtime -c "import <module>"` in a clean process (nothing
+# imported yet, no bytecode-cache surprises after the first run) and reports the slowest modules by
+# cumulative time (the module and everything it imported first) and by self time.
+#
+#   python importProfile.py                      main, top 25
+#   python importProfile.py asyncApp --top 40
+#   python importProfile.py --output imports.json --budget-ms 400   exit 1 if the import is slower
+#
+# The environment is passed through, so DATA_BACKEND etc. apply as they would in the server.
+
+
+def profile(module, runs=1):
+    # Returns (total_ms, [{"module", "self_ms", "cumulative_ms", "depth"}]); with several runs,
+    # the fastest one, which has the least noise from the rest of the machine
+    best = None
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+        entries = _parse(completed.stderr)
+        total = next((e["cumulative_ms"] for e in entries if e["module"] == module and e["depth"] == 0), None)
+        if total is None:
+            total = sum(e["self_ms"] for e in entries)
+        if best is None or total < best[0]:
+            best = (total, entries)
+    return best
+
+
+def _parse(stderr):
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        stripped = name.lstrip()
+        entries.append({
+            "module": stripped.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "depth": (len(name) - len(stripped) - 1) // 2,
+        })
+    return entries
+
+
+def report(module, total, entries, top):
+    print(f"import {module}: {total:.1f} ms, {len(entries)} modules\n")
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for entry in sorted(entries, key=lambda e: e["cumulative_ms"], reverse=True)[:top]:
+        print(f"{entry['cumulative_ms']:>14.1f}{entry['self_ms']:>10.1f}  {'  ' * entry['depth']}{entry['module']}")
+    print(f"\n{'self ms':>14}  module")
+    for entry in sorted(entries, key=lambda e: e["self_ms"], reverse=True)[:top]:
+        print(f"{entry['self_ms']:>14.1f}  {entry['module']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report where the app's import time goes")
+    parser.add_argument("module", nargs="?", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--runs", type=int, default=3, help="report the fastest of this many imports")
+    parser.add_argument("--output", help="write the full profile as JSON to this path")
+    parser.add_argument("--budget-ms", type=float, help="exit 1 if the import takes longer than this")
+    args = parser.parse_args(argv)
+
+    total, entries = profile(args.module, args.runs)
+    report(args.module, total, entries, args.top)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"module": args.module, "total_ms": total, "modules": entries}, f, indent=2)
+        print(f"\nProfile written to {args.output}")
+
+    if args.budget_ms is not None and total > args.budget_ms:
+        print(f"\nimport {args.module} took {total:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
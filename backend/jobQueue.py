@@ -0,0 +1,349 @@
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Background jobs for slow side effects (auth sign-ups, bulk updates).
+# A route validates its input, submits a job and answers 202 with the job id straight away; a small
+# worker pool makes the upstream calls, so a slow Supabase ties up pool workers instead of request
+# workers. GET /jobs/<id> reports status, progress and the result.
+#
+#   JOB_EXECUTOR=thread (default) | process   how jobs run; process workers start fresh (forkserver
+#                                              where there is one, else spawn) and import the modules
+#                                              that registered the tasks
+#   JOB_WORKERS=4                              pool size
+#   JOB_STORE=memory (default) | sqlite        where job records live
+#   JOB_DB_PATH=jobs.sqlite3                   the sqlite store's file
+#
+# The memory store is per process: with several server workers, poll /jobs/<id> on the one that
+# accepted the job, or use the sqlite store. Its records are shared by every process, survive
+# restarts (jobs still queued are picked up again by resume()) and let process workers report progress.
+#
+# Secrets a job needs (a new user's password) never reach either store: submit() keeps them in the
+# accepting process's memory and hands them to the worker with the payload. A job resumed after a
+# restart runs without them, and its handler has to say so.
+
+EXECUTOR = os.environ.get("JOB_EXECUTOR", "thread").lower()
+WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+STORE = os.environ.get("JOB_STORE", "memory").lower()
+DB_PATH = os.environ.get("JOB_DB_PATH", "jobs.sqlite3")
+RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", 3600))
+# A job still "running" this long after it started was cut off by a restart
+STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", 600))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+_TASKS = {}
+_FINISHERS = {}
+
+logger = logging.getLogger(__name__)
+
+
+def task(name, finished=None):
+    # Registers handler(payload, progress) -> (body, status_code) under `name`.
+    # progress(done, total) may be called any number of times while it runs.
+    # finished(payload, body) runs in the process that accepted the job once it is over, whichever
+    # executor ran it: that's where the caches a job's writes make stale live.
+    def register(handler):
+        _TASKS[name] = handler
+        if finished is not None:
+            _FINISHERS[name] = finished
+        return handler
+    return register
+
+
+def _import_tasks(modules):
+    # Process worker initializer: a fresh interpreter only knows the tasks of the modules it imports
+    for module in modules:
+        importlib.import_module(module)
+
+
+def _execute(kind, payload, progress):
+    # Returns (status, body, status_code, error); a handler's 4xx/5xx answer counts as failed
+    try:
+        body, status_code = _TASKS[kind](payload, progress)
+    except Exception as e:
+        logger.exception("Background job %s failed", kind)
+        return FAILED, None, 500, str(e)
+    return (SUCCEEDED if status_code < 400 else FAILED), body, status_code, None
+
+
+def _public(job):
+    # What /jobs/<id> shows; the payload stays in the store
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": {"done": job["done"], "total": job["total"]} if job["total"] else None,
+        "status_code": job["status_code"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+
+
+class MemoryJobStore:
+    shared = False
+
+    def __init__(self, retention=RETENTION_SECONDS):
+        self.retention = retention
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, kind, payload):
+        job = {
+            "id": uuid.uuid4().hex, "kind": kind, "payload": payload, "status": QUEUED,
+            "done": 0, "total": 0, "status_code": None, "result": None, "error": None,
+            "created_at": time.time(), "started_at": None, "finished_at": None,
+        }
+        with self._lock:
+            self._prune()
+            self._jobs[job["id"]] = job
+        return job["id"]
+
+    def claim(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != QUEUED:
+                return None
+            job.update(status=RUNNING, started_at=time.time())
+            return dict(job)
+
+    def progress(self, job_id, done, total):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(done=done, total=total)
+
+    def finish(self, job_id, status, body, status_code, error):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(status=status, result=body, status_code=status_code, error=error,
+                           finished_at=time.time(), payload=None)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return _public(job) if job is not None else None
+
+    def queued(self):
+        return []  # nothing outlives the process
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [i for i, job in self._jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]:
+            del self._jobs[job_id]
+
+
+class SqliteJobStore:
+    shared = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        payload TEXT,
+        status TEXT NOT NULL,
+        done INTEGER NOT NULL DEFAULT 0,
+        total INTEGER NOT NULL DEFAULT 0,
+        status_code INTEGER,
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+    """
+
+    def __init__(self, path=DB_PATH, retention=RETENTION_SECONDS):
+        self.path = path
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        # One connection per process; a forked child must not reuse its parent's
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    def create(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM jobs WHERE finished_at < ?", (now - self.retention,))
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), QUEUED, now),
+            )
+        return job_id
+
+    def claim(self, job_id):
+        # Conditional update: of all the processes sharing the file, exactly one gets the job
+        rows = self._execute(
+            "UPDATE jobs SET status = ?, started_at = ? WHERE id = ? AND status = ? RETURNING *",
+            (RUNNING, time.time(), job_id, QUEUED),
+        )
+        return self._row(rows[0]) if rows else None
+
+    def progress(self, job_id, done, total):
+        self._execute("UPDATE jobs SET done = ?, total = ? WHERE id = ?", (done, total, job_id))
+
+    def finish(self, job_id, status, body, status_code, error):
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, status_code = ?, error = ?, finished_at = ?, payload = NULL "
+            "WHERE id = ?",
+            (status, json.dumps(body, default=str), status_code, error, time.time(), job_id),
+        )
+
+    def get(self, job_id):
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return _public(self._row(rows[0])) if rows else None
+
+    def queued(self):
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, status_code = 500, finished_at = ?, payload = NULL "
+            "WHERE status = ? AND started_at < ?",
+            (FAILED, "Interrupted by a restart", now, RUNNING, now - STALE_SECONDS),
+        )
+        return [row["id"] for row in self._execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,))]
+
+    @staticmethod
+    def _row(row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"]) if job["payload"] else None
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+def _run_in_child(kind, payload, job_id, db_path):
+    # Process workers report progress straight into a shared store, if there is one
+    progress = lambda done, total: None  # noqa: E731
+    if db_path is not None:
+        store = SqliteJobStore(db_path)
+        progress = lambda done, total: store.progress(job_id, done, total)  # noqa: E731
+    return _execute(kind, payload, progress)
+
+
+class JobQueue:
+    def __init__(self, store, executor=EXECUTOR, workers=WORKERS):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown JOB_EXECUTOR: {executor}")
+        self.store = store
+        self.executor = executor
+        self.workers = workers
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        self._secrets = {}  # job id -> secrets for it, until a worker takes them
+
+    def _workers(self):
+        # Pools are per process, like the Supabase client: worker threads don't survive a fork
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            with self._lock:
+                if self._pool is None or self._pool_pid != pid:
+                    if self.executor == "process":
+                        # Not forked from this process: its logging, fan-out and upstream threads
+                        # would be copied mid-flight. Children build their own client.
+                        methods = multiprocessing.get_all_start_methods()
+                        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                        # __main__ is re-imported by multiprocessing itself
+                        modules = sorted({h.__module__ for h in _TASKS.values()} - {"__main__"})
+                        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                                         initializer=_import_tasks, initargs=(modules,))
+                    else:
+                        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="jobs")
+                    self._pool_pid = pid
+        return self._pool
+
+    def submit(self, kind, payload, secrets=None):
+        # secrets are merged into the payload the handler sees, but only ever held in memory
+        if kind not in _TASKS:
+            raise KeyError(f"Unknown job kind: {kind}")
+        job_id = self.store.create(kind, payload)
+        if secrets:
+            self._secrets[job_id] = secrets
+        self._dispatch(job_id)
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def resume(self):
+        # Dispatches jobs left queued by a previous run (sqlite store); returns how many
+        job_ids = self.store.queued()
+        for job_id in job_ids:
+            self._dispatch(job_id)
+        return len(job_ids)
+
+    def _dispatch(self, job_id):
+        if self.executor == "thread":
+            self._workers().submit(self._run, job_id)
+            return
+        secrets = self._secrets.pop(job_id, None)
+        job = self.store.claim(job_id)
+        if job is None:
+            return
+        db_path = self.store.path if self.store.shared else None
+        # The secrets reach the child through the pool's pipe, not the store
+        payload = dict(job["payload"], **(secrets or {}))
+        future = self._workers().submit(_run_in_child, job["kind"], payload, job_id, db_path)
+        future.add_done_callback(lambda done: self._record(job, done))
+
+    def _run(self, job_id):
+        secrets = self._secrets.pop(job_id, None)
+        job = self.store.claim(job_id)
+        if job is None:
+            return  # another process (shared store) got it first
+        progress = lambda done, total: self.store.progress(job_id, done, total)  # noqa: E731
+        self._finish(job, _execute(job["kind"], dict(job["payload"], **(secrets or {})), progress))
+
+    def _record(self, job, future):
+        try:
+            outcome = future.result()
+        except Exception as e:
+            outcome = (FAILED, None, 500, f"Worker process failed: {e}")
+        self._finish(job, outcome)
+
+    def _finish(self, job, outcome):
+        # Caches are dropped before the job reads as finished, so a poller that sees it done reads fresh data
+        finished = _FINISHERS.get(job["kind"])
+        if finished is not None:
+            try:
+                finished(job["payload"], outcome[1])
+            except Exception:
+                logger.exception("Finishing background job %s failed", job["kind"])
+        self.store.finish(job["id"], *outcome)
+
+
+def create_queue():
+    if STORE == "sqlite":
+        return JobQueue(SqliteJobStore())
+    if STORE == "memory":
+        return JobQueue(MemoryJobStore())
+    raise ValueError(f"Unknown JOB_STORE: {STORE}")
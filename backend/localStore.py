@@ -0,0 +1,610 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import jwt
+
+# Local stand-in for the hosted Supabase project, backed by SQLite (in memory or on disk).
+# It implements the part of the supabase-py client the routes use: table(...) query builders
+# (select/insert/update/upsert/delete with eq/in_/gt/... filters, order, limit, and embedding of
+# the resources listed in EMBEDS, e.g. select("user_id, users(id, name)")) and a small auth stub.
+# Select it with DATA_BACKEND=sqlite so the API can be load-tested and profiled offline.
+#
+# It can also misbehave on purpose, to exercise upstream.py's deadlines, retries and circuit breaker
+# offline. Faults apply to table calls and auth calls alike (client.store.faults.configure(...) at
+# run time):
+#   LOCAL_FAULT_ERROR_RATE=0.1         share of calls that fail with InjectedFault, a connection error
+#   LOCAL_FAULT_LATENCY=0.5            seconds added to a call
+#   LOCAL_FAULT_LATENCY_RATE=1.0       share of calls that get the added latency
+#   LOCAL_FAULT_TABLES=projects,auth   only these tables ("auth" for auth calls); default all
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS companies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    "authId" TEXT,
+    name TEXT,
+    email TEXT,
+    role TEXT,
+    company TEXT,
+    company_name TEXT,
+    project INTEGER,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS users_auth_id ON users ("authId");
+CREATE INDEX IF NOT EXISTS users_company ON users (company);
+CREATE INDEX IF NOT EXISTS users_company_name ON users (company_name);
+CREATE INDEX IF NOT EXISTS users_project ON users (project);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    description TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    company TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS projects_company ON projects (company, id);
+CREATE TABLE IF NOT EXISTS comments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    "projectId" INTEGER,
+    content TEXT,
+    created_at TEXT,
+    "userAuthId" TEXT
+);
+CREATE INDEX IF NOT EXISTS comments_project_id ON comments ("projectId", id);
+CREATE TABLE IF NOT EXISTS project_members (
+    project_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    created_at TEXT,
+    PRIMARY KEY (project_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS project_members_user ON project_members (user_id, project_id);
+CREATE TABLE IF NOT EXISTS auth_users (
+    id TEXT PRIMARY KEY,
+    email TEXT UNIQUE,
+    password TEXT,
+    user_metadata TEXT
+);
+"""
+
+# Resources each table can embed: embedded table -> (local column, embedded table's column).
+# Rows without a match embed null, like PostgREST's default (left) join.
+EMBEDS = {
+    "project_members": {"users": ("user_id", "id"), "projects": ("project_id", "id")},
+}
+# One-to-many embeds, which can only be counted: select("id, comments(count)") embeds [{"count": n}]
+COUNTED_EMBEDS = {
+    "projects": {"comments": ("id", "projectId")},
+}
+
+
+# Access tokens from LocalAuth are real HS256 JWTs with Supabase's claim layout, so local
+# verification (authClaims.py) behaves the same against this backend
+JWT_SECRET = os.environ.get("LOCAL_JWT_SECRET", "local-development-secret-not-for-production")
+TOKEN_LIFETIME_SECONDS = 3600
+
+
+class LocalStoreError(Exception):
+    pass
+
+
+class InjectedFault(ConnectionError):
+    pass
+
+
+class FaultInjector:
+    def __init__(self, error_rate=0.0, latency=0.0, latency_rate=1.0, tables=None):
+        self.configure(error_rate, latency, latency_rate, tables)
+
+    @classmethod
+    def from_env(cls):
+        tables = os.environ.get("LOCAL_FAULT_TABLES")
+        return cls(
+            error_rate=float(os.environ.get("LOCAL_FAULT_ERROR_RATE", 0)),
+            latency=float(os.environ.get("LOCAL_FAULT_LATENCY", 0)),
+            latency_rate=float(os.environ.get("LOCAL_FAULT_LATENCY_RATE", 1)),
+            tables=[t.strip() for t in tables.split(",") if t.strip()] if tables else None,
+        )
+
+    def configure(self, error_rate=0.0, latency=0.0, latency_rate=1.0, tables=None):
+        # Called with no arguments, turns every fault off
+        self.error_rate = error_rate
+        self.latency = latency
+        self.latency_rate = latency_rate
+        self.tables = set(tables) if tables else None
+
+    def __call__(self, target):
+        # Runs before the store's lock is taken, so a slow call doesn't hold up the others
+        if self.tables is not None and target not in self.tables:
+            return
+        if self.latency and random.random() < self.latency_rate:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            raise InjectedFault(f"Injected fault on {target}")
+
+
+class LocalResponse:
+    # Mirrors the attributes routes read from postgrest's APIResponse
+    def __init__(self, data, count=None, status_code=200):
+        self.data = data
+        self.count = count
+        self.status_code = status_code
+        self.error = None
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _split_select(columns):
+    # "id, users(id, name)" -> ["id", "users(id, name)"]: commas inside an embed don't split
+    parts, depth, current = [], 0, ""
+    for char in columns:
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        current += char
+    parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _or_conditions(filters):
+    # 'email.ilike."a,b",name.eq.x' -> [("email", "ilike", "a,b"), ("name", "eq", "x")]; inside double
+    # quotes a backslash escapes the next character
+    conditions, current, quoted, escaped = [], "", False, False
+    for char in filters:
+        if escaped:
+            current += char
+            escaped = False
+        elif quoted and char == "\\":
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == "," and not quoted:
+            conditions.append(current)
+            current = ""
+        else:
+            current += char
+    conditions.append(current)
+    parsed = []
+    for condition in conditions:
+        parts = condition.strip().split(".", 2)
+        if len(parts) != 3:
+            raise LocalStoreError(f"Invalid or_ condition: {condition}")
+        parsed.append(tuple(parts))
+    return parsed
+
+
+def _param(value):
+    # Values sqlite3 can't bind natively but PostgREST would accept as strings
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def _default_id(table):
+    # users.id is a uuid in Supabase; the other tables use identity columns
+    return str(uuid.uuid4()) if table == "users" else None
+
+
+class LocalQuery:
+    def __init__(self, store, table):
+        if table not in store.columns:
+            raise LocalStoreError(f"Unknown table: {table}")
+        self._store = store
+        self._table = table
+        self._op = "select"
+        self._columns = None
+        self._embeds = []  # (embedded table, its columns; None when it is only counted)
+        self._count = None
+        self._payload = None
+        self._filters = []
+        self._order = []
+        self._limit = None
+        self._offset = None
+
+    # -- operations -------------------------------------------------------
+
+    def select(self, *columns, count=None):
+        names = []
+        for column in columns:
+            for part in _split_select(column):
+                if part.endswith(")") and "(" in part:
+                    self._embeds.append(self._embed(part))
+                else:
+                    names.append(part)
+        if "*" in names or not (names or self._embeds):
+            self._columns = None
+        else:  # only embeds named: no columns of this table, as in PostgREST
+            self._columns = [self._column(name) for name in names]
+        self._count = count
+        return self
+
+    def insert(self, rows):
+        self._op = "insert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False):
+        # Conflicts resolve against the table's primary key / unique indexes, whatever on_conflict says.
+        # With ignore_duplicates existing rows are kept and only the new ones are returned.
+        self._op = "upsert_ignore" if ignore_duplicates else "upsert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, values):
+        self._op = "update"
+        self._payload = values
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    # -- filters ----------------------------------------------------------
+
+    def _filter(self, column, operator, value):
+        self._filters.append((f"{self._qualified(column)} {operator} ?", [_param(value)]))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "=", value)
+
+    def neq(self, column, value):
+        return self._filter(column, "!=", value)
+
+    def gt(self, column, value):
+        return self._filter(column, ">", value)
+
+    def gte(self, column, value):
+        return self._filter(column, ">=", value)
+
+    def lt(self, column, value):
+        return self._filter(column, "<", value)
+
+    def lte(self, column, value):
+        return self._filter(column, "<=", value)
+
+    def like(self, column, pattern):
+        # Backslash escapes %, _ and itself, as in PostgreSQL
+        self._filters.append((f"{self._qualified(column)} LIKE ? ESCAPE '\\'", [pattern.replace("*", "%")]))
+        return self
+
+    def ilike(self, column, pattern):
+        # SQLite's LIKE is already case-insensitive for ASCII
+        return self.like(column, pattern)
+
+    def is_(self, column, value):
+        if value is None or value == "null":
+            self._filters.append((f"{self._qualified(column)} IS NULL", []))
+            return self
+        return self._filter(column, "IS", value)
+
+    def or_(self, filters):
+        # PostgREST's or=(...) for eq, like and ilike: "email.ilike.a*,name.eq.\"Smith, J\""
+        clauses, params = [], []
+        for column, operator, value in _or_conditions(filters):
+            if operator == "eq":
+                clauses.append(f"{self._qualified(column)} = ?")
+            elif operator in ("like", "ilike"):
+                clauses.append(f"{self._qualified(column)} LIKE ? ESCAPE '\\'")
+                value = value.replace("*", "%")
+            else:
+                raise LocalStoreError(f"Unsupported operator in or_: {operator}")
+            params.append(value)
+        self._filters.append(("(" + " OR ".join(clauses) + ")", params))
+        return self
+
+    def in_(self, column, values):
+        values = [_param(value) for value in values]
+        if not values:
+            self._filters.append(("0", []))
+            return self
+        placeholders = ", ".join("?" for _ in values)
+        self._filters.append((f"{self._qualified(column)} IN ({placeholders})", values))
+        return self
+
+    # -- modifiers --------------------------------------------------------
+
+    def order(self, column, desc=False):
+        self._order.append(f"{self._qualified(column)} {'DESC' if desc else 'ASC'}")
+        return self
+
+    def limit(self, count):
+        self._limit = int(count)
+        return self
+
+    def range(self, start, end):
+        self._offset = int(start)
+        self._limit = int(end) - int(start) + 1
+        return self
+
+    def execute(self):
+        return self._store.run(self)
+
+    # -- SQL generation ---------------------------------------------------
+
+    def _column(self, name):
+        if name not in self._store.columns[self._table]:
+            raise LocalStoreError(f"Unknown column {self._table}.{name}")
+        return name
+
+    def _qualified(self, name):
+        # Table-qualified so filters stay unambiguous when embedded tables are joined in
+        return f"{_quote(self._table)}.{_quote(self._column(name))}"
+
+    def _embed(self, part):
+        name, _, inner = part[:-1].partition("(")
+        name = name.strip()
+        if name in COUNTED_EMBEDS.get(self._table, {}):
+            if _split_select(inner) != ["count"]:
+                raise LocalStoreError(f"{self._table} can only count {name}")
+            return name, None
+        if name not in EMBEDS.get(self._table, {}):
+            raise LocalStoreError(f"{self._table} cannot embed {name}")
+        known = self._store.columns[name]
+        columns = _split_select(inner)
+        if not columns or "*" in columns:
+            return name, list(known)
+        for column in columns:
+            if column not in known:
+                raise LocalStoreError(f"Unknown column {name}.{column}")
+        return name, columns
+
+    def _where(self):
+        if not self._filters:
+            return "", []
+        clauses, params = zip(*self._filters)
+        return " WHERE " + " AND ".join(clauses), [p for group in params for p in group]
+
+
+class LocalStore:
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self.faults = FaultInjector.from_env()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self.columns = {
+                table: [row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+                for table in ("companies", "users", "projects", "comments", "project_members")
+            }
+
+    def run(self, query):
+        self.faults(query._table)
+        with self._lock:
+            if query._op == "select":
+                return self._select(query)
+            if query._op in ("insert", "upsert", "upsert_ignore"):
+                return self._insert(query)
+            if query._op == "update":
+                return self._update(query)
+            return self._delete(query)
+
+    def _select(self, query):
+        table = _quote(query._table)
+        where, params = query._where()
+        names = self.columns[query._table] if query._columns is None else query._columns
+        columns = [f"{table}.{_quote(c)}" for c in names]
+        joins = ""
+        for name, embedded in query._embeds:
+            if embedded is None:
+                local, remote = COUNTED_EMBEDS[query._table][name]
+                columns.append(
+                    f"json_array(json_object('count', (SELECT COUNT(*) FROM {_quote(name)} "
+                    f"WHERE {_quote(name)}.{_quote(remote)} = {table}.{_quote(local)}))) AS {_quote(name)}"
+                )
+                continue
+            local, remote = EMBEDS[query._table][name]
+            pairs = ", ".join(f"'{c}', {_quote(name)}.{_quote(c)}" for c in embedded)
+            columns.append(
+                f"CASE WHEN {_quote(name)}.{_quote(remote)} IS NULL THEN NULL "
+                f"ELSE json_object({pairs}) END AS {_quote(name)}"
+            )
+            joins += f" LEFT JOIN {_quote(name)} ON {_quote(name)}.{_quote(remote)} = {table}.{_quote(local)}"
+        sql = f"SELECT {', '.join(columns)} FROM {table}{joins}{where}"
+        if query._order:
+            sql += " ORDER BY " + ", ".join(query._order)
+        if query._limit is not None:
+            sql += f" LIMIT {query._limit}"
+            if query._offset:
+                sql += f" OFFSET {query._offset}"
+        rows = [dict(row) for row in self._conn.execute(sql, params)]
+        for row in rows:
+            for name, _ in query._embeds:
+                if row[name] is not None:
+                    row[name] = json.loads(row[name])
+
+        count = None
+        if query._count:
+            count = self._conn.execute(f"SELECT COUNT(*) FROM {table}{where}", params).fetchone()[0]
+        return LocalResponse(rows, count=count)
+
+    def _insert(self, query):
+        table = query._table
+        inserted = []
+        self._conn.execute("BEGIN")
+        try:
+            for row in query._payload:
+                row = {key: _param(value) for key, value in row.items()}
+                if "id" not in row and _default_id(table):
+                    row["id"] = _default_id(table)
+                if "created_at" in self.columns[table] and not row.get("created_at"):
+                    row["created_at"] = datetime.utcnow().isoformat()
+                columns = [query._column(column) for column in row]
+                verb = {"upsert": "INSERT OR REPLACE", "upsert_ignore": "INSERT OR IGNORE"}.get(query._op, "INSERT")
+                sql = (
+                    f"{verb} INTO {_quote(table)} ({', '.join(_quote(c) for c in columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)}) RETURNING *"
+                )
+                inserted.extend(dict(r) for r in self._conn.execute(sql, list(row.values())).fetchall())
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return LocalResponse(inserted, status_code=201)
+
+    def _update(self, query):
+        values = {query._column(key): _param(value) for key, value in query._payload.items()}
+        where, params = query._where()
+        assignments = ", ".join(f"{_quote(column)} = ?" for column in values)
+        sql = f"UPDATE {_quote(query._table)} SET {assignments}{where} RETURNING *"
+        rows = [dict(row) for row in self._conn.execute(sql, list(values.values()) + params).fetchall()]
+        return LocalResponse(rows)
+
+    def _delete(self, query):
+        where, params = query._where()
+        sql = f"DELETE FROM {_quote(query._table)}{where} RETURNING *"
+        rows = [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+        return LocalResponse(rows)
+
+    def auth_user(self, email):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM auth_users WHERE email = ?", (email,)).fetchone()
+            return dict(row) if row else None
+
+    def create_auth_user(self, email, password, user_metadata="{}"):
+        # None if the email is already registered
+        with self._lock:
+            user_id = str(uuid.uuid4())
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO auth_users (id, email, password, user_metadata) VALUES (?, ?, ?, ?)",
+                (user_id, email, password, user_metadata),
+            ).rowcount
+            if not inserted:
+                return None
+            return {"id": user_id, "email": email, "password": password, "user_metadata": user_metadata}
+
+    def auth_user_or_create(self, email, password, user_metadata="{}"):
+        # The account for `email`, created with `password` if there is none. One statement pair under
+        # the lock, so concurrent first sign-ins agree on a single account.
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO auth_users (id, email, password, user_metadata) VALUES (?, ?, ?, ?)",
+                (str(uuid.uuid4()), email, password, user_metadata),
+            )
+            return dict(self._conn.execute("SELECT * FROM auth_users WHERE email = ?", (email,)).fetchone())
+
+
+class _Record:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.__dict__!r})"
+
+
+class LocalAuth:
+    # Just enough of supabase-py's auth client for sign_up and sign_in_with_password
+    def __init__(self, store):
+        self._store = store
+
+    def _response(self, account):
+        user = _Record(
+            id=account["id"],
+            email=account["email"],
+            role="authenticated",
+            user_metadata=json.loads(account["user_metadata"] or "{}"),
+        )
+        now = int(time.time())
+        claims = {
+            "sub": user.id,
+            "email": user.email,
+            "role": "authenticated",
+            "aud": "authenticated",
+            "iat": now,
+            "exp": now + TOKEN_LIFETIME_SECONDS,
+            "app_metadata": {},
+            "user_metadata": user.user_metadata,
+        }
+        session = _Record(
+            access_token=jwt.encode(claims, JWT_SECRET, algorithm="HS256"),
+            refresh_token=f"local-refresh-{uuid.uuid4().hex}",
+            expires_in=TOKEN_LIFETIME_SECONDS,
+        )
+        return _Record(user=user, session=session)
+
+    def sign_up(self, credentials):
+        self._store.faults("auth")
+        account = self._store.create_auth_user(credentials["email"], credentials["password"])
+        if account is None:
+            raise LocalStoreError("User already registered")
+        return self._response(account)
+
+    def sign_in_with_password(self, credentials):
+        self._store.faults("auth")
+        # First sign-in on a fresh local store creates the account, so the demo logins work offline
+        account = self._store.auth_user_or_create(credentials["email"], credentials["password"])
+        if account["password"] != credentials["password"]:
+            raise LocalStoreError("Invalid login credentials")
+        return self._response(account)
+
+
+class LocalClient:
+    def __init__(self, path=":memory:"):
+        self.store = LocalStore(path)
+        self.auth = LocalAuth(self.store)
+
+    def table(self, name):
+        return LocalQuery(self.store, name)
+
+
+class _AsyncQuery:
+    # Wraps a LocalQuery so execute() can be awaited like the async Supabase builders
+    def __init__(self, query):
+        self._query = query
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if not callable(attr):
+            return attr
+
+        def chain(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return self if result is self._query else result
+        return chain
+
+    async def execute(self):
+        return await asyncio.to_thread(self._query.execute)
+
+
+class _AsyncAuth:
+    def __init__(self, auth):
+        self._auth = auth
+
+    async def sign_up(self, credentials):
+        return await asyncio.to_thread(self._auth.sign_up, credentials)
+
+    async def sign_in_with_password(self, credentials):
+        return await asyncio.to_thread(self._auth.sign_in_with_password, credentials)
+
+
+class AsyncLocalClient:
+    # Shares the sync client's store, so both serving modes see the same data
+    def __init__(self, client):
+        self.store = client.store
+        self._client = client
+        self.auth = _AsyncAuth(client.auth)
+
+    def table(self, name):
+        return _AsyncQuery(self._client.table(name))
@@ -1,20 +1,61 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 import supabaseInit as supabase
+import structuredLog
+import metrics
+import compression
+import jsonProvider
+import staticAssets
+import authClaims
+import admission
+import resilience
+import readiness
+from upstream import UpstreamClient
+from queryCache import cache
+from pagination import PaginationError, page_params, paginate
+from fieldsets import FieldsetError, select_fields
+from conditional import conditional_get
+from singleFlight import coalesce
+from commentStream import STREAM_HEADERS, broker, parse_last_event_id, sync_events
+import dashboard
+import fanout
+import jobQueue
+import membership
+import searchIndex
 import uuid
 import logging
 from datetime import datetime
 
-supabaseClient = supabase.supabase
-
-app = Flask(__name__, static_folder="../frontend/dist", static_url_path="/")
+# Importing main leaves logging alone; the entry points (gunicorn.conf.py, asyncApp, __main__ below)
+# call structuredLog.configure()
+logger = logging.getLogger(__name__)
+
+supabaseClient = UpstreamClient(supabase.supabase)
+jobs = jobQueue.create_queue()
+
+# The built frontend is served by staticAssets (precompressed, cached) instead of Flask's static route
+app = Flask(__name__, static_folder=None)
+structuredLog.init_app(app)  # first, so every later hook (and its early answers) is logged with a request id
+jsonProvider.init_app(app)
+metrics.init_app(app)
+compression.init_app(app)
+resilience.init_app(app)  # before authClaims: its permission lookup runs under the request's deadline
+authClaims.init_app(app, supabaseClient)
+admission.init_app(app)  # after authClaims: authenticated callers are limited per token subject
+frontend = staticAssets.init_app(app)
+metrics.register_gauge("query_cache_hits_total", "Reference cache hits.", lambda: cache.hits, kind="counter")
+metrics.register_gauge("query_cache_misses_total", "Reference cache misses.", lambda: cache.misses, kind="counter")
+metrics.register_gauge("query_cache_bytes", "Approximate size of cached reference data.", lambda: cache.stats()["bytes"])
+metrics.register_gauge("comment_stream_subscribers", "Open comment stream connections.", broker.subscriber_count)
+metrics.register_gauge("log_records_dropped_total", "Log records dropped because the log queue was full.",
+                       structuredLog.dropped, kind="counter")
 
 # Allow CORS for the frontend (localhost:5173)
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
 @app.route("/")
 def home():
-    return send_from_directory(app.static_folder, "index.html")
+    return frontend.serve_path("index.html")
 
 @app.route("/loginAdmin", methods=["POST", "OPTIONS"])
 def login_admin():
@@ -59,18 +100,23 @@ def login_admin():
 
 # Example for a Flask route
 @app.route('/getProjectsByCompany', methods=['GET'])
+@coalesce()
 def get_projects_by_company():
     company_name = request.args.get('company_name')
     if not company_name:
         return jsonify({'error': 'Company name is required'}), 400
 
-    # Query the projects table where the 'company' column matches the provided company name
-    response = supabaseClient.table('projects').select('*').eq('company', company_name).execute()
+    try:
+        limit, after = page_params(request.args)
+        columns = select_fields('projects', request.args, default='id, name', required=('id',))
+    except (PaginationError, FieldsetError) as e:
+        return jsonify({'error': str(e)}), 400
 
-    projects = response.data  # This will give you a list of project records
-    project_list = [{'id': project['id'], 'name': project['name']} for project in projects]
+    # Query the projects table where the 'company' column matches the provided company name
+    query = supabaseClient.table('projects').select(columns).eq('company', company_name)
+    projects, next_cursor = paginate(query, limit, after)  # This will give you a page of project records
 
-    return jsonify({'projects': project_list}), 200
+    return jsonify({'projects': projects, 'next_cursor': next_cursor}), 200
 
 @app.route('/addCompany', methods=['POST'])
 def create_company():
@@ -87,6 +133,7 @@ def create_company():
         response = supabaseClient.table('companies').insert({
             "name": company_name
         }).execute()
+        cache.invalidate("companies")
 
         # Check if the response status is successful
         if response['status'] != 201:
@@ -101,13 +148,20 @@ def create_company():
 
 
 @app.route('/getProjectById', methods=['GET'])
+@conditional_get()
+@coalesce()
 def get_project_by_id():
     project_id = request.args.get('id')
     if not project_id:
         return jsonify({'error': 'Project ID is required'}), 400
 
+    try:
+        columns = select_fields('projects', request.args)
+    except FieldsetError as e:
+        return jsonify({'error': str(e)}), 400
+
     # Query the projects table where the 'id' matches the provided project_id
-    response = supabaseClient.table('projects').select('*').eq('id', project_id).execute()
+    response = supabaseClient.table('projects').select(columns).eq('id', project_id).execute()
 
     if not response.data:
         return jsonify({'error': 'No project found with the given ID'}), 404
@@ -172,8 +226,13 @@ def get_user():
         except ValueError:
             return jsonify({"error": "Invalid User ID format. Must be a valid UUID."}), 400
 
+        try:
+            columns = select_fields("users", request.args)
+        except FieldsetError as e:
+            return jsonify({"error": str(e)}), 400
+
         # Query the 'users' table for the record with the given user_id
-        response = supabaseClient.table("users").select("*").eq("authId", user_id).execute()
+        response = supabaseClient.table("users").select(columns).eq("authId", user_id).execute()
 
         if not response.data:
             return jsonify({"error": "User not found"}), 404
@@ -190,18 +249,26 @@ def get_user():
 def is_admin():
     try:
         auth_id = request.args.get('authId')
+        principal = authClaims.current_principal()
+
+        # A verified token for the same user already carries the role
+        if principal is not None and (not auth_id or auth_id == principal.subject):
+            return jsonify({"isAdmin": principal.is_admin})
 
         if not auth_id:
             return jsonify({"error": "Auth ID is required"}), 400
 
         # Fetch the user's role based on authId
-        response = supabaseClient.table("users").select("role").eq("authId", auth_id).execute()
+        users = cache.get_or_load(
+            "users", ("role", auth_id),
+            lambda: supabaseClient.table("users").select("role").eq("authId", auth_id).execute().data
+        )
 
-        if not response.data:
+        if not users:
             return jsonify({"error": "User not found"}), 404
 
         # Determine if the role is 'admin'
-        role = response.data[0].get("role", "").lower()
+        role = (users[0].get("role") or "").lower()
         is_admin = role == "admin"
 
         # Return the isAdmin status
@@ -216,25 +283,33 @@ def get_staff():
     try:
         user_id = request.args.get('user_id')
         company_name = request.args.get('company_name')
+        principal = authClaims.current_principal()
+
+        if principal is not None:
+            # Authorize the verified caller from their token; no users lookup needed
+            if not company_name:
+                return jsonify({"error": "Company name is required"}), 400
+            role = principal.role
+            user_company = principal.company
+        else:
+            if not user_id or not company_name:
+                return jsonify({"error": "User ID and company name are required"}), 400
 
-        if not user_id or not company_name:
-            return jsonify({"error": "User ID and company name are required"}), 400
+            # Validate if user_id is a valid UUID
+            try:
+                user_uuid = uuid.UUID(user_id)
+            except ValueError:
+                return jsonify({"error": "Invalid User ID format. Must be a valid UUID."}), 400
 
-        # Validate if user_id is a valid UUID
-        try:
-            user_uuid = uuid.UUID(user_id)
-        except ValueError:
-            return jsonify({"error": "Invalid User ID format. Must be a valid UUID."}), 400
+            # Fetch the user to check if they're an admin and get their company name
+            user_response = supabaseClient.table("users").select("role", "company_name").eq("id", user_uuid).execute()
 
-        # Fetch the user to check if they're an admin and get their company name
-        user_response = supabaseClient.table("users").select("role", "company_name").eq("id", user_uuid).execute()
+            if not user_response.data:
+                return jsonify({"error": "User not found"}), 404
 
-        if not user_response.data:
-            return jsonify({"error": "User not found"}), 404
-
-        user_data = user_response.data[0]
-        role = user_data["role"]
-        user_company = user_data["company_name"]
+            user_data = user_response.data[0]
+            role = user_data["role"]
+            user_company = user_data["company_name"]
 
         # Check if the logged-in user is an admin and if they have access to the company
         if role != 'admin' or company_name != user_company:
@@ -251,8 +326,6 @@ def get_staff():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-logging.basicConfig(level=logging.DEBUG)  # Set to DEBUG for detailed logs
-
 @app.route('/getClientsProjects', methods=['POST'])
 def get_clients_projects():
     try:
@@ -263,22 +336,23 @@ def get_clients_projects():
         if not auth_id:
             return jsonify({"error": "authId is required"}), 400
 
-        # Query Supabase to find the user by authId and get the associated project IDs
-        user_response = supabaseClient.table('users').select('project').eq('authId', auth_id).execute()
+        try:
+            limit, after = page_params(request.args, key="project_id")
+            columns = select_fields('projects', request.args)
+        except (PaginationError, FieldsetError) as e:
+            return jsonify({"error": str(e)}), 400
 
-        if not user_response.data:
+        user_id = membership.user_id_for_auth(supabaseClient, auth_id)
+        if user_id is None:
             return jsonify({"error": "No user found with the given authId"}), 404
 
-        # Extract the project IDs from the user response
-        project_ids = [user['project'] for user in user_response.data]
+        # One indexed lookup on project_members with the project rows embedded (cached)
+        projects, next_cursor = membership.index.projects(supabaseClient, user_id, columns, limit, after)
 
-        # Query the projects table using the project IDs to get the project details
-        projects_response = supabaseClient.table('projects').select('*').in_('id', project_ids).execute()
-
-        if not projects_response.data:
+        if not projects and after is None:
             return jsonify({"error": "No projects found for the user"}), 404
 
-        return jsonify({"projects": projects_response.data}), 200
+        return jsonify({"projects": projects, "next_cursor": next_cursor}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -302,6 +376,8 @@ def update_user():
             "role": role,
             "company": company
         }).eq('id', user_id).execute()
+        cache.invalidate("users")
+        membership.index.forget_user(user_id)  # member lists embed the user's name and email
 
         if response.error:
             return jsonify({"error": response.error.message}), 400
@@ -320,8 +396,7 @@ def create_project():
     end_date = data.get('end_date')
     company = data.get('company')
 
-    # Log the received company_id for debugging
-    print(f"Received company_id: {company}")  # This will log to your backend console
+    logger.debug("Creating project for company %s", company)
 
     # Ensure all fields are provided
     if not all([name, description, start_date, end_date, company]):
@@ -342,12 +417,13 @@ def create_project():
         
         # Check if the insertion was successful
         if response.data:
+            index_for_search(searchIndex.index.add_projects, response.data)
             return jsonify(response.data[0]), 201  # Return the created project
         else:
             return jsonify({'error': 'Failed to create project', 'details': response.error}), 500
     except Exception as e:
         error_message = f"An error occurred during project creation: {str(e)}"
-        print(error_message)  # Print the error to the console for debugging
+        logger.exception("Project creation failed")
         return jsonify({'error': error_message}), 500
 
 
@@ -368,32 +444,42 @@ def add_user():
     if not all([username, company, email, password, role]):
         return jsonify({'error': 'All fields are required'}), 400
 
-    # Query the users table to check if the email already exists
-    existing_user = supabaseClient.table('users').select('email').eq('email', email).execute()
-
-    if existing_user.data:
-        # If a user with the same email already exists, return an error
-        return jsonify({'error': 'Email already exists'}), 400
-
-    # If email doesn't exist, proceed with adding the new user
-
-    # Sign up the user with Supabase Auth
-    auth_response = supabaseClient.auth.sign_up({"email": email, "password": password})
-    user_sub = auth_response.user.id
-    print(auth_response)
     new_user = {
         'name': username,
         'company': company,
         'email': email,
         "role": role,
-        "authId": user_sub
-        # No hashing, storing plain text password
     }
+    # The email check, the Supabase Auth sign-up and the users row all happen in the background; the
+    # password goes with the job in memory only, never into the job store. Poll /jobs/<id> for the outcome
+    job_id = jobs.submit("addUser", {"user": new_user}, secrets={"password": password})
+    return job_accepted(job_id, "User is being added")
+
+
+@jobQueue.task("addUser", finished=lambda payload, body: cache.invalidate("users"))
+def add_user_job(payload, progress):
+    new_user = dict(payload["user"])
+    password = payload.get("password")
+    if password is None:
+        # Resumed after a restart: the password only ever lived in the process that accepted the job
+        return {'error': 'The server restarted before the user was added; add the user again'}, 409
+
+    # Query the users table to check if the email already exists
+    existing_user = supabaseClient.table('users').select('email').eq('email', new_user['email']).execute()
+    if existing_user.data:
+        return {'error': 'Email already exists'}, 400
+    progress(1, 3)
+
+    # Sign up the user with Supabase Auth
+    auth_response = supabaseClient.auth.sign_up({"email": new_user['email'], "password": password})
+    new_user["authId"] = auth_response.user.id
+    progress(2, 3)
+
     # Insert the new user into the 'users' table
-    result = supabaseClient.table('users').insert(new_user).execute()
-    
+    supabaseClient.table('users').insert(new_user).execute()
+    progress(3, 3)
 
-    return jsonify({'success': True, 'user': new_user}), 201
+    return {'success': True, 'user': new_user}, 201
 
 
 @app.route('/addProject', methods=['POST'])
@@ -412,8 +498,8 @@ def add_project():
 
     # Parse dates from string
     try:
-        start_date = datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
-        end_date = datetime.datetime.strptime(end_date, '%Y-%m-%d').date()
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
     except ValueError:
         return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD.'}), 400
 
@@ -427,6 +513,7 @@ def add_project():
     }
 
     response = supabaseClient.table('projects').insert(new_project).execute()
+    index_for_search(searchIndex.index.add_projects, response.data or [])
 
     if response.status_code == 201:
         return jsonify({'success': True, 'project': new_project}), 201
@@ -446,12 +533,15 @@ def delete_user():
 
         # Delete user from the users table
         db_response = supabaseClient.table('users').delete().eq('email', email).execute()
+        cache.invalidate("users")
+        for deleted in db_response.data or []:
+            membership.index.forget_user(deleted["id"])
 
         return jsonify({'success': True, 'message': 'User deleted successfully'}), 200
 
     except Exception as e:
         # Log any unexpected errors
-        logging.error(f"Unexpected error in /api/delete-user: {str(e)}")
+        logger.exception("Unexpected error in /api/delete-user")
         return jsonify({'error': 'An internal error occurred', 'details': str(e)}), 500
 
 
@@ -461,13 +551,16 @@ def delete_user():
 def getCompanies():
     try:
         # Query the 'companies' table to fetch company names
-        response = supabaseClient.table("companies").select("name").execute()
+        rows = cache.get_or_load(
+            "companies", "names",
+            lambda: supabaseClient.table("companies").select("name").execute().data
+        )
 
-        if not response.data:
+        if not rows:
             return jsonify({"error": "No companies found"}), 404
 
         # Extract the company names
-        companies = [company['name'] for company in response.data]
+        companies = [company['name'] for company in rows]
 
         return jsonify({"companies": companies}), 200
 
@@ -477,6 +570,7 @@ def getCompanies():
 
 
 @app.route("/getUsersByCompany", methods=["GET"])
+@coalesce()
 def get_users_by_company():
     try:
         company_name = request.args.get('company_name')
@@ -484,14 +578,20 @@ def get_users_by_company():
         if not company_name:
             return jsonify({"error": "Company name is required"}), 400
 
-        # Fetch users belonging to the selected company
-        response = supabaseClient.table("users").select("*").eq("company", company_name).execute()
-        print(response)
+        try:
+            limit, after = page_params(request.args)
+            columns = select_fields("users", request.args, required=("id",))
+        except (PaginationError, FieldsetError) as e:
+            return jsonify({"error": str(e)}), 400
 
-        if not response.data:
+        # Fetch a page of users belonging to the selected company
+        query = supabaseClient.table("users").select(columns).eq("company", company_name)
+        users, next_cursor = paginate(query, limit, after)
+
+        if not users and after is None:
             return jsonify({"error": "No users found for this company"}), 404
 
-        return jsonify({"users": response.data}), 200
+        return jsonify({"users": users, "next_cursor": next_cursor}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -529,6 +629,7 @@ def add_user_to_company():
         }
 
         insert_response = supabaseClient.table("users").insert(new_user).execute()
+        cache.invalidate("users")
 
         if insert_response.status_code != 201:
             return jsonify({"error": "Failed to add user to company"}), 500
@@ -567,6 +668,7 @@ def create_user():
         }
 
         insert_response = supabaseClient.table("users").insert(new_user).execute()
+        cache.invalidate("users")
 
         if insert_response.status_code != 201:
             return jsonify({"error": "Failed to add user to company"}), 500
@@ -580,13 +682,16 @@ def create_user():
 def get_companies():
     try:
         # Query the 'users' table to fetch company names
-        response = supabaseClient.table("users").select("company").execute()
+        rows = cache.get_or_load(
+            "users", "companies",
+            lambda: supabaseClient.table("users").select("company").execute().data
+        )
 
-        if not response.data:
+        if not rows:
             return jsonify({"error": "No companies found"}), 404
 
         # Remove duplicates by converting the list to a set and then back to a list
-        companies = list({company['company'] for company in response.data})
+        companies = list({company['company'] for company in rows})
 
         return jsonify({"companies": companies}), 200
 
@@ -594,24 +699,42 @@ def get_companies():
         return jsonify({"error": str(e)}), 500
     
 @app.route("/getAllCompanies", methods=["GET"])
+@coalesce()
 def get_all_companies():
     try:
-        response = supabaseClient.table("companies").select("*").execute()
-        if not response.data:
+        limit, after = page_params(request.args)
+        columns = select_fields("companies", request.args, required=("id",))
+    except (PaginationError, FieldsetError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        companies, next_cursor = cache.get_or_load(
+            "companies", ("all", columns, limit, after),
+            lambda: paginate(supabaseClient.table("companies").select(columns), limit, after)
+        )
+        if not companies and after is None:
             return jsonify({"error": "No companies found"}), 404
-        return jsonify({"companies": response.data}), 200
+        return jsonify({"companies": companies, "next_cursor": next_cursor}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/getAllProjects", methods=["GET"])
+@conditional_get()
+@coalesce()
 def get_all_projects():
     try:
-        # Fetch all projects from Supabase
-        response = supabaseClient.table("projects").select("*").execute()
+        limit, after = page_params(request.args)
+        columns = select_fields("projects", request.args, required=("id",))
+    except (PaginationError, FieldsetError) as e:
+        return jsonify({"error": str(e)}), 400
 
-        if response.data:
-            return jsonify({"projects": response.data}), 200
+    try:
+        # Fetch a page of projects from Supabase
+        projects, next_cursor = paginate(supabaseClient.table("projects").select(columns), limit, after)
+
+        if projects or after is not None:
+            return jsonify({"projects": projects, "next_cursor": next_cursor}), 200
         else:
             return jsonify({"error": "No projects found"}), 404
 
@@ -620,6 +743,8 @@ def get_all_projects():
 
 
 @app.route('/getUsersByProject', methods=['GET'])
+@conditional_get()
+@coalesce()
 def get_users_by_project():
     project_id = request.args.get('project_id')
 
@@ -627,38 +752,21 @@ def get_users_by_project():
         return jsonify({'error': 'Project ID is required'}), 400
 
     try:
-        # Fetch users associated with the project
-        response = supabaseClient.table('users') \
-            .select('*') \
-            .eq('project', project_id) \
-            .execute()
-
-        # Debug: Print the full response for debugging
-        print("Response from Supabase (users):", response)
+        limit, after = page_params(request.args, key="user_id")
+        columns = select_fields('users', request.args, default='id, name, email', required=('id',))
+    except (PaginationError, FieldsetError) as e:
+        return jsonify({'error': str(e)}), 400
 
-        # Extracting authId values directly
-        user_ids = [entry['authId'] for entry in response.data if entry.get('authId')]
-
-        # Debug: Print the collected user_ids
-        print("Collected user_ids:", user_ids)
+    try:
+        # One indexed lookup on project_members with the user rows embedded (cached)
+        users, next_cursor = membership.index.members(supabaseClient, project_id, columns, limit, after)
 
-        if not user_ids:
+        if not users and after is None:
             return jsonify({'error': 'No valid users found for this project'}), 404
 
-        # Fetch user details using the user_ids
-        user_response = supabaseClient.table('users') \
-            .select('id, name, email') \
-            .in_('authId', user_ids) \
-            .execute()
-
-        # Debug: Print the full user response for debugging
-        print("Response from Supabase (user details):", user_response)
-
-        return jsonify({'users': user_response.data})
+        return jsonify({'users': users, 'next_cursor': next_cursor})
 
     except Exception as e:
-        # Log the exact error for debugging
-        print("Error occurred:", str(e))
         return jsonify({'error': str(e)}), 500
 
 
@@ -667,51 +775,82 @@ def add_users_to_project():
     if request.method == "OPTIONS":
         return jsonify({"message": "CORS Preflight OK"}), 200
 
-    try:
-        data = request.json
-        # Ensure required fields are provided
-        if not data or not all(key in data for key in ("user_ids", "project_id")):
-            return jsonify({"error": "Missing required fields: user_ids, project_id"}), 400
-
-        user_ids = data["user_ids"]
-        project_id = data["project_id"]
-
-        # Check if the project exists in the database
-        project_check_response = supabaseClient.table("projects").select("id").eq("id", project_id).execute()
-
-        if not project_check_response.data:
-            return jsonify({"error": f"Project with ID '{project_id}' not found"}), 404
-
-        # Iterate over the user IDs and update the 'project' column for each user
-        updated_users = []
-        for user_id in user_ids:
-            # Check if the user exists in the database
-            user_check_response = supabaseClient.table("users").select("*").eq("id", user_id).execute()
-
-            if not user_check_response.data:
-                return jsonify({"error": f"User with ID '{user_id}' not found"}), 404
-
-            selected_user = user_check_response.data[0]
-
-            # Update the user's project column
-            update_response = supabaseClient.table("users").update({"project": project_id}).eq("id", user_id).execute()
-
-            if not update_response.data:
-                return jsonify({"error": f"Failed to update user with ID '{user_id}'"}), 500
-
-            # Add the updated user to the list
-            updated_users.append({"id": selected_user["id"], "name": selected_user["name"], "email": selected_user["email"]})
-
-        return jsonify(
-            {
-                "message": "Users successfully added to the project",
-                "updated_users": updated_users,
-                "project_id": project_id
-            }
-        ), 200
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data = request.json
+    # Ensure required fields are provided
+    if not data or not all(key in data for key in ("user_ids", "project_id")):
+        return jsonify({"error": "Missing required fields: user_ids, project_id"}), 400
+
+    user_ids = data["user_ids"]
+    if not isinstance(user_ids, list):
+        return jsonify({"error": "user_ids must be a list"}), 400
+    if not all(isinstance(user_id, (str, int)) and not isinstance(user_id, bool) for user_id in user_ids):
+        return jsonify({"error": "user_ids must be strings or integers"}), 400
+
+    # Drop duplicates (1 and "1" name the same user) but keep the caller's order for the report
+    unique = {}
+    for user_id in user_ids:
+        unique.setdefault(str(user_id), user_id)
+    user_ids = list(unique.values())
+    if not user_ids:
+        return jsonify({"error": "user_ids must not be empty"}), 400
+
+    job_id = jobs.submit("addUsersToProject", {"project_id": data["project_id"], "user_ids": user_ids})
+    return job_accepted(job_id, "Users are being added to the project")
+
+
+def _memberships_changed(payload, body):
+    user_ids = [membership.as_user_id(user_id) for user_id in payload["user_ids"]]
+    membership.index.forget(payload["project_id"], [user_id for user_id in user_ids if user_id])
+
+
+@jobQueue.task("addUsersToProject", finished=_memberships_changed)
+def add_users_to_project_job(payload, progress):
+    project_id = payload["project_id"]
+    user_ids = payload["user_ids"]
+
+    # Check if the project exists in the database
+    project_check_response = supabaseClient.table("projects").select("id").eq("id", project_id).execute()
+
+    if not project_check_response.data:
+        return {"error": f"Project with ID '{project_id}' not found"}, 404
+    progress(1, 3)
+
+    # One round trip to find which of the requested users exist; ids that aren't uuids can't name
+    # one and are left out of the filter
+    keys = {user_id: membership.as_user_id(user_id) for user_id in user_ids}
+    lookup_ids = [key for key in keys.values() if key is not None]
+    existing = {}
+    if lookup_ids:
+        existing_response = supabaseClient.table("users").select("id, name, email").in_("id", lookup_ids).execute()
+        existing = {str(user["id"]): user for user in existing_response.data}
+    found_ids = [keys[user_id] for user_id in user_ids if keys[user_id] in existing]
+    progress(2, 3)
+
+    # One multi-row insert into project_members; users already in the project are left as they are
+    added_ids = membership.index.add(supabaseClient, project_id, found_ids)
+    progress(3, 3)
+
+    results = []
+    updated_users = []
+    for user_id in user_ids:
+        key = keys[user_id]
+        if key not in existing:
+            results.append({"id": user_id, "status": "not_found"})
+            continue
+        user = existing[key]
+        updated_users.append({"id": user["id"], "name": user["name"], "email": user["email"]})
+        results.append({"id": user_id, "status": "added" if key in added_ids else "already_member"})
+
+    if not updated_users:
+        return {"error": "None of the given users could be added to the project", "results": results, "project_id": project_id}, 404
+
+    all_added = len(updated_users) == len(user_ids)
+    return {
+        "message": "Users successfully added to the project" if all_added else "Some users could not be added to the project",
+        "updated_users": updated_users,
+        "results": results,
+        "project_id": project_id
+    }, 200 if all_added else 207
 
 
 @app.route("/removeUserFromProject", methods=["POST", "OPTIONS"])
@@ -728,21 +867,16 @@ def remove_user_from_project():
 
         user_id = data["user_id"]
         project_id = data["project_id"]
-
-        # Check if the user exists in the database
-        user_check_response = supabaseClient.table("users").select("id, project").eq("id", user_id).execute()
-        if not user_check_response.data:
+        if membership.as_user_id(user_id) is None:
             return jsonify({"error": f"User with ID '{user_id}' not found"}), 404
 
-        user = user_check_response.data[0]
-
-        # Verify the user is currently associated with the specified project
-        if user.get("project") != project_id:
+        # Remove the membership; nothing deleted means the user wasn't in the project (or doesn't exist)
+        if not membership.index.remove(supabaseClient, project_id, membership.as_user_id(user_id)):
+            user_check_response = supabaseClient.table("users").select("id").eq("id", user_id).execute()
+            if not user_check_response.data:
+                return jsonify({"error": f"User with ID '{user_id}' not found"}), 404
             return jsonify({"error": f"User with ID '{user_id}' is not associated with project '{project_id}'"}), 400
 
-        # Remove the user from the project
-        supabaseClient.table("users").update({"project": None}).eq("id", user_id).execute()
-
         # Return a success response
         return jsonify({"message": f"User with ID '{user_id}' removed from project '{project_id}' successfully"}), 200
 
@@ -751,34 +885,71 @@ def remove_user_from_project():
 
 
 @app.route("/getCommentsByProject", methods=["GET"])
+@conditional_get()
+@coalesce()
 def get_comments_by_project():
     try:
-        project_id = request.args.get('project_id')
+        limit, after = page_params(request.args)
+        columns = select_fields("comments", request.args, required=("id", "userAuthId"))
+    except (PaginationError, FieldsetError) as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Fetch comments for the given project ID
-        comments_response = supabaseClient.table("comments").select("*").eq("projectId", project_id).execute()
-        
-        if not comments_response.data:
-            return jsonify({"comments": []})
+    try:
+        project_id = request.args.get('project_id')
 
-        # Fetch the user names for the userIds in the comments
-        user_ids = [comment["userAuthId"] for comment in comments_response.data]
-        users_response = supabaseClient.table("users").select("authId, name").in_("authId", user_ids).execute()
+        # Fetch a page of comments for the given project ID, oldest first
+        query = supabaseClient.table("comments").select(columns).eq("projectId", project_id)
+        comments, next_cursor = paginate(query, limit, after)
         
-        # Create a dictionary for quick lookup of user names by userId
-        user_dict = {user["authId"]: user["name"] for user in users_response.data}
-
-        # Add the user names to the comments
-        for comment in comments_response.data:
-            comment["userName"] = user_dict.get(comment["userAuthId"], "Unknown")
+        if not comments:
+            return jsonify({"comments": [], "next_cursor": None})
 
         # Return comments with user names
-        return jsonify({"comments": comments_response.data})
+        return jsonify({"comments": attach_user_names(comments), "next_cursor": next_cursor})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def attach_user_names(comments):
+    # Fetch the user names for the userIds in the comments with one query
+    user_ids = list({comment["userAuthId"] for comment in comments})
+    users_response = supabaseClient.table("users").select("authId, name").in_("authId", user_ids).execute()
+
+    # Create a dictionary for quick lookup of user names by userId
+    user_dict = {user["authId"]: user["name"] for user in users_response.data}
+
+    # Add the user names to the comments
+    for comment in comments:
+        comment["userName"] = user_dict.get(comment["userAuthId"], "Unknown")
+    return comments
+
+
+# Most comments a reconnecting watcher is sent to catch up on
+STREAM_BACKLOG_LIMIT = 100
+
+
+@app.route("/projects/<project_id>/comments/stream", methods=["GET"])
+def stream_project_comments(project_id):
+    # Subscribe before reading the backlog so nothing posted in between is missed
+    subscription = broker.subscribe(project_id)
+
+    # Only a reconnecting client (Last-Event-ID) costs a query; live comments come from the broker
+    backlog = []
+    last_event_id = parse_last_event_id(request.headers.get("Last-Event-ID"))
+    if last_event_id is not None:
+        try:
+            backlog = supabaseClient.table("comments").select("*").eq("projectId", project_id) \
+                .gt("id", last_event_id).order("id").limit(STREAM_BACKLOG_LIMIT).execute().data
+            if backlog:
+                attach_user_names(backlog)
+        except Exception as e:
+            broker.unsubscribe(subscription)
+            return jsonify({"error": str(e)}), 500
+
+    return Response(sync_events(subscription, backlog), mimetype="text/event-stream", headers=STREAM_HEADERS)
+
+
 
 
 
@@ -810,6 +981,8 @@ def add_comment():
 
         # Check if the response has data (successful insertion)
         if response.data:
+            publish_comment(response.data[0])
+            index_for_search(searchIndex.index.add_comment, response.data[0], supabaseClient)
             return jsonify({
                 "message": "Comment added successfully",
                 "comment": {
@@ -824,24 +997,216 @@ def add_comment():
 
     except Exception as e:
         # Log the error for debugging and return a generic error message
-        print(f"Error adding comment: {e}")
+        logger.exception("Failed to add comment")
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+def publish_comment(comment):
+    if not broker.has_subscribers(comment["projectId"]):
+        return
+    try:
+        # Resolve the author's name once here (through the shared name cache) instead of once per watcher
+        sender = comment.get("userAuthId")
+        users = cache.get_or_load(
+            "users", ("name", sender),
+            lambda: supabaseClient.table('users').select('name').eq('authId', sender).execute().data
+        )
+        broker.publish(comment["projectId"], dict(comment, userName=users[0]["name"] if users else "Unknown"))
+    except Exception as e:
+        # The comment is stored; watchers will pick it up on their next reconnect
+        logger.error("Failed to publish comment %s: %s", comment.get("id"), e)
+
+
+def index_for_search(add, *args):
+    # The row is stored either way; if indexing fails it shows up in /search after the next reindex
+    try:
+        add(*args)
+    except Exception:
+        logger.exception("Failed to update the search index")
+
+
 @app.route('/getUserNameById', methods=['GET'])
 def get_user_name_by_id():
     user_id = request.args.get('user_id')
     
     # Query Supabase to get the user's name using the user_id
-    response = supabaseClient.table('users').select('name').eq('authId', user_id).execute()
+    users = cache.get_or_load(
+        "users", ("name", user_id),
+        lambda: supabaseClient.table('users').select('name').eq('authId', user_id).execute().data
+    )
     
     # Return the user name directly if found
-    if response.data:
-        user_name = response.data[0]['name']
+    if users:
+        user_name = users[0]['name']
         return jsonify({"name": user_name}), 200
     
     # If no user found, return a 404 without error handling
     return jsonify({"error": "User not found"}), 404
 
 
+@app.route("/export/<any(projects, users, comments):table>", methods=["GET"])
+def export_table(table):
+    # Streams the whole table (optionally ?company=, ?since=, ?until=, ?fields=) as NDJSON or CSV
+    import dataExport  # loaded on first use, like bulkImport: only admins' occasional exports need it
+    company = request.args.get("company")
+    principal = authClaims.current_principal()
+    if principal is None:
+        return jsonify({"error": "Authentication required"}), 401
+    if not principal.is_admin:
+        if company and company != principal.company:
+            return jsonify({"error": "You are not authorized to export this company"}), 403
+        if not principal.company:
+            return jsonify({"error": "Your account is not linked to a company"}), 403
+        company = principal.company
+
+    try:
+        fmt = dataExport.export_format(request.args, request.headers.get("Accept"))
+        since, until = dataExport.date_range(request.args)
+        columns = select_fields(table, request.args, required=("id",))
+    except (dataExport.ExportError, FieldsetError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    pages = dataExport.pages(supabaseClient, table, columns, company, since, until)
+    if fmt == "csv":
+        header = [column.strip() for column in columns.split(",")] if columns != "*" else None
+        chunks = dataExport.csv_chunks(pages, header)
+    else:
+        chunks = dataExport.ndjson_chunks(pages)
+
+    headers = {"Content-Disposition": f'attachment; filename="{table}.{fmt}"', "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(chunks), mimetype=dataExport.MIMETYPES[fmt], headers=headers)
+
+
+IMPORTERS = {"users": "import_users", "projects": "import_projects"}
+
+
+@app.route("/import/<any(users, projects):kind>", methods=["POST"])
+def bulk_import(kind):
+    # Body: CSV with a header row, or NDJSON, read as it arrives rather than buffered.
+    # Responds with one NDJSON result line per row, streamed as each batch completes.
+    import bulkImport  # loaded on first use
+    principal = authClaims.current_principal()
+    if principal is None:
+        return jsonify({"error": "Authentication required"}), 401
+    if not principal.is_admin:
+        return jsonify({"error": "Only admins can import data"}), 403
+
+    try:
+        batch_size = bulkImport.batch_size_param(request.args)
+        fmt = bulkImport.upload_format(request.args, request.content_type)
+    except bulkImport.BulkImportError as e:
+        return jsonify({"error": str(e)}), 400
+
+    rows = bulkImport.read_rows(request.stream, fmt)
+    results = getattr(bulkImport, IMPORTERS[kind])(supabaseClient, rows, batch_size)
+    return Response(stream_with_context(bulkImport.ndjson_results(results)), mimetype="application/x-ndjson")
+
+
+@app.route("/search", methods=["GET"])
+@conditional_get()
+def search():
+    # Ranked full-text search over a company's projects and comments (?q=, ?company=, ?type=)
+    query = request.args.get("q", "").strip()
+    company = request.args.get("company")
+    kind = request.args.get("type")
+    principal = authClaims.current_principal()
+    if principal is not None and not principal.is_admin:
+        if company and company != principal.company:
+            return jsonify({"error": "You are not authorized to search this company"}), 403
+        company = principal.company
+    if not query or not company:
+        return jsonify({"error": "q and company are required"}), 400
+    if kind not in (None, "project", "comment"):
+        return jsonify({"error": "type must be project or comment"}), 400
+
+    try:
+        limit, after = page_params(request.args, key=searchIndex.CURSOR_KEY)
+        hits, total, next_cursor = searchIndex.index.search(supabaseClient, company, query, limit, after, kind)
+    except (PaginationError, searchIndex.SearchError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"hits": hits, "total": total, "next_cursor": next_cursor}), 200
+
+
+@app.route("/search/reindex", methods=["POST"])
+def search_reindex():
+    principal = authClaims.current_principal()
+    if principal is None:
+        return jsonify({"error": "Authentication required"}), 401
+    if not principal.is_admin:
+        return jsonify({"error": "Only admins can rebuild the search index"}), 403
+    documents = searchIndex.index.rebuild(supabaseClient)
+    return jsonify({"documents": documents}), 200
+
+
+@app.route("/dashboard/<company>", methods=["GET"])
+@conditional_get()
+def company_dashboard(company):
+    # Everything a company screen shows, in one round trip instead of one request per list
+    principal = authClaims.current_principal()
+    if principal is not None and not principal.is_admin and principal.company != company:
+        return jsonify({"error": "You are not authorized to view this company"}), 403
+
+    try:
+        limit, _ = page_params(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # Members don't depend on the projects, so they load while the projects (and their counts) do
+        members_page = fanout.submit(paginate, dashboard.members_query(supabaseClient, company), limit)
+        projects, projects_next = paginate(dashboard.projects_query(supabaseClient, company), limit)
+        members, members_next = members_page.result()
+
+        return jsonify(dashboard.document(company, projects, projects_next, members, members_next)), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def job_accepted(job_id, message):
+    response = jsonify({"message": message, "job_id": job_id, "status": jobQueue.QUEUED, "status_url": f"/jobs/{job_id}"})
+    response.status_code = 202
+    response.headers["Location"] = f"/jobs/{job_id}"
+    return response
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    response = jsonify(job)
+    if job["status"] in (jobQueue.QUEUED, jobQueue.RUNNING):
+        response.headers["Retry-After"] = "1"
+    return response
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    return jsonify(readiness.state.health()), 200
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    ready, details = readiness.state.status()
+    response = jsonify(details)
+    response.status_code = 200 if ready else 503
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@app.route("/cacheStats", methods=["GET"])
+def cache_stats():
+    return jsonify(cache.stats()), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
+    structuredLog.configure()
+    jobs.resume()
     app.run(debug=True, port=8080)
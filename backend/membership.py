@@ -0,0 +1,100 @@
+import uuid
+
+from pagination import paginate
+from queryCache import cache
+
+# Project membership, many-to-many: one project_members row per (project, user).
+# The table's primary key is (project_id, user_id) and a second index covers (user_id, project_id)
+# (DDL in project_members.sql), so "users of a project" and "projects of a user" are each a single
+# index range scan. Member and project details come back embedded in that same query
+# (select("user_id, users(id, name)")), so neither direction needs a follow-up in_() lookup.
+#
+# MembershipIndex keeps those pages in the query cache (table "project_members"), keyed by the
+# project or user they list, so repeat reads of a busy project or user cost no round trip. A
+# membership write drops the pages of that project and those users only (for add(), the
+# addUsersToProject job does, in the serving process); a change to a user's details drops their
+# own pages and the member pages that embed them.
+
+TABLE = "project_members"
+
+
+def members_query(client, project_id, columns="id, name, email"):
+    return client.table(TABLE).select(f"user_id, users({columns})").eq("project_id", project_id)
+
+
+def projects_query(client, user_id, columns="*"):
+    return client.table(TABLE).select(f"project_id, projects({columns})").eq("user_id", user_id)
+
+
+def as_user_id(value):
+    # users.id is a uuid; anything else can't name a user (and Postgres rejects a filter holding it)
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def _embedded(rows, name):
+    # Unwraps the embedded rows; a membership whose user or project was deleted embeds null
+    return [row[name] for row in rows if row.get(name)]
+
+
+def user_id_for_auth(client, auth_id):
+    # users.id for an authId, through the shared users cache; None if there is no such user
+    rows = cache.get_or_load(
+        "users", ("id", auth_id),
+        lambda: client.table("users").select("id").eq("authId", auth_id).execute().data
+    )
+    return rows[0]["id"] if rows else None
+
+
+class MembershipIndex:
+    def __init__(self, query_cache=cache):
+        self.cache = query_cache
+
+    def members(self, client, project_id, columns, limit, after=None):
+        # Returns (users, next_cursor); cursors are keyed on user_id
+        def load():
+            rows, next_cursor = paginate(members_query(client, project_id, columns), limit, after, key="user_id")
+            return _embedded(rows, "users"), next_cursor
+        return self.cache.get_or_load(TABLE, ("project", str(project_id), columns, limit, after), load)
+
+    def projects(self, client, user_id, columns, limit, after=None):
+        # Returns (projects, next_cursor); cursors are keyed on project_id
+        def load():
+            rows, next_cursor = paginate(projects_query(client, user_id, columns), limit, after, key="project_id")
+            return _embedded(rows, "projects"), next_cursor
+        return self.cache.get_or_load(TABLE, ("user", str(user_id), columns, limit, after), load)
+
+    def add(self, client, project_id, user_ids):
+        # Returns the ids that were not members before; existing memberships are left untouched.
+        # No forget() here: this runs in a job, possibly in a worker process with caches of its own;
+        # the job's finisher drops the serving process's pages
+        if not user_ids:
+            return set()
+        rows = [{"project_id": project_id, "user_id": user_id} for user_id in user_ids]
+        response = client.table(TABLE).upsert(rows, on_conflict="project_id,user_id", ignore_duplicates=True).execute()
+        return {str(row["user_id"]) for row in response.data}
+
+    def remove(self, client, project_id, user_id):
+        # True if the user was a member
+        response = client.table(TABLE).delete().eq("project_id", project_id).eq("user_id", user_id).execute()
+        self.forget(project_id, [user_id])
+        return bool(response.data)
+
+    def forget(self, project_id, user_ids):
+        # After a membership write: the project's member pages and each user's project pages
+        self.cache.invalidate_prefix(TABLE, ("project", str(project_id)))
+        for user_id in user_ids:
+            self.cache.invalidate_prefix(TABLE, ("user", str(user_id)))
+
+    def forget_user(self, user_id):
+        # After a change to the user's details: their project pages, and the member pages listing them
+        user_id = str(user_id)
+        self.cache.invalidate_prefix(TABLE, ("user", user_id))
+        self.cache.invalidate_prefix(
+            TABLE, ("project",), where=lambda page: any(str(user.get("id")) == user_id for user in page[0])
+        )
+
+
+index = MembershipIndex()
@@ -0,0 +1,240 @@
+import contextvars
+import re
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+# Request and upstream-call instrumentation, rendered in the Prometheus text format at /metrics.
+# Every request records its route, status and latency; every data-backend call made while handling
+# it (see upstream.py) records table, operation, duration and row count, and is summarised back to
+# the client in a Server-Timing header so N+1 routes and slow queries show up in browser devtools.
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CALL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+# Server-Timing entries per response beyond the totals; keeps headers small on chatty routes
+MAX_TIMING_ENTRIES = 10
+
+# Upstream calls of the asyncApp native request in flight; Flask requests keep theirs on g. A list
+# shared by reference, so calls made from gathered tasks and worker threads (context copies) count.
+_native_calls = contextvars.ContextVar("native_upstream_calls", default=None)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge:
+    # Value is read from a callback at scrape time; kind="counter" for totals kept elsewhere
+    def __init__(self, name, help_text, read, kind="gauge"):
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.kind = kind
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", f"{self.name} {self.read()}"]
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _label_text(self.labels + ("le",), label_values + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _label_text(self.labels + ("le",), label_values + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                labels = _label_text(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {round(series[-2], 6)}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP requests handled, by route, method and status.", ("route", "method", "status")))
+request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests.", ("route",)))
+upstream_calls_per_request = registry.register(Histogram(
+    "http_request_upstream_calls", "Data backend calls made per HTTP request.", ("route",), CALL_COUNT_BUCKETS))
+upstream_calls_total = registry.register(Counter(
+    "upstream_calls_total", "Data backend calls, by table, operation and outcome.", ("table", "operation", "outcome")))
+upstream_duration = registry.register(Histogram(
+    "upstream_call_duration_seconds", "Time spent in data backend calls.", ("table", "operation")))
+upstream_rows_total = registry.register(Counter(
+    "upstream_rows_total", "Rows returned by data backend calls.", ("table", "operation")))
+
+
+def register_gauge(name, help_text, read, kind="gauge"):
+    return registry.register(Gauge(name, help_text, read, kind))
+
+
+def record_upstream(table, operation, duration, rows, error=None):
+    # Called by upstream.py for every execute(); also attaches the call to the current request
+    upstream_calls_total.inc(table, operation, "error" if error else "ok")
+    upstream_duration.observe(duration, table, operation)
+    if rows:
+        upstream_rows_total.inc(table, operation, amount=rows)
+    calls = g.get("upstream_calls") if has_request_context() else _native_calls.get()
+    if calls is not None:
+        calls.append((table, operation, duration, rows))
+
+
+def _route_label():
+    # The URL rule, not the raw path, so ids in paths can't blow up label cardinality
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def _server_timing(total, calls):
+    upstream_total = sum(call[2] for call in calls)
+    entries = [
+        f"app;dur={total * 1000:.1f}",
+        f'db;desc="{len(calls)} calls";dur={upstream_total * 1000:.1f}',
+    ]
+    for i, (table, operation, duration, rows) in enumerate(calls[:MAX_TIMING_ENTRIES]):
+        entries.append(f'db{i};desc="{table} {operation} {rows} rows";dur={duration * 1000:.1f}')
+    return ", ".join(entries)
+
+
+def init_app(app):
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+        g.upstream_calls = []
+
+    @app.after_request
+    def _record_request(response):
+        started = g.get("request_started")
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+        route = _route_label()
+        calls = g.get("upstream_calls") or []
+
+        requests_total.inc(route, request.method, str(response.status_code))
+        request_duration.observe(total, route)
+        upstream_calls_per_request.observe(len(calls), route)
+        response.headers["Server-Timing"] = _server_timing(total, calls)
+        return response
+
+
+class RequestMetricsMiddleware:
+    # asyncApp's native routes, recorded like init_app records the Flask routes (the mounted Flask
+    # app records its own): same series, route labels in Flask's rule syntax, Server-Timing header
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    def _route_label(self, scope):
+        from starlette.routing import Match, Route
+        for route in self.routes:
+            if isinstance(route, Route) and route.matches(scope)[0] == Match.FULL:
+                return re.sub(r"\{(\w+)(:\w+)?\}", r"<\1>", route.path)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        route = self._route_label(scope) if scope["type"] == "http" else None
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        calls = []
+        token = _native_calls.set(calls)
+        started = time.perf_counter()
+        recorded = False
+
+        def record(status):
+            nonlocal recorded
+            recorded = True
+            total = time.perf_counter() - started
+            requests_total.inc(route, scope["method"], str(status))
+            request_duration.observe(total, route)
+            upstream_calls_per_request.observe(len(calls), route)
+            return total
+
+        async def send_with_timing(message):
+            # Recorded when the headers go out, as Flask's after_request is: a stream's lifetime
+            # isn't its latency
+            if message["type"] == "http.response.start":
+                total = record(message["status"])
+                timing = (b"server-timing", _server_timing(total, calls).encode("latin-1"))
+                message = dict(message, headers=list(message.get("headers", [])) + [timing])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _native_calls.reset(token)
+            if not recorded:
+                record(500)
+
+
+def render():
+    return registry.render()
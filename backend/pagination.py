@@ -0,0 +1,96 @@
+import base64
+import binascii
+import json
+import os
+
+# Keyset (cursor) pagination shared by the list endpoints.
+# A page is "rows whose key is greater than the last key of the previous page, ordered by key",
+# so every page is a single indexed range scan no matter how deep the client has paged.
+# Cursors are opaque to clients: base64 of the key column and the last value seen.
+
+DEFAULT_LIMIT = int(os.environ.get("PAGE_SIZE_DEFAULT", 100))
+MAX_LIMIT = int(os.environ.get("PAGE_SIZE_MAX", 1000))
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(key, value):
+    raw = json.dumps({"k": key, "v": value}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, key):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise PaginationError("Invalid cursor")
+    if not isinstance(payload, dict) or payload.get("k") != key or "v" not in payload:
+        raise PaginationError("Invalid cursor")
+    return payload["v"]
+
+
+def page_params(args, key="id"):
+    # Returns (limit, after) from the request's query string
+    raw_limit = args.get("limit")
+    if raw_limit is None:
+        limit = DEFAULT_LIMIT
+    else:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            raise PaginationError("limit must be an integer")
+        if limit < 1:
+            raise PaginationError("limit must be at least 1")
+        limit = min(limit, MAX_LIMIT)
+
+    cursor = args.get("cursor")
+    after = decode_cursor(cursor, key) if cursor else None
+    return limit, after
+
+
+def _page_query(query, limit, after, key):
+    # Fetch one extra row to learn whether another page exists without a count query
+    if after is not None:
+        query = query.gt(key, after)
+    return query.order(key).limit(limit + 1)
+
+
+def _page_result(rows, limit, key):
+    rows = rows or []
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(key, rows[-1][key])
+    return rows, next_cursor
+
+
+def paginate(query, limit, after=None, key="id"):
+    rows = _page_query(query, limit, after, key).execute().data
+    return _page_result(rows, limit, key)
+
+
+async def paginate_async(query, limit, after=None, key="id"):
+    # Same as paginate() for query builders whose execute() is a coroutine
+    response = await _page_query(query, limit, after, key).execute()
+    return _page_result(response.data, limit, key)
+
+
+def iter_pages(build_query, page_size, key="id"):
+    # Walks a whole result set one keyset page at a time, for exports too large to hold at once.
+    # build_query() must return a fresh builder per page: builders accumulate filters in place.
+    # A short page ends the walk, so page_size must not exceed the backend's row cap
+    # (PostgREST's max-rows, 1000 by default) or the export would stop early.
+    after = None
+    while True:
+        query = build_query()
+        if after is not None:
+            query = query.gt(key, after)
+        rows = query.order(key).limit(page_size).execute().data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        after = rows[-1][key]
@@ -0,0 +1,17 @@
+-- Many-to-many project membership (see membership.py). Run once in the Supabase SQL editor.
+-- The primary key serves "users of a project"; project_members_user serves "projects of a user".
+-- The foreign keys are what let PostgREST embed users(...) and projects(...) in membership selects.
+
+create table if not exists public.project_members (
+    project_id bigint not null references public.projects (id) on delete cascade,
+    user_id uuid not null references public.users (id) on delete cascade,
+    created_at timestamptz not null default now(),
+    primary key (project_id, user_id)
+);
+
+create index if not exists project_members_user on public.project_members (user_id, project_id);
+
+-- Carry over the single-project memberships held in users.project
+insert into public.project_members (project_id, user_id)
+select project, id from public.users where project is not null
+on conflict do nothing;
@@ -0,0 +1,197 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# In-process read-through cache for reference data (companies, user roles, user names).
+# Entries are grouped by table so write routes can drop everything a write may have touched.
+# Bounded by an approximate memory budget; least recently used entries are evicted first.
+# Every invalidation is stamped with a generation number: a load that was already running when its
+# table or key was invalidated read the data from before the write, so its value isn't stored.
+
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+DEFAULT_TTL = 60
+
+# Invalidation stamps kept before they are folded into one floor for every table
+MAX_INVALIDATION_STAMPS = 10_000
+
+# Seconds each table's entries stay fresh. Override with CACHE_TTL_<TABLE>=<seconds>.
+TABLE_TTLS = {
+    "companies": 300,
+    "users": 60,
+    "project_members": 60,
+}
+
+
+def _approx_size(value):
+    # Rough deep size of the JSON-like values Supabase returns (dicts, lists, scalars)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += _approx_size(k) + _approx_size(v)
+    elif isinstance(value, (list, tuple, set)):
+        for item in value:
+            size += _approx_size(item)
+    return size
+
+
+def sampled_size(rows, sample=8):
+    # Estimate for long row lists: the first few rows sized exactly, the rest assumed alike
+    if not isinstance(rows, list) or len(rows) <= sample:
+        return _approx_size(rows)
+    head = sum(_approx_size(row) for row in rows[:sample])
+    return sys.getsizeof(rows) + head * len(rows) // sample
+
+
+class QueryCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttls=None, default_ttl=DEFAULT_TTL, sizer=_approx_size):
+        self.max_bytes = max_bytes
+        self.sizer = sizer  # value -> approximate bytes
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # (table, key) -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._generation = 0
+        self._invalidated = {}  # table, or (table, key or key prefix) -> generation of its last invalidation
+        self._floor = 0         # loads started before this are never stored (the stamps were folded)
+        self.stale_loads = 0
+
+    def ttl_for(self, table):
+        return self.ttls.get(table, self.default_ttl)
+
+    def get(self, table, key):
+        entry_key = (table, key)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                self._drop(entry_key)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(entry_key)
+            self.hits += 1
+            return True, value
+
+    def set(self, table, key, value, ttl=None):
+        self._set(table, key, value, ttl)
+
+    def _set(self, table, key, value, ttl, started=None):
+        # started: the generation a load began at; the value is dropped if it was invalidated since
+        ttl = self.ttl_for(table) if ttl is None else ttl
+        if ttl <= 0:
+            return
+        size = self.sizer(value)
+        if size > self.max_bytes:
+            return
+        entry_key = (table, key)
+        with self._lock:
+            if started is not None and self._invalidated_since(table, key, started):
+                self.stale_loads += 1
+                return
+            if entry_key in self._entries:
+                self._drop(entry_key)
+            self._entries[entry_key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def get_or_load(self, table, key, loader, ttl=None):
+        # Values handed out are shared between requests; callers must not mutate them
+        found, value = self.get(table, key)
+        if found:
+            return value
+        with self._lock:
+            started = self._generation
+        value = loader()
+        self._set(table, key, value, ttl, started)
+        return value
+
+    def invalidate(self, table, key=None):
+        with self._lock:
+            self._stamp(table if key is None else (table, key))
+            if key is not None:
+                if (table, key) in self._entries:
+                    self._drop((table, key))
+                    self.invalidations += 1
+                return
+            for entry_key in [k for k in self._entries if k[0] == table]:
+                self._drop(entry_key)
+                self.invalidations += 1
+
+    def invalidate_prefix(self, table, prefix, where=None):
+        # Drops the table's entries whose (tuple) key starts with `prefix`, or only those whose value
+        # `where` accepts; loads under the prefix still in flight aren't stored either way
+        prefix = tuple(prefix)
+        with self._lock:
+            self._stamp((table, prefix))
+            for entry_key, (_, _, value) in list(self._entries.items()):
+                key = entry_key[1]
+                if entry_key[0] != table or not isinstance(key, tuple) or key[:len(prefix)] != prefix:
+                    continue
+                if where is None or where(value):
+                    self._drop(entry_key)
+                    self.invalidations += 1
+
+    def _stamp(self, target):
+        self._generation += 1
+        if len(self._invalidated) >= MAX_INVALIDATION_STAMPS:
+            self._invalidated.clear()
+            self._floor = self._generation
+        self._invalidated[target] = self._generation
+
+    def _invalidated_since(self, table, key, started):
+        if started < self._floor or self._invalidated.get(table, 0) > started:
+            return True
+        # A tuple key is covered by stamps on any of its prefixes, itself included
+        prefixes = [key[:i] for i in range(1, len(key) + 1)] if isinstance(key, tuple) else [key]
+        return any(self._invalidated.get((table, prefix), 0) > started for prefix in prefixes)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_loads": self.stale_loads,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _drop(self, entry_key):
+        _, size, _ = self._entries.pop(entry_key)
+        self._bytes -= size
+
+
+def _ttls_from_env():
+    ttls = dict(TABLE_TTLS)
+    for name, value in os.environ.items():
+        if name.startswith("CACHE_TTL_"):
+            ttls[name[len("CACHE_TTL_"):].lower()] = int(value)
+    return ttls
+
+
+cache = QueryCache(
+    max_bytes=int(os.environ.get("CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+    ttls=_ttls_from_env(),
+    default_ttl=int(os.environ.get("CACHE_DEFAULT_TTL", DEFAULT_TTL)),
+)
@@ -0,0 +1,116 @@
+import importlib
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import resilience
+import supabaseInit
+
+# Startup and readiness.
+# Importing main builds nothing: the data client, its connection pool and the heavier libraries
+# behind them are created on first use, so a new process starts serving quickly. warm_up() does
+# that work ahead of traffic instead (gunicorn.conf.py calls it per worker, asyncApp at startup)
+# and records how long it took.
+#
+#   GET /healthz   liveness: the process is up and answering; never touches the upstream
+#   GET /readyz    readiness: 200 once this process is warmed up and the data backend answers,
+#                  503 while it isn't (still warming up, last check failed, circuit breaker open),
+#                  so a load balancer only sends traffic to instances that can serve it. A process
+#                  nobody warmed up explicitly warms itself up on its first readiness check.
+#
+#   READY_CHECK_INTERVAL=5   seconds an upstream check result is reused
+#   READY_CHECK_TIMEOUT=2
+
+CHECK_INTERVAL = float(os.environ.get("READY_CHECK_INTERVAL", 5))
+CHECK_TIMEOUT = float(os.environ.get("READY_CHECK_TIMEOUT", 2))
+
+
+def deferred_modules():
+    # Imported on first use rather than with main (supabaseInit.create_supabase, authClaims.verify_token,
+    # the export and import routes)
+    routes = ["bulkImport", "dataExport"]
+    if supabaseInit.DATA_BACKEND == "sqlite":
+        return ["jwt", "localStore"] + routes
+    return ["jwt", "httpx", "supabase"] + routes
+
+
+def preload():
+    # For a server that forks workers from a preloaded app: import in the parent, share the pages
+    for name in deferred_modules():
+        importlib.import_module(name)
+
+
+class Readiness:
+    def __init__(self, interval=CHECK_INTERVAL, timeout=CHECK_TIMEOUT):
+        self.interval = interval
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.warm_up_seconds = None  # set once warm-up has succeeded
+        self._checked_at = None
+        self._check = {"ok": False, "error": "not checked yet"}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        # A forked worker starts cold: its parent's client and results aren't its own
+        self.__init__(self.interval, self.timeout)
+
+    def warm_up(self):
+        # Returns the seconds it took; raises if the data backend can't be reached
+        started = time.perf_counter()
+        preload()
+        try:
+            upstream = supabaseInit.warm_up()
+        except Exception as e:
+            self._record({"ok": False, "error": str(e)})
+            raise
+        self.warm_up_seconds = time.perf_counter() - started
+        self._record({"ok": True, "latency_ms": round(upstream * 1000, 1)})
+        return self.warm_up_seconds
+
+    def _record(self, check):
+        self._check = check
+        self._checked_at = time.monotonic()
+
+    def _probe(self):
+        # One round trip (the first one also builds the client), bounded by the check timeout
+        future = resilience.executor().submit(self.warm_up if self.warm_up_seconds is None else supabaseInit.warm_up)
+        try:
+            seconds = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self._record({"ok": False, "error": f"no answer within {self.timeout}s"})
+            return
+        except Exception as e:
+            self._record({"ok": False, "error": str(e)})
+            return
+        if self.warm_up_seconds is not None:
+            self._record({"ok": True, "latency_ms": round(seconds * 1000, 1)})
+
+    def status(self):
+        # Returns (ready, details). Concurrent callers share one upstream check.
+        due = self._checked_at is None or time.monotonic() - self._checked_at >= self.interval
+        if due and self._lock.acquire(blocking=False):
+            try:
+                self._probe()
+            finally:
+                self._lock.release()
+
+        circuit = resilience.breakers["data"].state
+        ready = self.warm_up_seconds is not None and self._check["ok"] and circuit == resilience.CircuitBreaker.CLOSED
+        details = {
+            "ready": ready,
+            "warm_up_seconds": None if self.warm_up_seconds is None else round(self.warm_up_seconds, 3),
+            "upstream": dict(self._check, checked_seconds_ago=None if self._checked_at is None
+                             else round(time.monotonic() - self._checked_at, 1)),
+            "circuit": circuit,
+        }
+        return ready, details
+
+    def health(self):
+        return {"status": "ok", "pid": os.getpid(), "uptime_seconds": round(time.monotonic() - self.started, 1)}
+
+
+state = Readiness()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=state.reset)
@@ -0,0 +1,595 @@
+import asyncio
+import contextvars
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from flask import g, has_request_context, jsonify, request
+
+import metrics
+import supabaseInit
+from queryCache import QueryCache, sampled_size
+
+# Failure handling for data backend calls (upstream.py routes every execute() and auth call here).
+#
+# Deadlines: each request gets a time budget for all of its upstream calls together. A call never
+# waits longer than what is left of it, nor longer than UPSTREAM_ATTEMPT_TIMEOUT per attempt. The
+# HTTP client's own timeout defaults to the attempt timeout (supabaseInit.py), so an attempt runs on
+# the calling thread and the client ends it; only an attempt that must end sooner (the request's
+# budget is nearly spent) or is hedged runs on a worker thread, which is abandoned, not interrupted,
+# if it doesn't answer in time. Work outside a request (background jobs, the search index build)
+# has no deadline.
+# Retries: reads (selects) that fail with a connection error, a timeout or a 5xx are retried with
+# exponential backoff and full jitter while the deadline allows. A read that timed out is retried
+# only if a whole attempt still fits in the budget, so a slow upstream isn't sent more of the
+# queries it is already failing to answer. Writes are never retried: a write that timed out may
+# still have been applied.
+# Hedging: with UPSTREAM_HEDGE_AFTER set, a read that hasn't answered within that many seconds is
+# sent a second time and whichever answer arrives first is used, trimming the latency tail.
+# Circuit breaker: after UPSTREAM_BREAKER_FAILURES consecutive calls fail (retries exhausted), calls
+# fail fast for UPSTREAM_BREAKER_COOLDOWN seconds, then one probe call decides whether to close it.
+# Stale reads: for the read routes the screens poll (STALE_ENDPOINTS), the last good answer to each
+# read is kept for UPSTREAM_STALE_TTL seconds. When a read fails (or fails fast), that answer is
+# served instead, marked with a `Warning: 110` header. Other reads (exports, imports, jobs) aren't kept.
+# A request that fails anyway answers 503 (504 for a spent deadline) with Retry-After instead of 500.
+#
+#   UPSTREAM_DEADLINE=10                 seconds per request; 0 for none
+#   UPSTREAM_DEADLINE_<ENDPOINT>=30      per endpoint override, e.g. UPSTREAM_DEADLINE_COMPANY_DASHBOARD=5
+#   UPSTREAM_ATTEMPT_TIMEOUT=5
+#   UPSTREAM_RETRIES=2
+#   UPSTREAM_RETRY_BASE=0.05             first backoff ceiling in seconds; doubles per retry
+#   UPSTREAM_RETRY_MAX=1
+#   UPSTREAM_HEDGE_AFTER=0               seconds; 0 turns hedging off
+#   UPSTREAM_BREAKER_FAILURES=5          0 turns the breaker off
+#   UPSTREAM_BREAKER_COOLDOWN=10
+#   UPSTREAM_STALE_TTL=300               0 turns stale reads off
+#   UPSTREAM_STALE_MAX_BYTES=16777216
+#   UPSTREAM_STALE_ENDPOINTS=a,b         replaces STALE_ENDPOINTS
+#   UPSTREAM_ATTEMPT_WORKERS=64          threads for attempts that can't run on the calling thread
+
+DEADLINE = float(os.environ.get("UPSTREAM_DEADLINE", 10))
+ATTEMPT_TIMEOUT = float(os.environ.get("UPSTREAM_ATTEMPT_TIMEOUT", 5))
+RETRIES = int(os.environ.get("UPSTREAM_RETRIES", 2))
+RETRY_BASE = float(os.environ.get("UPSTREAM_RETRY_BASE", 0.05))
+RETRY_MAX = float(os.environ.get("UPSTREAM_RETRY_MAX", 1))
+HEDGE_AFTER = float(os.environ.get("UPSTREAM_HEDGE_AFTER", 0))
+BREAKER_FAILURES = int(os.environ.get("UPSTREAM_BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN = float(os.environ.get("UPSTREAM_BREAKER_COOLDOWN", 10))
+STALE_TTL = int(os.environ.get("UPSTREAM_STALE_TTL", 300))
+STALE_MAX_BYTES = int(os.environ.get("UPSTREAM_STALE_MAX_BYTES", 16 * 1024 * 1024))
+ATTEMPT_WORKERS = int(os.environ.get("UPSTREAM_ATTEMPT_WORKERS", 64))
+
+# How long the data client waits for an answer by itself; the SQLite stand-in has no such limit
+CLIENT_TIMEOUT = supabaseInit.HTTP_TIMEOUT if supabaseInit.DATA_BACKEND == "supabase" else None
+
+# Routes whose upstream calls legitimately outlast a normal request: exports and imports run for as
+# long as the upload or download does. 0 means no deadline.
+ROUTE_DEADLINES = {
+    "export_table": 0,
+    "bulk_import": 0,
+}
+
+# Read routes the frontend loads and refreshes, whose last good answers are kept for stale reads
+STALE_ENDPOINTS = {
+    "get_projects_by_company",
+    "get_project_by_id",
+    "get_users_by_company",
+    "getCompanies",
+    "get_all_companies",
+    "get_all_projects",
+    "get_users_by_project",
+    "get_comments_by_project",
+    "get_staff",
+    "company_dashboard",
+}
+if os.environ.get("UPSTREAM_STALE_ENDPOINTS") is not None:
+    STALE_ENDPOINTS = {name.strip() for name in os.environ["UPSTREAM_STALE_ENDPOINTS"].split(",") if name.strip()}
+
+# PostgREST error codes that mean the database is unhealthy rather than the request being wrong:
+# statement timeout, can't connect, schema cache not loaded, connection pool timeout
+UNHEALTHY_CODES = {"57014", "PGRST000", "PGRST001", "PGRST002", "PGRST003"}
+
+STALE_WARNING = '110 - "Response is Stale"'
+
+
+class UpstreamTimeout(TimeoutError):
+    def __init__(self, message="Upstream call timed out"):
+        super().__init__(message)
+
+
+class DeadlineExceeded(UpstreamTimeout):
+    # The request's budget is spent; answered with 504
+    def __init__(self):
+        super().__init__("Request deadline exceeded")
+
+
+class NotSent(Exception):
+    # Raised by run() when the call was turned away before it reached the upstream (admission.py's
+    # UpstreamBusy); says nothing about the upstream's health and is never retried
+    pass
+
+
+class UpstreamUnavailable(Exception):
+    # The circuit is open; answered with 503
+    def __init__(self, upstream, retry_after):
+        super().__init__(f"Upstream {upstream} unavailable, failing fast")
+        self.retry_after = retry_after
+
+
+def _deadlines_from_env():
+    deadlines = dict(ROUTE_DEADLINES)
+    for name, value in os.environ.items():
+        if name.startswith("UPSTREAM_DEADLINE_"):
+            deadlines[name[len("UPSTREAM_DEADLINE_"):].lower()] = float(value)
+    return deadlines
+
+
+DEADLINES = _deadlines_from_env()
+
+
+def deadline_for(endpoint):
+    return DEADLINES.get(endpoint, DEADLINE)
+
+
+def timed_out(error):
+    httpx = sys.modules.get("httpx")
+    return isinstance(error, TimeoutError) or (httpx is not None and isinstance(error, httpx.TimeoutException))
+
+
+def unhealthy(error):
+    # True for failures that say nothing about the request itself, so retrying (elsewhere, or later)
+    # may succeed. A 4xx or a constraint violation is the caller's problem and proves the backend is up.
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    httpx = sys.modules.get("httpx")  # loaded along with the Supabase client; without one, no httpx errors
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code >= 500  # postgrest reports non-JSON gateway errors with the HTTP status
+    return code in UNHEALTHY_CODES
+
+
+events_total = metrics.registry.register(metrics.Counter(
+    "upstream_resilience_events_total",
+    "Retries, hedges, timeouts, fail-fasts and stale answers, by upstream and event.",
+    ("upstream", "event"),
+))
+
+
+# -- deadlines ------------------------------------------------------------------
+
+_deadline = contextvars.ContextVar("upstream_deadline", default=None)
+_stale_reads = contextvars.ContextVar("upstream_stale_reads", default=False)
+
+
+def start_deadline(seconds, endpoint=None):
+    # Returns a token for reset_deadline
+    return _deadline.set(time.monotonic() + seconds if seconds > 0 else None), _stale_reads.set(endpoint in STALE_ENDPOINTS)
+
+
+def reset_deadline(token):
+    deadline_token, stale_token = token
+    _deadline.reset(deadline_token)
+    _stale_reads.reset(stale_token)
+
+
+def remaining():
+    # Seconds left in the current request's budget; None outside requests (or with no deadline)
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+# -- circuit breaker --------------------------------------------------------------
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.name = name
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        # None if the call may go ahead, otherwise the seconds until the circuit may close
+        if self.threshold <= 0 or self.state == self.CLOSED:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self._opened_at >= self.cooldown:
+                self._transition(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True  # one call finds out whether the upstream is back
+                return None
+            if self.state == self.CLOSED:
+                return None
+            return max(self._opened_at + self.cooldown - now, 0.0) or self.cooldown
+
+    def release(self):
+        # The call let through as the probe never reached the upstream; let the next one probe
+        self._probing = False
+
+    def is_open(self):
+        return self.state != self.CLOSED
+
+    def success(self):
+        if self.state == self.CLOSED and not self._failures:
+            return
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def failure(self):
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self.threshold):
+                self._opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+    def _transition(self, state):
+        self.state = state
+        events_total.inc(self.name, f"circuit_{state}")
+
+
+breakers = {name: CircuitBreaker(name) for name in ("data", "auth")}
+
+metrics.register_gauge(
+    "upstream_circuits_open", "Upstream circuit breakers currently open or half open.",
+    lambda: sum(breaker.is_open() for breaker in breakers.values()),
+)
+
+
+# -- stale reads ------------------------------------------------------------------
+
+# Keyed on the query; holds whole responses, sized by their rows (estimated, to keep stores cheap)
+stale = QueryCache(max_bytes=STALE_MAX_BYTES, default_ttl=STALE_TTL, sizer=lambda response: sampled_size(response.data))
+
+# Set by ResilienceMiddleware for native ASGI requests: what happened to the request's upstream calls
+_outcome = contextvars.ContextVar("upstream_outcome", default=None)
+
+
+def _mark(name, value):
+    if has_request_context():
+        setattr(g, f"upstream_{name}", value)
+    outcome = _outcome.get()
+    if outcome is not None:
+        outcome[name] = value
+
+
+def outcome():
+    # What the current request's upstream calls have come to, for requests sharing its response
+    # (singleFlight.py): {"stale": True} and/or {"failure": error}
+    if has_request_context():
+        marks = {name: g.get(f"upstream_{name}") for name in ("stale", "failure")}
+    else:
+        marks = dict(_outcome.get() or {})
+    return {name: value for name, value in marks.items() if value is not None}
+
+
+def adopt(marks):
+    for name, value in marks.items():
+        _mark(name, value)
+
+
+def _fallback(upstream, error, stale_key):
+    # The call failed for good: serve the last good answer if there is one, otherwise re-raise
+    if stale_key is not None:
+        found, value = stale.get("reads", stale_key)
+        if found:
+            events_total.inc(upstream, "stale")
+            _mark("stale", True)
+            return value
+    _mark("failure", error)
+    raise error
+
+
+def _backoff(attempt):
+    return random.uniform(0, min(RETRY_MAX, RETRY_BASE * 2 ** attempt))
+
+
+def _retry_delay(error, attempt, attempts, breaker):
+    # Seconds to wait before trying again, or None to give up now. A probe (half open) gets no
+    # retries: one failure re-opens the circuit. After a timeout, a retry needs room for a whole
+    # attempt; one that could only time out again would just add to a slow upstream's load.
+    if attempt + 1 == attempts or breaker.is_open():
+        return None
+    delay = _backoff(attempt)
+    budget = remaining()
+    if budget is not None and budget - delay <= (ATTEMPT_TIMEOUT if timed_out(error) else 0):
+        return None
+    return delay
+
+
+def _attempts(idempotent):
+    return 1 + (RETRIES if idempotent else 0)
+
+
+def _attempt_timeout(upstream):
+    # Per attempt: whichever is sooner, the attempt cap or the end of the request's budget
+    budget = remaining()
+    if budget is None:
+        return None
+    if budget <= 0:
+        events_total.inc(upstream, "deadline")
+        raise DeadlineExceeded()
+    return min(ATTEMPT_TIMEOUT, budget)
+
+
+def _timed_out(upstream, timeout):
+    events_total.inc(upstream, "timeout")
+    budget = remaining()
+    return DeadlineExceeded() if budget is not None and budget <= 0 else UpstreamTimeout()
+
+
+# -- sync calls -----------------------------------------------------------------------
+
+# Attempts run here when they are hedged or must end before the data client would give up by
+# itself. Per process, like the other pools; a timed-out attempt is abandoned, not interrupted, and
+# finishes in the background (within CLIENT_TIMEOUT).
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=ATTEMPT_WORKERS, thread_name_prefix="upstream")
+                _executor_pid = pid
+    return _executor
+
+
+def _submit(run):
+    return executor().submit(contextvars.copy_context().run, run)
+
+
+def _run_once(run, upstream, timeout, hedge):
+    if not hedge and (timeout is None or (CLIENT_TIMEOUT is not None and CLIENT_TIMEOUT <= timeout)):
+        try:
+            return run()  # the HTTP client's own timeout ends it in time
+        except Exception as e:
+            if timed_out(e):
+                events_total.inc(upstream, "timeout")
+            raise
+    ends = None if timeout is None else time.monotonic() + timeout
+
+    pending = {_submit(run)}
+    if hedge:
+        done, _ = wait(pending, timeout=HEDGE_AFTER if timeout is None else min(HEDGE_AFTER, timeout))
+        if not done and (ends is None or ends - time.monotonic() > 0):
+            events_total.inc(upstream, "hedge")
+            pending.add(_submit(run))
+
+    error = None
+    while pending:
+        left = None if ends is None else max(ends - time.monotonic(), 0)
+        done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+        if not done:
+            raise _timed_out(upstream, timeout)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+
+def call(run, upstream="data", idempotent=False, stale_key=None):
+    # Runs run() (one upstream request) under the request's deadline, the retry policy for
+    # idempotent calls and the upstream's circuit breaker. stale_key names a read whose last good
+    # answer may stand in when it fails, if the current route keeps stale reads.
+    if not _stale_reads.get():
+        stale_key = None
+    breaker = breakers[upstream]
+    retry_after = breaker.allow()
+    if retry_after is not None:
+        events_total.inc(upstream, "fail_fast")
+        return _fallback(upstream, UpstreamUnavailable(upstream, retry_after), stale_key)
+
+    attempts = _attempts(idempotent)
+    for attempt in range(attempts):
+        try:
+            timeout = _attempt_timeout(upstream)
+        except DeadlineExceeded as e:
+            breaker.release()  # spent elsewhere; not the upstream's failure
+            return _fallback(upstream, e, stale_key)
+        try:
+            result = _run_once(run, upstream, timeout, hedge=idempotent and HEDGE_AFTER > 0)
+        except NotSent:
+            breaker.release()
+            raise
+        except Exception as e:
+            if not unhealthy(e):
+                breaker.success()  # the upstream answered; the request itself was refused
+                raise
+            delay = _retry_delay(e, attempt, attempts, breaker)
+            if delay is None:
+                breaker.failure()
+                return _fallback(upstream, e, stale_key)
+            events_total.inc(upstream, "retry")
+            time.sleep(delay)
+            continue
+        breaker.success()
+        if stale_key is not None and STALE_TTL > 0:
+            stale.set("reads", stale_key, result)
+        return result
+
+
+# -- async calls ----------------------------------------------------------------------
+
+async def _run_once_async(run, upstream, timeout, hedge):
+    if timeout is None and not hedge:
+        return await run()
+
+    loop = asyncio.get_running_loop()
+    ends = None if timeout is None else loop.time() + timeout
+    pending = {asyncio.ensure_future(run())}
+    try:
+        if hedge:
+            done, _ = await asyncio.wait(pending, timeout=HEDGE_AFTER if timeout is None else min(HEDGE_AFTER, timeout))
+            if not done and (ends is None or ends - loop.time() > 0):
+                events_total.inc(upstream, "hedge")
+                pending.add(asyncio.ensure_future(run()))
+
+        error = None
+        while pending:
+            left = None if ends is None else max(ends - loop.time(), 0)
+            done, pending = await asyncio.wait(pending, timeout=left, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise _timed_out(upstream, timeout)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()  # unlike a thread, a losing or timed-out coroutine can be stopped
+
+
+async def call_async(run, upstream="data", idempotent=False, stale_key=None):
+    # Same as call() for the async client; run() returns a new awaitable each time
+    if not _stale_reads.get():
+        stale_key = None
+    breaker = breakers[upstream]
+    retry_after = breaker.allow()
+    if retry_after is not None:
+        events_total.inc(upstream, "fail_fast")
+        return _fallback(upstream, UpstreamUnavailable(upstream, retry_after), stale_key)
+
+    attempts = _attempts(idempotent)
+    for attempt in range(attempts):
+        try:
+            timeout = _attempt_timeout(upstream)
+        except DeadlineExceeded as e:
+            breaker.release()
+            return _fallback(upstream, e, stale_key)
+        try:
+            result = await _run_once_async(run, upstream, timeout, hedge=idempotent and HEDGE_AFTER > 0)
+        except NotSent:
+            breaker.release()
+            raise
+        except Exception as e:
+            if not unhealthy(e):
+                breaker.success()
+                raise
+            delay = _retry_delay(e, attempt, attempts, breaker)
+            if delay is None:
+                breaker.failure()
+                return _fallback(upstream, e, stale_key)
+            events_total.inc(upstream, "retry")
+            await asyncio.sleep(delay)
+            continue
+        breaker.success()
+        if stale_key is not None and STALE_TTL > 0:
+            stale.set("reads", stale_key, result)
+        return result
+
+
+# -- Flask ------------------------------------------------------------------------------
+
+def _failure_status(error):
+    # (status, retry after seconds) for a request whose upstream calls failed for good
+    if isinstance(error, UpstreamUnavailable):
+        return 503, error.retry_after
+    if isinstance(error, DeadlineExceeded):
+        return 504, 1
+    return 503, 1
+
+
+def _failed(error):
+    status, retry_after = _failure_status(error)
+    response = jsonify({"error": "Upstream unavailable, retry later" if status == 503 else "Upstream timed out"})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def init_app(app):
+    @app.before_request
+    def _start_deadline():
+        g.deadline_token = start_deadline(deadline_for(request.endpoint), request.endpoint)
+
+    @app.errorhandler(UpstreamUnavailable)
+    @app.errorhandler(UpstreamTimeout)
+    def _upstream_failed(e):
+        return _failed(e)
+
+    @app.after_request
+    def _upstream_outcome(response):
+        # Routes catch their own exceptions and answer 500; say what actually went wrong, so
+        # clients and load balancers back off instead of treating it as a bug
+        failure = g.get("upstream_failure")
+        if failure is not None and response.status_code == 500:
+            return _failed(failure)
+        if g.get("upstream_stale"):
+            response.headers["Warning"] = STALE_WARNING
+        return response
+
+    @app.teardown_request
+    def _end_deadline(exc):
+        token = g.pop("deadline_token", None)
+        if token is not None:
+            reset_deadline(token)
+
+
+# -- ASGI -------------------------------------------------------------------------------
+
+class ResilienceMiddleware:
+    # Deadlines and failure statuses for asyncApp's native routes (the mounted Flask app handles its own)
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    def _endpoint(self, scope):
+        from starlette.routing import Match, Route
+        for route in self.routes:
+            if isinstance(route, Route) and route.matches(scope)[0] == Match.FULL:
+                return route.name
+        return None
+
+    async def __call__(self, scope, receive, send):
+        endpoint = self._endpoint(scope) if scope["type"] == "http" else None
+        if endpoint is None:
+            await self.app(scope, receive, send)
+            return
+
+        outcome = {}
+        _outcome.set(outcome)
+        start_deadline(deadline_for(endpoint), endpoint)
+        replaced = False
+
+        async def send_with_outcome(message):
+            nonlocal replaced
+            if message["type"] == "http.response.start":
+                failure = outcome.get("failure")
+                if failure is not None and message["status"] == 500:
+                    from starlette.responses import JSONResponse
+                    replaced = True
+                    status, retry_after = _failure_status(failure)
+                    headers = {"Retry-After": str(max(1, math.ceil(retry_after))), "Access-Control-Allow-Origin": "*"}
+                    error = "Upstream unavailable, retry later" if status == 503 else "Upstream timed out"
+                    await JSONResponse({"error": error}, status_code=status, headers=headers)(scope, receive, send)
+                    return
+                if outcome.get("stale"):
+                    message = dict(message, headers=list(message.get("headers", [])) + [(b"warning", STALE_WARNING.encode())])
+            if not replaced:
+                await send(message)
+
+        await self.app(scope, receive, send_with_outcome)
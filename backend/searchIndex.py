@@ -0,0 +1,599 @@
+import bisect
+import glob
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+import supabaseInit
+from pagination import PaginationError, encode_cursor, iter_pages
+
+# Full-text search over project names/descriptions and comment content.
+# An inverted index (term -> documents containing it, with term frequencies) held in memory and
+# partitioned by company, so a search only ever touches the tenant's own postings. Hits are ranked
+# with BM25 (project names weigh more than descriptions and comments) and paged with an opaque
+# cursor on (score, document). The last query term also matches as a prefix, for search-as-you-type.
+#
+# The write routes add documents as they create them. Every change is appended to a journal file
+# that all worker processes share: each process replays lines it hasn't seen before answering a
+# search, so a comment added through one worker is findable through the others. Each company has
+# its own snapshot file, and a process only loads the companies it is asked to search (at most
+# SEARCH_MAX_TENANTS of them, least recently searched dropped first). Every COMPACT_EVERY changes
+# the journal is rotated: the finished one is folded into the snapshots of the companies it touched
+# and then deleted. The first process to need the index builds it from the data backend; the others
+# wait for it and load its snapshots.
+#
+#   SEARCH_INDEX_DIR=search_index   where the snapshots and journals live; empty keeps the whole
+#                                   index in memory only (the default with the in-memory SQLite backend)
+#   SEARCH_COMPACT_EVERY=1000
+#   SEARCH_MAX_TENANTS=100          companies a process keeps loaded; 0 for no limit
+
+_default_dir = "" if supabaseInit.DATA_BACKEND == "sqlite" and supabaseInit.SQLITE_PATH == ":memory:" else "search_index"
+INDEX_DIR = os.environ.get("SEARCH_INDEX_DIR", _default_dir)
+COMPACT_EVERY = int(os.environ.get("SEARCH_COMPACT_EVERY", 1000))
+MAX_TENANTS = int(os.environ.get("SEARCH_MAX_TENANTS", 100))
+BUILD_PAGE_SIZE = 1000
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Field weights: a term in a project's name counts as this many occurrences
+FIELDS = {
+    "project": {"name": 3, "description": 1},
+    "comment": {"content": 1},
+}
+# Stored with each hit, so results render without another query
+STORED = {
+    "project": ("name", "description", "start_date", "end_date"),
+    "comment": ("content", "projectId", "created_at", "userAuthId"),
+}
+
+STOPWORDS = frozenset("a an and are as at be by for from has in is it of on or that the to was were will with".split())
+TOKEN = re.compile(r"\w+", re.UNICODE)
+
+CURSOR_KEY = "search"
+
+# What `current` reads as before the first build: appends collect in this journal until it lands
+PENDING = ("pending", 0)
+
+logger = logging.getLogger(__name__)
+
+
+class SearchError(ValueError):
+    pass
+
+
+class _JournalReset(Exception):
+    # What this process holds no longer matches the files: another process rebuilt the index, or
+    # the journal it was reading is gone or can't be parsed from where it left off
+    pass
+
+
+def tokenize(text):
+    return [t for t in TOKEN.findall((text or "").lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def doc_key(kind, doc_id):
+    return f"{kind}:{doc_id}"
+
+
+class _Partition:
+    # One company's documents and postings
+    def __init__(self):
+        self.docs = {}         # doc key -> stored document (kind, id, company, fields)
+        self.frequencies = {}  # doc key -> Counter of weighted terms
+        self.postings = {}     # term -> {doc key: weighted term frequency}
+        self.lengths = {}      # doc key -> weighted length
+        self.total_length = 0
+        self._terms = None     # sorted terms, for prefix matches; rebuilt after new terms appear
+
+    def put(self, doc):
+        key = doc_key(doc["kind"], doc["id"])
+        if key in self.docs:
+            self.remove(key)
+        frequencies = Counter()
+        for field, weight in FIELDS[doc["kind"]].items():
+            for term in tokenize(doc.get(field)):
+                frequencies[term] += weight
+        length = sum(frequencies.values())
+        self.docs[key] = doc
+        self.frequencies[key] = frequencies
+        self.lengths[key] = length
+        self.total_length += length
+        for term, frequency in frequencies.items():
+            docs = self.postings.get(term)
+            if docs is None:
+                docs = self.postings[term] = {}
+                self._terms = None
+            docs[key] = frequency
+
+    def remove(self, key):
+        self.docs.pop(key, None)
+        self.total_length -= self.lengths.pop(key, 0)
+        for term in self.frequencies.pop(key, ()):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(key, None)
+                if not docs:
+                    del self.postings[term]
+                    self._terms = None
+
+    def expand(self, prefix):
+        if self._terms is None:
+            self._terms = sorted(self.postings)
+        start = bisect.bisect_left(self._terms, prefix)
+        end = bisect.bisect_left(self._terms, prefix + "\uffff")
+        return self._terms[start:end]
+
+    def score(self, terms, prefix_terms, kind):
+        # BM25 over the union of the matching documents; prefix expansions share one query term slot
+        count = len(self.lengths)
+        if not count:
+            return {}
+        average = self.total_length / count
+        scores = {}
+        groups = [[term] for term in terms] + ([prefix_terms] if prefix_terms else [])
+        for group in groups:
+            best = {}
+            for term in group:
+                docs = self.postings.get(term, {})
+                idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for key, frequency in docs.items():
+                    if kind and not key.startswith(kind + ":"):
+                        continue
+                    norm = frequency * (K1 + 1) / (frequency + K1 * (1 - B + B * self.lengths[key] / average))
+                    best[key] = max(best.get(key, 0.0), idf * norm)
+            for key, value in best.items():
+                scores[key] = scores.get(key, 0.0) + value
+        return scores
+
+
+def _read_journal(path, offset=0, end=None):
+    # Documents on the complete lines between two byte offsets, and how many bytes those lines span.
+    # A line still being written is left for the next read.
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read() if end is None else f.read(end - offset)
+    consumed = data.rfind(b"\n") + 1
+    try:
+        docs = [json.loads(line) for line in data[:consumed].splitlines() if line.strip()]
+    except ValueError:
+        # The offset isn't on a line boundary of this file, or the file is damaged
+        raise _JournalReset()
+    return docs, consumed
+
+
+class SearchIndex:
+    def __init__(self, directory=INDEX_DIR, compact_every=COMPACT_EVERY, max_tenants=MAX_TENANTS):
+        self.directory = directory
+        self.compact_every = compact_every
+        self.max_tenants = max_tenants if directory else 0  # nothing to reload dropped tenants from
+        self.partitions = OrderedDict()  # company -> _Partition, least recently searched first
+        self.project_companies = {}      # project id -> company, to place comments
+        self.ready = False
+        self._build = None               # which build's files this process follows
+        self._generation = 0             # which of its journals it is reading
+        self._offset = 0                 # bytes of that journal applied
+        self._since_snapshot = 0         # lines in that journal
+        self._lock = threading.RLock()
+
+    # -- documents ----------------------------------------------------------
+
+    @staticmethod
+    def project_doc(row):
+        return dict({field: row.get(field) for field in STORED["project"]},
+                    kind="project", id=row["id"], company=row.get("company"))
+
+    def comment_doc(self, row, company=None):
+        company = company or self.project_companies.get(str(row.get("projectId")))
+        return dict({field: row.get(field) for field in STORED["comment"]},
+                    kind="comment", id=row["id"], company=company)
+
+    def _apply(self, doc):
+        if doc["kind"] == "project":
+            self.project_companies[str(doc["id"])] = doc["company"]
+        partition = self.partitions.get(doc["company"])
+        if partition is not None:
+            partition.put(doc)
+        elif not self.directory:
+            self.partitions[doc["company"]] = _Partition()
+            self.partitions[doc["company"]].put(doc)
+        # Otherwise the company isn't loaded here: its snapshot and the journal have the change
+
+    # -- files --------------------------------------------------------------
+    #
+    #   current                          "<build> <generation>": the journal appends go to
+    #   journal.<build>.<generation>.ndjson
+    #   snapshots/<build>/<company>.json a company's documents as of the start of journal <generation>
+    #   build.lock, journal.lock         flock()ed by builds and compactions, and by appends (shared)
+
+    def _path(self, *names):
+        return os.path.join(self.directory, *names)
+
+    def _journal(self, build, generation):
+        return self._path(f"journal.{build}.{generation}.ndjson")
+
+    def _journal_generations(self, build):
+        prefix, suffix = f"journal.{build}.", ".ndjson"
+        return sorted(int(os.path.basename(path)[len(prefix):-len(suffix)])
+                      for path in glob.glob(self._path(prefix + "*" + suffix)))
+
+    def _snapshot(self, build, company):
+        name = hashlib.sha1(str(company).encode()).hexdigest() + ".json"
+        return self._path("snapshots", build, name)
+
+    @contextmanager
+    def _file_lock(self, name, shared=False, blocking=True):
+        # Yields whether the lock was taken (always, when blocking)
+        if fcntl is None:
+            yield True  # no flock: a single server process, whose threads self._lock serializes
+            return
+        fd = os.open(self._path(name), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+        finally:
+            os.close(fd)  # releases the lock
+
+    def _current(self):
+        try:
+            with open(self._path("current")) as f:
+                build, generation = f.read().split()
+        except FileNotFoundError:
+            return PENDING
+        return build, int(generation)
+
+    def _set_current(self, build, generation):
+        path = self._path("current")
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            f.write(f"{build} {generation}")
+        os.replace(temporary, path)
+
+    def _append(self, docs):
+        line = "".join(json.dumps(doc, default=str, separators=(",", ":")) + "\n" for doc in docs)
+        # Shared lock: a compaction can't switch journals between reading `current` and the write.
+        # One O_APPEND write per change, so lines from different processes never interleave.
+        with self._file_lock("journal.lock", shared=True):
+            fd = os.open(self._journal(*self._current()), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode())
+            finally:
+                os.close(fd)
+
+    def _write_snapshot(self, build, company, generation, docs):
+        path = self._snapshot(build, company)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({"company": company, "generation": generation, "docs": docs}, f,
+                      default=str, separators=(",", ":"))
+        os.replace(temporary, path)  # readers see the old snapshot or the new one, never half of one
+
+    def _read_snapshot(self, build, company):
+        # Returns (snapshot or None, the file's identity, to notice it being replaced)
+        try:
+            with open(self._snapshot(build, company), "rb") as f:
+                return json.load(f), os.fstat(f.fileno()).st_ino
+        except FileNotFoundError:
+            return None, None
+
+    def _snapshot_identity(self, build, company):
+        try:
+            return os.stat(self._snapshot(build, company)).st_ino
+        except FileNotFoundError:
+            return None
+
+    def _company_docs(self, build, company, generation, offset=None):
+        # A company's documents as of `offset` bytes into journal `generation` (all of it if None):
+        # its snapshot plus its lines in the journals since. None if the snapshot is newer than that.
+        while True:
+            snapshot, identity = self._read_snapshot(build, company)
+            since = snapshot["generation"] if snapshot else 0
+            if since > generation:
+                return None
+            journals = [g for g in self._journal_generations(build) if since <= g <= generation]
+            if self._snapshot_identity(build, company) != identity:
+                continue  # a compaction replaced it (and may have deleted a journal) meanwhile
+            docs = {doc_key(doc["kind"], doc["id"]): doc for doc in (snapshot["docs"] if snapshot else ())}
+            try:
+                for g in journals:
+                    lines, _ = _read_journal(self._journal(build, g), 0, offset if g == generation else None)
+                    docs.update((doc_key(doc["kind"], doc["id"]), doc) for doc in lines if doc["company"] == company)
+            except FileNotFoundError:
+                continue  # compacted meanwhile: the new snapshot has those lines
+            return docs
+
+    # -- lifecycle ----------------------------------------------------------
+
+    def _replay(self):
+        # Applies journal lines appended since the last replay, following rotations
+        while True:
+            build, generation = self._current()
+            if build != self._build or generation < self._generation:
+                raise _JournalReset()
+            try:
+                docs, consumed = _read_journal(self._journal(build, self._generation), self._offset)
+            except FileNotFoundError:
+                if generation == self._generation:
+                    return  # nothing appended to it yet
+                raise _JournalReset()  # compacted and deleted before this process read all of it
+            for doc in docs:
+                self._apply(doc)
+            self._offset += consumed
+            self._since_snapshot += len(docs)
+            if generation == self._generation:
+                return
+            # `current` had already moved on before the read, so that journal was complete
+            self._generation, self._offset, self._since_snapshot = self._generation + 1, 0, 0
+
+    def _load(self, company):
+        # The company's partition, read from its snapshot and the journal on first use
+        partition = self.partitions.get(company)
+        if partition is not None:
+            self.partitions.move_to_end(company)
+            return partition
+        if not self.directory:
+            return None
+        docs = self._company_docs(self._build, company, self._generation, self._offset)
+        while docs is None:
+            # Compacted past this process's position: catch up first
+            self._replay()
+            docs = self._company_docs(self._build, company, self._generation, self._offset)
+        partition = self.partitions[company] = _Partition()
+        for doc in docs.values():
+            self._apply(doc)
+        self._evict()
+        return partition
+
+    def _evict(self):
+        while self.max_tenants and len(self.partitions) > self.max_tenants:
+            self.partitions.popitem(last=False)
+
+    def _follow(self):
+        build, generation = self._current()
+        if (build, generation) == PENDING:
+            return
+        self._build, self._generation, self._offset, self._since_snapshot = build, generation, 0, 0
+        self.ready = True
+        self._replay()
+
+    def _install(self, build, built):
+        # Takes over a build this process just made; its journal (if any) starts empty
+        partitions, project_companies = built
+        self.partitions, self.project_companies = partitions, project_companies
+        self._build, self._generation, self._offset, self._since_snapshot = build, 0, 0, 0
+        self.ready = True
+        self._evict()
+
+    def ensure_ready(self, client, company=None):
+        # Brings this process up to date with the other processes' changes; returns `company`'s
+        # partition (None if it has no documents)
+        if not self.directory:
+            with self._lock:
+                if not self.ready:
+                    self._install(None, self._build_from(client))
+                return self.partitions.get(company)
+
+        if not self.ready and self._current() == PENDING:
+            built = self._publish(client)
+            if built is not None:
+                with self._lock:
+                    self._install(*built)
+        with self._lock:
+            try:
+                partition = self._catch_up(company)
+            except _JournalReset:
+                self._clear()
+                partition = self._catch_up(company)
+            compact = self._since_snapshot >= self.compact_every
+        if compact:
+            self._compact()
+        return partition
+
+    def _catch_up(self, company):
+        if self.ready:
+            self._replay()
+        else:
+            self._follow()
+        return self._load(company) if self.ready and company is not None else None
+
+    def _build_from(self, client):
+        # Reads every project and comment from the data backend into fresh partitions
+        partitions, project_companies = OrderedDict(), {}
+        for page in iter_pages(lambda: client.table("projects").select("*"), BUILD_PAGE_SIZE):
+            for row in page:
+                doc = self.project_doc(row)
+                if doc["company"] is not None:
+                    project_companies[str(doc["id"])] = doc["company"]
+                    partitions.setdefault(doc["company"], _Partition()).put(doc)
+        for page in iter_pages(lambda: client.table("comments").select("*"), BUILD_PAGE_SIZE):
+            for row in page:
+                doc = self.comment_doc(row, project_companies.get(str(row.get("projectId"))))
+                if doc["company"] is not None:
+                    partitions.setdefault(doc["company"], _Partition()).put(doc)
+        return partitions, project_companies
+
+    def _publish(self, client, replace=False):
+        # Builds the index and writes it out as a new build. Returns (build, (partitions, project
+        # companies)), or None if another process built it while this one waited for build.lock.
+        os.makedirs(self.directory, exist_ok=True)
+        with self._file_lock("build.lock"):
+            previous = self._current()
+            if previous != PENDING and not replace:
+                return None
+            journal = self._journal(*previous)
+            offset = os.path.getsize(journal) if os.path.exists(journal) else 0
+            partitions, project_companies = self._build_from(client)
+            build = uuid.uuid4().hex
+
+            def catch_up(offset):
+                # Appends keep going to the previous journal until `current` names the new build.
+                # Compactions skip while build.lock is held, so it is still the live one.
+                try:
+                    docs, consumed = _read_journal(journal, offset)
+                except FileNotFoundError:
+                    return offset, set()
+                for doc in docs:
+                    if doc["kind"] == "project":
+                        project_companies[str(doc["id"])] = doc["company"]
+                    partitions.setdefault(doc["company"], _Partition()).put(doc)
+                return offset + consumed, {doc["company"] for doc in docs}
+
+            offset, _ = catch_up(offset)
+            for company, partition in partitions.items():
+                self._write_snapshot(build, company, 0, list(partition.docs.values()))
+            with self._file_lock("journal.lock"):
+                # Appends wait for this: only what landed during the writes above is left to fold in
+                _, touched = catch_up(offset)
+                for company in touched:
+                    self._write_snapshot(build, company, 0, list(partitions[company].docs.values()))
+                self._set_current(build, 0)
+
+        for path in glob.glob(self._path(f"journal.{previous[0]}.*.ndjson")):
+            os.remove(path)
+        shutil.rmtree(self._path("snapshots", previous[0]), ignore_errors=True)
+        return build, (partitions, project_companies)
+
+    def _compact(self):
+        # Starts the next journal, folds the finished one into the snapshots of the companies it
+        # touched, then deletes it. Only the rotation holds self._lock: copying a loaded company's
+        # documents takes it briefly, and serializing them happens outside it.
+        with self._file_lock("build.lock", blocking=False) as locked:
+            if not locked:
+                return  # another process is building or compacting
+            with self._lock:
+                if not self.ready:
+                    return
+                with self._file_lock("journal.lock"):
+                    try:
+                        self._replay()
+                    except _JournalReset:
+                        self._clear()
+                        return
+                    if self._since_snapshot < self.compact_every:
+                        return  # another process compacted first
+                    build, finished = self._build, self._generation
+                    self._set_current(build, finished + 1)
+                    self._generation, self._offset, self._since_snapshot = finished + 1, 0, 0
+
+            # Older journals are only left behind by a compaction that didn't finish
+            journals = [g for g in self._journal_generations(build) if g <= finished]
+            companies = set()
+            try:
+                for generation in journals:
+                    companies.update(doc["company"] for doc in _read_journal(self._journal(build, generation))[0])
+            except _JournalReset:
+                # Left in place: the snapshots stay valid with it, and a reindex starts a clean build
+                logger.error("Search journal %s.%s is damaged; not compacting it", build, finished)
+                return
+            for company in companies:
+                with self._lock:
+                    partition = self.partitions.get(company) if self._build == build else None
+                    docs = list(partition.docs.values()) if partition is not None else None
+                if docs is None:
+                    docs = list(self._company_docs(build, company, finished).values())
+                self._write_snapshot(build, company, finished + 1, docs)
+            for generation in journals:
+                os.remove(self._journal(build, generation))
+
+    def _clear(self):
+        self.partitions, self.project_companies = OrderedDict(), {}
+        self.ready = False
+        self._build = None
+        self._generation = self._offset = self._since_snapshot = 0
+
+    def rebuild(self, client):
+        # Re-reads everything from the data backend; returns how many documents were indexed
+        if self.directory:
+            build, built = self._publish(client, replace=True)
+        else:
+            build, built = None, self._build_from(client)
+        with self._lock:
+            self._install(build, built)
+        return sum(len(partition.docs) for partition in built[0].values())
+
+    # -- writes -------------------------------------------------------------
+
+    def add(self, docs):
+        # Called by the write routes after the rows are stored. A process that hasn't built or
+        # loaded the index has nothing in memory to update; the journal line still reaches the
+        # others, and a fresh build reads the rows from the backend.
+        docs = [doc for doc in docs if doc.get("company") is not None]
+        if not docs:
+            return
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._append(docs)
+        with self._lock:
+            if self.ready:
+                if self.directory:
+                    try:
+                        self._replay()
+                    except _JournalReset:
+                        self._clear()  # reloaded on the next search
+                else:
+                    for doc in docs:
+                        self._apply(doc)
+
+    def add_projects(self, rows):
+        self.add([self.project_doc(row) for row in rows])
+
+    def add_comment(self, row, client):
+        # The comment's tenant is its project's company
+        if not self.ready and not self.directory:
+            return
+        company = self.project_companies.get(str(row.get("projectId")))
+        if company is None:
+            projects = client.table("projects").select("company").eq("id", row.get("projectId")).execute().data
+            company = projects[0]["company"] if projects else None
+        self.add([self.comment_doc(row, company)])
+
+    # -- reads --------------------------------------------------------------
+
+    def search(self, client, company, query, limit, after=None, kind=None):
+        # Returns (hits, total, next_cursor); hits are the stored documents plus their score.
+        # `after` is the decoded cursor (pagination.page_params(args, key=CURSOR_KEY)).
+        terms = tokenize(query)
+        if not terms:
+            raise SearchError("q must contain at least one word")
+        if after is not None and not (isinstance(after, list) and len(after) == 2):
+            raise PaginationError("Invalid cursor")
+        partition = self.ensure_ready(client, company)
+        if partition is None:
+            return [], 0, None
+
+        with self._lock:
+            # The last word may be unfinished: it also matches any term it begins
+            prefix_terms = [t for t in partition.expand(terms[-1]) if t != terms[-1]]
+            scores = partition.score(terms, prefix_terms, kind)
+            ranked = sorted(((-round(score, 6), key) for key, score in scores.items()))
+            start = bisect.bisect_right(ranked, (after[0], after[1])) if after else 0
+            page = ranked[start:start + limit]
+            hits = [dict(partition.docs[key], score=-negated) for negated, key in page]
+
+        next_cursor = None
+        if start + limit < len(ranked):
+            negated, key = page[-1]
+            next_cursor = encode_cursor(CURSOR_KEY, [negated, key])
+        return hits, len(ranked), next_cursor
+
+
+index = SearchIndex()
@@ -0,0 +1,126 @@
+import random
+import uuid
+from datetime import date, datetime, timedelta
+
+# Synthetic tenant data for benchmarks and offline profiling.
+# Generates companies with staff, projects, project members and comment threads,
+# and inserts them through the same client interface the routes use.
+
+WORDS = (
+    "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima mike november "
+    "oscar papa quebec romeo sierra tango uniform victor whiskey xray yankee zulu launch "
+    "migration redesign audit rollout onboarding integration roadmap review budget report"
+).split()
+
+ROLES = ("admin", "staff", "client")
+
+
+class Dataset:
+    # Ids of everything that was seeded, so benchmark scenarios can pick realistic arguments
+    def __init__(self):
+        self.companies = []        # company names
+        self.users = []            # user rows (id, authId, email, company, project: their first project)
+        self.projects = []         # project rows (id, company)
+        self.memberships = 0       # number of project_members rows inserted
+        self.comments = 0          # number of comments inserted
+        self.admins = {}           # company name -> an admin user row
+
+    def summary(self):
+        return {
+            "companies": len(self.companies),
+            "users": len(self.users),
+            "projects": len(self.projects),
+            "memberships": self.memberships,
+            "comments": self.comments,
+        }
+
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _insert(client, table, rows, batch_size):
+    inserted = []
+    for start in range(0, len(rows), batch_size):
+        inserted.extend(client.table(table).insert(rows[start:start + batch_size]).execute().data)
+    return inserted
+
+
+def seed(client, companies=10, users_per_company=50, projects_per_company=10,
+         comments_per_project=100, projects_per_user=3, seed_value=0, batch_size=500):
+    rng = random.Random(seed_value)
+    dataset = Dataset()
+
+    company_rows = [{"name": f"Company {i:04d}"} for i in range(companies)]
+    _insert(client, "companies", company_rows, batch_size)
+    dataset.companies = [row["name"] for row in company_rows]
+
+    project_rows = []
+    for company in dataset.companies:
+        for _ in range(projects_per_company):
+            start = date(2024, 1, 1) + timedelta(days=rng.randrange(365))
+            project_rows.append({
+                "name": _sentence(rng, 3),
+                "description": _sentence(rng, 12),
+                "start_date": start.isoformat(),
+                "end_date": (start + timedelta(days=rng.randrange(30, 180))).isoformat(),
+                "company": company,
+            })
+    dataset.projects = [
+        {"id": row["id"], "company": row["company"]}
+        for row in _insert(client, "projects", project_rows, batch_size)
+    ]
+    projects_by_company = {}
+    for project in dataset.projects:
+        projects_by_company.setdefault(project["company"], []).append(project["id"])
+
+    user_rows = []
+    member_rows = []
+    for company in dataset.companies:
+        company_projects = projects_by_company.get(company, [])
+        for i in range(users_per_company):
+            joined = rng.sample(company_projects, rng.randint(1, min(projects_per_user, len(company_projects)))) \
+                if company_projects and projects_per_user else []
+            user_rows.append({
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "authId": str(uuid.UUID(int=rng.getrandbits(128))),
+                "name": f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS).capitalize()}",
+                "email": f"user{len(user_rows)}@{company.lower().replace(' ', '')}.example",
+                # First user of every company is its admin so /getStaff has someone to authorize
+                "role": "admin" if i == 0 else rng.choice(ROLES),
+                "company": company,
+                "company_name": company,
+                "project": joined[0] if joined else None,
+            })
+            member_rows.extend({"project_id": project_id, "user_id": user_rows[-1]["id"]} for project_id in joined)
+    _insert(client, "users", user_rows, batch_size)
+    dataset.memberships = len(_insert(client, "project_members", member_rows, batch_size))
+    dataset.users = [
+        {key: row[key] for key in ("id", "authId", "email", "company", "project")}
+        for row in user_rows
+    ]
+    for row in user_rows:
+        if row["role"] == "admin":
+            dataset.admins.setdefault(row["company"], row)
+
+    users_by_company = {}
+    for user in dataset.users:
+        users_by_company.setdefault(user["company"], []).append(user["authId"])
+
+    comment_rows = []
+    now = datetime(2025, 1, 1)
+    for project in dataset.projects:
+        authors = users_by_company.get(project["company"]) or [None]
+        for i in range(comments_per_project):
+            comment_rows.append({
+                "projectId": project["id"],
+                "content": _sentence(rng, rng.randrange(4, 30)),
+                "created_at": (now + timedelta(minutes=i)).isoformat(),
+                "userAuthId": rng.choice(authors),
+            })
+        if len(comment_rows) >= batch_size:
+            dataset.comments += len(_insert(client, "comments", comment_rows, batch_size))
+            comment_rows = []
+    dataset.comments += len(_insert(client, "comments", comment_rows, batch_size))
+
+    return dataset
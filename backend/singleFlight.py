@@ -0,0 +1,159 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+from functools import wraps
+
+from flask import current_app, g, request
+
+import metrics
+import resilience
+
+# Request coalescing (single flight) for read routes.
+# Identical reads that arrive while one is already being served don't issue their own upstream
+# queries: the first request (the leader) runs the route, and every request with the same key that
+# arrives before it finishes (followers) waits and gets a copy of the leader's response. A burst of
+# N identical requests costs one set of upstream calls instead of N.
+# The key is the endpoint plus its normalized arguments, so only routes whose response depends on
+# nothing else (not the caller's identity or headers) may be coalesced.
+# Nothing is kept once the leader finishes; this is not a cache, so a read never sees data older
+# than the moment it arrived. Followers also take on what the leader's upstream calls came to (a
+# stale answer, an upstream failure), so they get the same Warning header or 503/504 it does, and
+# each follower raises its own copy of the leader's exception.
+#
+#   SINGLE_FLIGHT_ENABLED=1   0 runs every request on its own
+
+ENABLED = os.environ.get("SINGLE_FLIGHT_ENABLED", "1") not in ("0", "false", "no")
+
+requests_total = metrics.registry.register(metrics.Counter(
+    "single_flight_requests_total",
+    "Coalescable requests, by endpoint and role (leader ran the route, follower shared its response).",
+    ("endpoint", "role"),
+))
+
+
+def _sorted_list(value):
+    return ",".join(sorted({part.strip() for part in value.split(",") if part.strip()}))
+
+
+# Arguments whose spelling varies without changing the response. Column order in ?fields= doesn't
+# matter because the JSON provider sorts keys.
+NORMALIZERS = {
+    "fields": _sorted_list,
+}
+
+
+def normalized_args(items):
+    # items: (name, value) pairs, repeated names included (request.args.items(multi=True))
+    pairs = []
+    for name, value in items:
+        value = value.strip()
+        pairs.append((name, NORMALIZERS[name](value) if name in NORMALIZERS else value))
+    return tuple(sorted(pairs))
+
+
+def _copy(error):
+    # A separate instance per waiter: raising one exception object in several threads at once
+    # interleaves their tracebacks and context on it
+    try:
+        clone = type(error).__new__(type(error), *error.args)
+        clone.__dict__.update(error.__dict__)
+    except Exception:
+        return error
+    clone.__cause__, clone.__context__ = error.__cause__, error.__context__
+    return clone.with_traceback(error.__traceback__)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}  # key -> Future of the leader's result
+        self._lock = threading.Lock()
+
+    def in_flight(self):
+        return len(self._calls)
+
+    def do(self, key, fn):
+        # Returns (result, shared); the leader's exception is raised in every waiter too
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            return self._follow(call.exception(), call.result), True
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+        call.set_result((result, resilience.outcome()))
+        return result, False
+
+    @staticmethod
+    def _follow(error, result):
+        if error is not None:
+            raise _copy(error)
+        result, outcome = result()
+        resilience.adopt(outcome)
+        return result
+
+    async def do_async(self, key, fn):
+        # Same for coroutines on the ASGI app's event loop; fn() returns an awaitable
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = asyncio.get_running_loop().create_future()
+        if not leader:
+            await asyncio.wait([call])  # unlike awaiting it, doesn't raise the leader's exception instance
+            return self._follow(call.exception(), call.result), True
+        try:
+            result = await fn()
+        except BaseException as e:
+            call.set_exception(e)
+            call.exception()  # retrieved, so an unawaited failure isn't logged as never retrieved
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+        call.set_result((result, resilience.outcome()))
+        return result, False
+
+
+flights = SingleFlight()
+async_flights = SingleFlight()  # asyncApp's native routes; their futures belong to the event loop
+
+metrics.register_gauge(
+    "single_flight_in_flight", "Coalesced reads currently being served.",
+    lambda: flights.in_flight() + async_flights.in_flight(),
+)
+
+
+def request_key(endpoint, view_args, arg_items):
+    return endpoint, tuple(sorted(view_args.items())), normalized_args(arg_items)
+
+
+def coalesce():
+    # Place under @conditional_get so each waiter still gets its own 304 handling
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not ENABLED or request.method != "GET":
+                return view(*args, **kwargs)
+
+            def lead():
+                response = current_app.make_response(view(*args, **kwargs))
+                return response.get_data(), response.status_code, list(response.headers.items()), \
+                    bool(g.get("upstream_shed"))
+
+            key = request_key(request.endpoint, kwargs, request.args.items(multi=True))
+            (body, status, headers, shed), shared = flights.do(key, lead)
+            requests_total.inc(request.endpoint, "follower" if shared else "leader")
+            if shed:
+                g.upstream_shed = True  # admission.py turns the shared failure into a 503 here too
+            return current_app.response_class(body, status=status, headers=headers)
+        return wrapper
+    return decorator
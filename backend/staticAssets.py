@@ -0,0 +1,176 @@
+import gzip
+import hashlib
+import io
+import mimetypes
+import os
+import re
+import sys
+
+from flask import abort, request, send_file
+
+import compression
+
+# Serving of the built frontend (frontend/dist).
+# The build is indexed once at startup: every file's type, ETag and precompressed variants are
+# looked up then, so a request is a dictionary lookup plus a file send. Brotli/gzip variants written
+# next to the files (`python staticAssets.py ../frontend/dist`, run after `vite build`) are served
+# as is; compressible files without them are compressed once into memory at startup.
+# Vite's content-hashed files under assets/ are cached by browsers for a year without revalidation,
+# so a repeat visit requests nothing but index.html (a 304 while the build is unchanged).
+# index.html is held in memory and also answers every client-side route (SPA fallback).
+
+DIST_DIR = os.path.abspath(os.environ.get(
+    "FRONTEND_DIST", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend", "dist")
+))
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=3600"
+INDEX_CACHE_CONTROL = "no-cache"  # always revalidated, so a new deploy is picked up on next load
+
+# Vite names bundled files <name>-<hash>.<ext> under assets/
+HASHED_NAME = re.compile(r"^assets/.+-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$")
+
+VARIANT_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+class Asset:
+    def __init__(self, url_path, path, mimetype, etag, immutable):
+        self.url_path = url_path
+        self.path = path
+        self.mimetype = mimetype
+        self.etag = etag
+        self.immutable = immutable
+        self.variants = {}  # coding -> path on disk, or bytes held in memory
+        self.body = None  # whole identity body, for index.html
+
+    @property
+    def cache_control(self):
+        return IMMUTABLE_CACHE_CONTROL if self.immutable else DEFAULT_CACHE_CONTROL
+
+
+def _digest(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _codings():
+    return ("br", "gzip") if compression.brotli is not None else ("gzip",)
+
+
+class StaticAssets:
+    def __init__(self, root=DIST_DIR):
+        self.root = root
+        self.assets = {}
+        self.index = None
+
+    def scan(self):
+        assets = {}
+        if os.path.isdir(self.root):
+            for directory, _, files in os.walk(self.root):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    url_path = os.path.relpath(path, self.root).replace(os.sep, "/")
+                    if url_path.endswith(tuple(VARIANT_SUFFIXES.values())) and os.path.exists(path.rsplit(".", 1)[0]):
+                        continue  # a variant of another file, attached below
+                    assets[url_path] = self._asset(url_path, path)
+        self.assets = assets
+        self.index = assets.get("index.html")
+        if self.index is not None:
+            with open(self.index.path, "rb") as f:
+                self.index.body = f.read()
+        return self
+
+    def _asset(self, url_path, path):
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        asset = Asset(url_path, path, mimetype, f'"{_digest(path)}"', bool(HASHED_NAME.match(url_path)))
+        size = os.path.getsize(path)
+        if not compression.compressible(mimetype, size):
+            return asset
+        data = None
+        for coding in _codings():
+            variant = path + VARIANT_SUFFIXES[coding]
+            if os.path.exists(variant):
+                asset.variants[coding] = variant
+            else:
+                if data is None:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                asset.variants[coding] = compression.compress(data, coding)
+        return asset
+
+    def lookup(self, url_path):
+        return self.assets.get(url_path)
+
+    def serve(self, asset):
+        coding = compression.negotiate(request.headers.get("Accept-Encoding"), tuple(asset.variants))
+        if coding is None:
+            source = io.BytesIO(asset.body) if asset.body is not None else asset.path
+            etag = asset.etag
+        else:
+            source = asset.variants[coding]
+            source = io.BytesIO(source) if isinstance(source, bytes) else source
+            etag = f'{asset.etag[:-1]}-{coding}"'  # each encoding is a different byte sequence
+
+        response = send_file(source, mimetype=asset.mimetype, etag=etag.strip('"'), conditional=True)
+        if coding is not None:
+            response.headers["Content-Encoding"] = coding
+        if asset.variants:
+            response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = INDEX_CACHE_CONTROL if asset is self.index else asset.cache_control
+        return response
+
+    def serve_path(self, url_path):
+        asset = self.lookup(url_path)
+        if asset is not None:
+            return self.serve(asset)
+        # Page navigations to client-side routes get the app shell. A missing file (anything with an
+        # extension) or an API call to an unknown route stays a 404 rather than a page of HTML.
+        last_segment = url_path.rsplit("/", 1)[-1]
+        navigation = "text/html" in request.headers.get("Accept", "")
+        if self.index is None or "." in last_segment or not navigation:
+            abort(404)
+        return self.serve(self.index)
+
+
+def init_app(app, root=DIST_DIR):
+    # The app must be created with static_folder=None so these routes own every unmatched GET path
+    assets = StaticAssets(root).scan()
+    app.extensions["static_assets"] = assets
+
+    @app.route("/<path:url_path>", methods=["GET"])
+    def frontend(url_path):
+        return assets.serve_path(url_path)
+
+    return assets
+
+
+def precompress(root):
+    # Build step: writes .gz (and .br, with brotli installed) next to every compressible file,
+    # at maximum compression since it only runs once per build
+    written = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.endswith(tuple(VARIANT_SUFFIXES.values())):
+                continue
+            path = os.path.join(directory, name)
+            mimetype = mimetypes.guess_type(path)[0]
+            if not compression.compressible(mimetype, os.path.getsize(path)):
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            with open(path + ".gz", "wb") as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            written += 1
+            if compression.brotli is not None:
+                with open(path + ".br", "wb") as f:
+                    f.write(compression.brotli.compress(data, quality=11))
+                written += 1
+    return written
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else DIST_DIR
+    print(f"Wrote {precompress(target)} precompressed files under {target}")
@@ -0,0 +1,262 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueListener
+
+from flask import g, request
+
+# Structured, non-blocking logging.
+# Every record is written as one JSON object per line with the request id of the request that
+# logged it. Request threads only put records on a bounded in-memory queue; a background thread
+# formats and writes them, so a slow stdout or log shipper never adds latency to a request. When
+# the queue is full, records are dropped and counted rather than blocking. Messages are formatted
+# by that thread too, so logger.debug("... %s", big_value) costs nothing if the record is dropped.
+#
+# Each request logs one access line (method, path, status, duration, upstream calls). Requests are
+# sampled per endpoint: an unsampled request drops its debug/info records (the access line
+# included), while warnings and errors are always written.
+#
+#   LOG_LEVEL=INFO
+#   LOG_FORMAT=json (default) | text
+#   LOG_SAMPLE_RATE=1.0                  share of requests whose info/debug records are kept
+#   LOG_SAMPLE_<ENDPOINT>=0.01           per endpoint override, e.g. LOG_SAMPLE_GET_JOB=0.01
+#   LOG_QUEUE_SIZE=10000
+
+LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 1.0))
+QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+
+# Endpoints polled often enough to drown everything else out
+ENDPOINT_SAMPLE_RATES = {
+    "get_job": 0.05,
+    "prometheus_metrics": 0.0,
+    "healthz": 0.0,
+    "readyz": 0.0,
+    "frontend": 0.1,
+}
+
+# A client-supplied X-Request-ID is reused only if it looks like an id, not arbitrary text
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# LogRecord attributes that aren't caller-supplied extra fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id", "sampled", "taskName",
+}
+
+request_id = contextvars.ContextVar("request_id", default=None)
+sampled = contextvars.ContextVar("log_sampled", default=True)
+
+access_log = logging.getLogger("access")
+
+
+def _sample_rates_from_env():
+    rates = dict(ENDPOINT_SAMPLE_RATES)
+    for name, value in os.environ.items():
+        if name.startswith("LOG_SAMPLE_") and name != "LOG_SAMPLE_RATE":
+            rates[name[len("LOG_SAMPLE_"):].lower()] = float(value)
+    return rates
+
+
+SAMPLE_RATES = _sample_rates_from_env()
+
+
+def sample(endpoint):
+    rate = SAMPLE_RATES.get(endpoint, SAMPLE_RATE)
+    return rate >= 1 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+class _ContextFilter(logging.Filter):
+    # Runs on the thread that logged, so it can read that request's context variables
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return record.levelno >= logging.WARNING or sampled.get()
+
+
+class QueueHandler(logging.Handler):
+    # Hands records to a per-process writer thread. Unlike logging.handlers.QueueHandler it does no
+    # formatting on the caller's thread and never blocks: a full queue drops the record.
+    def __init__(self, target, maxsize=QUEUE_SIZE):
+        super().__init__()
+        self.target = target
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._queue = None
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.addFilter(_ContextFilter())
+
+    def _start(self):
+        # Per process: a listener thread doesn't survive a fork, and the queue's lock may not either
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._queue = queue.Queue(self.maxsize)
+                    self._listener = QueueListener(self._queue, self.target, respect_handler_level=True)
+                    self._listener.start()
+                    self._pid = pid
+        return self._queue
+
+    def emit(self, record):
+        try:
+            self._start().put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        if self._listener is not None and self._pid == os.getpid():
+            try:
+                self._listener.stop()  # drains what is queued
+            except queue.Full:
+                pass
+            self._pid = None
+
+
+handler = None
+
+
+def configure():
+    # Idempotent; replaces whatever handlers the root logger had
+    global handler
+    if handler is not None:
+        return handler
+    target = logging.StreamHandler()
+    if FORMAT == "json":
+        target.setFormatter(JsonFormatter())
+    else:
+        target.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    handler = QueueHandler(target)
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LEVEL)
+    # Werkzeug's own request lines duplicate the access log
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    atexit.register(handler.flush)
+    return handler
+
+
+def dropped():
+    return handler.dropped if handler is not None else 0
+
+
+def _request_id(header):
+    return header if header and REQUEST_ID_PATTERN.match(header) else uuid.uuid4().hex
+
+
+def init_app(app):
+    @app.before_request
+    def _start_request_log():
+        g.log_started = time.perf_counter()
+        g.log_tokens = (
+            request_id.set(request_id.get() or _request_id(request.headers.get("X-Request-ID"))),
+            sampled.set(sample(request.endpoint)),
+        )
+
+    @app.after_request
+    def _access_log(response):
+        response.headers["X-Request-ID"] = request_id.get() or ""
+        started = g.get("log_started")
+        if started is not None:
+            access_log.info(
+                "%s %s %s", request.method, request.path, response.status_code,
+                extra={
+                    "method": request.method,
+                    "path": request.path,
+                    "endpoint": request.endpoint,
+                    "status": response.status_code,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                    "upstream_calls": len(g.get("upstream_calls") or ()),
+                },
+            )
+        return response
+
+    @app.teardown_request
+    def _end_request_log(exc):
+        tokens = g.pop("log_tokens", None)
+        if tokens is not None:
+            request_id.reset(tokens[0])
+            sampled.reset(tokens[1])
+
+
+class RequestLogMiddleware:
+    # Request ids, sampling and access lines for asyncApp's native routes. The mounted Flask app
+    # runs in a copy of this context, so it keeps the id set here and logs (and samples) its own requests.
+    def __init__(self, app, routes=()):
+        self.app = app
+        self.routes = routes
+
+    def _endpoint(self, scope):
+        # Native routes are named after their handlers, like the Flask endpoints they replace, so
+        # LOG_SAMPLE_<ENDPOINT> covers both serving modes
+        from starlette.routing import Match, Route
+        for route in self.routes:
+            if isinstance(route, Route) and route.matches(scope)[0] == Match.FULL:
+                return route.name
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        rid = _request_id(headers.get(b"x-request-id", b"").decode("latin-1"))
+        endpoint = self._endpoint(scope)
+        request_id.set(rid)
+        sampled.set(sample(endpoint))
+        started = time.perf_counter()
+        status = None
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                response_headers = list(message.get("headers", []))
+                if not any(k.lower() == b"x-request-id" for k, _ in response_headers):
+                    status = message["status"]  # a native route; Flask responses already carry the id
+                    message = dict(message, headers=response_headers + [(b"x-request-id", rid.encode())])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if status is not None:
+                access_log.info(
+                    "%s %s %s", scope["method"], scope["path"], status,
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "endpoint": endpoint,
+                        "status": status,
+                        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                    },
+                )
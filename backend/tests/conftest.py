@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import uuid
+
+# The suite runs against the in-memory SQLite backend; settings are read at import, so set them first
+os.environ.setdefault("DATA_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", ":memory:")
+os.environ.setdefault("SEARCH_INDEX_DIR", "")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("JOB_STORE", "memory")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+import pytest
+
+import localStore
+import resilience
+import supabaseInit
+
+
+def make_token(role="user", company=None, subject=None, expires_in=3600):
+    # An access token shaped like the ones Supabase (and localStore's auth stub) issue
+    now = int(time.time())
+    claims = {
+        "sub": subject or str(uuid.uuid4()),
+        "email": "tester@example.com",
+        "role": "authenticated",
+        "aud": "authenticated",
+        "iat": now,
+        "exp": now + expires_in,
+        "app_metadata": {"role": role, "company": company or ""},
+    }
+    return jwt.encode(claims, localStore.JWT_SECRET, algorithm="HS256")
+
+
+def bearer(role="user", company=None, **kwargs):
+    return {"Authorization": f"Bearer {make_token(role, company, **kwargs)}"}
+
+
+@pytest.fixture(scope="session")
+def app():
+    import main
+    main.app.config["TESTING"] = True
+    return main.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def data():
+    return supabaseInit.get_supabase()
+
+
+@pytest.fixture
+def company():
+    # A company of its own per test, so tests sharing the in-memory store don't see each other's rows
+    return f"company-{uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture(autouse=True)
+def healthy_upstream():
+    yield
+    supabaseInit.get_supabase().store.faults.configure()
+    for breaker in resilience.breakers.values():
+        breaker.success()
+
+
+def wait_for_job(client, status_url, timeout=5):
+    # Polls /jobs/<id> like the frontend does; returns the finished job
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(status_url).get_json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        assert time.monotonic() < deadline, f"job still {job['status']} after {timeout}s"
+        time.sleep(0.01)
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+import admission
+import resilience
+from upstream import _in_slot
+
+
+@pytest.fixture
+def one_slot(monkeypatch):
+    monkeypatch.setattr(admission, "UPSTREAM_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(admission, "_slots", None)
+    yield admission._semaphore()
+    monkeypatch.setattr(admission, "_slots", None)
+
+
+def slot_free(slots):
+    if slots.acquire(blocking=False):
+        slots.release()
+        return True
+    return False
+
+
+def test_abandoned_attempt_keeps_its_slot_until_it_returns(one_slot, monkeypatch):
+    monkeypatch.setattr(resilience, "ATTEMPT_TIMEOUT", 0.05)
+    monkeypatch.setattr(resilience, "CLIENT_TIMEOUT", None)
+    returned = threading.Event()
+
+    def slow():
+        time.sleep(0.3)
+        returned.set()
+
+    token = resilience.start_deadline(0.1)
+    try:
+        with pytest.raises(resilience.UpstreamTimeout):
+            resilience.call(_in_slot(slow), idempotent=True)
+    finally:
+        resilience.reset_deadline(token)
+    assert not returned.is_set() and not slot_free(one_slot)
+    assert returned.wait(1)
+    time.sleep(0.01)
+    assert slot_free(one_slot)
+
+
+def test_slot_is_not_held_during_backoff(one_slot, monkeypatch):
+    monkeypatch.setattr(resilience, "_backoff", lambda attempt: 0.05)
+    free_while_backing_off = []
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("upstream down")
+        return "ok"
+
+    real_sleep = time.sleep
+
+    class Clock:
+        monotonic = staticmethod(time.monotonic)
+
+        @staticmethod
+        def sleep(seconds):
+            free_while_backing_off.append(slot_free(one_slot))
+            real_sleep(seconds)
+
+    monkeypatch.setattr(resilience, "time", Clock)
+    assert resilience.call(_in_slot(flaky), idempotent=True) == "ok"
+    assert free_while_backing_off == [True]
+
+
+def test_rate_limit_answers_429(client, monkeypatch):
+    monkeypatch.setattr(admission, "ENABLED", True)
+    monkeypatch.setattr(admission, "buckets", admission.MemoryBuckets())
+    monkeypatch.setitem(admission.LIMITS, "getCompanies", (0.1, 2))
+
+    statuses = [client.get("/getCompanies").status_code for _ in range(3)]
+    assert 429 not in statuses[:2] and statuses[2] == 429
+    response = client.get("/getCompanies")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_health_probes_are_never_limited(client, monkeypatch):
+    monkeypatch.setattr(admission, "ENABLED", True)
+    monkeypatch.setattr(admission, "buckets", admission.MemoryBuckets())
+    monkeypatch.setattr(admission, "DEFAULT_LIMIT", (0.1, 1))
+    assert all(client.get("/healthz").status_code == 200 for _ in range(5))
+
+
+def test_a_full_walk_of_the_projects_at_the_largest_page_fits_the_burst(client, data, company, monkeypatch):
+    monkeypatch.setattr(admission, "ENABLED", True)
+    monkeypatch.setattr(admission, "buckets", admission.MemoryBuckets())
+    data.table("projects").insert([{"name": f"Project {n}", "company": company} for n in range(2500)]).execute()
+
+    # What the frontend's fetchAllPages does
+    statuses, cursor = [], None
+    while True:
+        response = client.get("/getAllProjects", query_string={"limit": 1000, **({"cursor": cursor} if cursor else {})})
+        statuses.append(response.status_code)
+        cursor = response.get_json().get("next_cursor")
+        if response.status_code != 200 or not cursor:
+            break
+    assert len(statuses) >= 3 and set(statuses) == {200}
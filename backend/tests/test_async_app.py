@@ -0,0 +1,76 @@
+import threading
+import uuid
+
+import pytest
+from starlette.testclient import TestClient
+
+import asyncApp
+import metrics
+
+
+@pytest.fixture(scope="module")
+def async_client():
+    with TestClient(asyncApp.app) as client:
+        yield client
+
+
+@pytest.fixture
+def staff_queries(data, monkeypatch):
+    # Filter values of every users select, in order
+    queries = []
+    run = data.store.run
+
+    def record(query):
+        if query._table == "users" and query._op == "select":
+            queries.append([params for _, params in query._filters])
+        return run(query)
+
+    monkeypatch.setattr(data.store, "run", record)
+    return queries
+
+
+def add_user(data, company, role):
+    user_id = str(uuid.uuid4())
+    data.table("users").insert({"id": user_id, "name": role, "role": role, "company_name": company}).execute()
+    return user_id
+
+
+def test_get_staff_refuses_non_admins_their_company_staff(async_client, data, company):
+    user_id = add_user(data, company, "client")
+    response = async_client.get(f"/getStaff?user_id={user_id}&company_name={company}")
+    assert response.status_code == 403
+    assert "staff" not in response.json()
+
+
+def test_get_staff_for_an_admin(async_client, data, company, staff_queries):
+    user_id = add_user(data, company, "admin")
+    response = async_client.get(f"/getStaff?user_id={user_id}&company_name={company}")
+    assert response.status_code == 200
+    assert [row["id"] for row in response.json()["staff"]] == [user_id]
+    assert sorted(staff_queries) == sorted([[[user_id]], [[company]]])
+
+
+def test_get_staff_overlaps_the_caller_and_staff_lookups(async_client, data, company, monkeypatch):
+    user_id = add_user(data, company, "admin")
+    # Each users select waits for the other: run one after the other, they'd time out
+    both_in_flight = threading.Barrier(2, timeout=2)
+    run = data.store.run
+
+    def record(query):
+        if query._table == "users" and query._op == "select":
+            both_in_flight.wait()
+        return run(query)
+
+    monkeypatch.setattr(data.store, "run", record)
+    response = async_client.get(f"/getStaff?user_id={user_id}&company_name={company}")
+    assert response.status_code == 200
+
+
+def test_native_routes_are_in_the_request_metrics(async_client, data, company):
+    user_id = add_user(data, company, "admin")
+    before = metrics.requests_total.value("/getStaff", "GET", "200")
+    response = async_client.get(f"/getStaff?user_id={user_id}&company_name={company}")
+    assert metrics.requests_total.value("/getStaff", "GET", "200") == before + 1
+    assert 'db;desc="2 calls"' in response.headers["server-timing"]
+    async_client.get(f"/dashboard/{company}")
+    assert 'http_request_duration_seconds_count{route="/dashboard/<company>"}' in metrics.render()
@@ -0,0 +1,70 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import jwt
+import pytest
+
+import authClaims
+import localStore
+from conftest import bearer, make_token
+
+
+def test_valid_token_becomes_the_principal(app, company):
+    token = make_token("admin", company)
+    with app.test_request_context("/getAllProjects", headers={"Authorization": f"Bearer {token}"}):
+        app.preprocess_request()
+        principal = authClaims.current_principal()
+    assert principal.is_admin and principal.company == company
+
+
+def test_expired_token_is_refused_on_data_routes(client, company):
+    headers = bearer("admin", company, expires_in=-3600)
+    assert client.get("/export/projects", headers=headers).status_code == 401
+
+
+@pytest.mark.parametrize("path", ["/healthz", "/readyz", "/"])
+def test_expired_token_is_ignored_on_public_routes(client, company, path):
+    response = client.get(path, headers=bearer("admin", company, expires_in=-3600))
+    assert response.status_code != 401
+
+
+def test_permissions_missing_from_the_token_are_looked_up(client, data, company):
+    subject = str(uuid.uuid4())
+    data.table("users").insert({"id": str(uuid.uuid4()), "authId": subject, "role": "admin",
+                                "company_name": company}).execute()
+    token = jwt.encode({"sub": subject, "aud": "authenticated", "exp": int(time.time()) + 60},
+                       localStore.JWT_SECRET, algorithm="HS256")
+    response = client.post("/search/reindex", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+
+
+def test_failed_permission_lookup_answers_503(client, data):
+    token = jwt.encode({"sub": str(uuid.uuid4()), "aud": "authenticated", "exp": int(time.time()) + 60},
+                       localStore.JWT_SECRET, algorithm="HS256")
+    data.store.faults.configure(error_rate=1.0, tables=["users"])
+    response = client.get("/getAllProjects", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
+
+
+def test_jwks_client_is_built_once(monkeypatch):
+    built = []
+
+    class SlowClient:
+        def __init__(self, *args, **kwargs):
+            built.append(self)
+            time.sleep(0.05)
+
+    monkeypatch.setattr(jwt, "PyJWKClient", SlowClient)
+    monkeypatch.setattr(authClaims, "_jwks_client", None)
+    barrier = threading.Barrier(4)
+
+    def get():
+        barrier.wait()
+        return authClaims._jwks()
+
+    with ThreadPoolExecutor(4) as pool:
+        clients = list(pool.map(lambda _: get(), range(4)))
+    assert len(built) == 1 and all(client is built[0] for client in clients)
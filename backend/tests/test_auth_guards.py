@@ -0,0 +1,32 @@
+import json
+
+from conftest import bearer
+
+
+def projects_csv(company):
+    return f"name,company,start_date,end_date\nImported project,{company},2024-01-01,2024-06-30\n"
+
+
+def test_import_requires_a_token(client, company):
+    response = client.post("/import/projects", data=projects_csv(company), content_type="text/csv")
+    assert response.status_code == 401
+
+
+def test_import_rejects_non_admins(client, company):
+    response = client.post("/import/projects", data=projects_csv(company), content_type="text/csv",
+                           headers=bearer("client", company))
+    assert response.status_code == 403
+
+
+def test_import_accepts_admins(client, company):
+    response = client.post("/import/projects", data=projects_csv(company), content_type="text/csv",
+                           headers=bearer("admin", company))
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert results[-1]["summary"] == {"created": 1, "total": 1}
+
+
+def test_reindex_requires_an_admin(client, company):
+    assert client.post("/search/reindex").status_code == 401
+    assert client.post("/search/reindex", headers=bearer("client", company)).status_code == 403
+    assert client.post("/search/reindex", headers=bearer("admin", company)).status_code == 200
@@ -0,0 +1,40 @@
+import threading
+import uuid
+
+import bulkImport
+
+
+def rows(*users):
+    return [(line, user, None) for line, user in enumerate(users, start=2)]
+
+
+def user(email, company, **fields):
+    return dict({"name": "Imported", "email": email, "company": company, "role": "client"}, **fields)
+
+
+def statuses(results):
+    return [result["status"] for result in results]
+
+
+def test_existing_emails_match_whatever_their_case(data, company):
+    local = f"Mixed{uuid.uuid4().hex[:6]}"
+    data.table("users").insert({"id": str(uuid.uuid4()), "email": f"{local}x@Example.com", "company": company}).execute()
+
+    results = bulkImport.import_users(data, rows(
+        user(f"{local.lower()}x@example.com", company),
+        # "_" is a wildcard in ilike patterns; it must not make this one a duplicate
+        user(f"{local.lower()}_@example.com", company),
+    ), batch_size=10)
+    assert statuses(results) == ["duplicate", "created"]
+
+
+def test_sign_ups_run_on_the_import_pool(data, company, monkeypatch):
+    threads = []
+    sign_up = bulkImport._sign_up
+    monkeypatch.setattr(bulkImport, "_sign_up", lambda *args: threads.append(threading.current_thread().name) or sign_up(*args))
+
+    results = bulkImport.import_users(data, rows(*(
+        user(f"{uuid.uuid4().hex[:8]}@example.com", company, password="s3cret-password") for _ in range(3)
+    )), batch_size=10)
+    assert statuses(results) == ["created"] * 3
+    assert len(threads) == 3 and all(name.startswith("import") for name in threads)
@@ -0,0 +1,87 @@
+import json
+import uuid
+
+import pytest
+
+import commentStream
+from commentStream import CommentBroker, broker
+
+
+def test_a_slow_watcher_loses_its_oldest_comments():
+    local = CommentBroker(queue_size=2)
+    slow = local.subscribe("p1")
+    other = local.subscribe("p2")
+    for n in range(1, 4):
+        assert local.publish("p1", {"id": n}) == 1
+    assert [slow.queue.get_nowait()["id"] for _ in range(2)] == [2, 3]
+    assert slow.dropped == 1 and other.queue.empty()
+
+    local.unsubscribe(slow)
+    assert not local.has_subscribers("p1") and local.subscriber_count() == 1
+
+
+@pytest.fixture
+def author(data, company):
+    user = {"id": str(uuid.uuid4()), "authId": str(uuid.uuid4()), "name": "Writer", "company": company}
+    data.table("users").insert(user).execute()
+    return user
+
+
+def events(chunks, count):
+    found = []
+    for chunk in chunks:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if text.startswith("id: "):
+            found.append(json.loads(text.split("data: ", 1)[1]))
+            if len(found) == count:
+                return found
+    return found
+
+
+def test_a_reconnect_catches_up_after_its_last_event_and_skips_repeats(client, data, author, monkeypatch):
+    monkeypatch.setattr(commentStream, "HEARTBEAT_SECONDS", 0.05)
+    project_id = str(uuid.uuid4())
+    comments = data.table("comments").insert([
+        {"projectId": project_id, "content": f"comment {n}", "userAuthId": author["authId"]} for n in range(3)
+    ]).execute().data
+
+    response = client.get(f"/projects/{project_id}/comments/stream",
+                          headers={"Last-Event-ID": str(comments[0]["id"])}, buffered=False)
+    assert response.mimetype == "text/event-stream"
+    assert response.headers["Cache-Control"] == "no-cache"
+    chunks = iter(response.response)
+    try:
+        assert next(chunks).startswith(b"retry:")
+        backlog = events(chunks, 2)
+        assert [c["id"] for c in backlog] == [comments[1]["id"], comments[2]["id"]]
+        assert backlog[0]["userName"] == "Writer"
+
+        broker.publish(project_id, dict(comments[2], userName="Writer"))  # already sent from the backlog
+        broker.publish(project_id, {"id": comments[2]["id"] + 1, "content": "live", "userName": "Writer"})
+        assert [c["content"] for c in events(chunks, 1)] == ["live"]
+    finally:
+        response.close()
+    assert not broker.has_subscribers(project_id)
+
+
+def test_a_new_stream_costs_no_query(client, data, monkeypatch):
+    queries = []
+    run = data.store.run
+    monkeypatch.setattr(data.store, "run", lambda query: queries.append(query._table) or run(query))
+    response = client.get(f"/projects/{uuid.uuid4()}/comments/stream", buffered=False)
+    response.close()
+    assert queries == []
+
+
+def test_added_comments_reach_watchers_with_the_author_name(client, author):
+    project_id = str(uuid.uuid4())
+    watcher = broker.subscribe(project_id)
+    try:
+        response = client.post("/addComment", json={
+            "project_id": project_id, "comment": "hello", "sender": author["authId"]})
+        assert response.status_code == 201
+        published = watcher.queue.get_nowait()
+        assert published["id"] == response.get_json()["comment"]["id"]
+        assert (published["content"], published["userName"]) == ("hello", "Writer")
+    finally:
+        broker.unsubscribe(watcher)
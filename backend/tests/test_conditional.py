@@ -0,0 +1,34 @@
+from conditional import etag_matches
+
+
+def test_etag_matching():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"def"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_unchanged_polls_get_a_bodiless_304(client, data, company):
+    project = data.table("projects").insert({"name": "Polled", "company": company}).execute().data[0]
+    url = f"/getProjectById?id={project['id']}"
+
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "private, no-cache"
+
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+    assert again.headers["ETag"] == etag
+    # A proxy that re-encoded the body may send our tag back as weak
+    assert client.get(url, headers={"If-None-Match": "W/" + etag}).status_code == 304
+
+    data.table("projects").update({"name": "Renamed"}).eq("id", project["id"]).execute()
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.get_json()["project"]["name"] == "Renamed"
+
+
+def test_errors_carry_no_etag(client):
+    response = client.get("/getProjectById?id=0")
+    assert response.status_code == 404 and "ETag" not in response.headers
@@ -0,0 +1,20 @@
+from conftest import bearer
+
+
+def test_comment_counts_come_with_the_projects(client, data, company, monkeypatch):
+    projects = data.table("projects").insert([
+        {"name": f"Project {n}", "company": company} for n in range(6)
+    ]).execute().data
+    data.table("comments").insert([
+        {"projectId": project["id"], "content": "hi"} for n, project in enumerate(projects) for _ in range(n)
+    ]).execute()
+
+    tables = []
+    run = data.store.run
+    monkeypatch.setattr(data.store, "run", lambda query: tables.append(query._table) or run(query))
+    response = client.get(f"/dashboard/{company}", headers=bearer("admin"))
+
+    assert response.status_code == 200
+    counts = {project["id"]: project["comment_count"] for project in response.get_json()["projects"]}
+    assert counts == {project["id"]: n for n, project in enumerate(projects)}
+    assert sorted(tables) == ["projects", "users"]
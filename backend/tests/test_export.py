@@ -0,0 +1,44 @@
+import json
+
+import dataExport
+from conftest import bearer
+
+
+def seed_comments(data, company, projects=5, per_project=3):
+    rows = data.table("projects").insert([
+        {"name": f"Project {n}", "company": company} for n in range(projects)
+    ]).execute().data
+    data.table("comments").insert([
+        {"projectId": project["id"], "content": f"comment {n}"} for project in rows for n in range(per_project)
+    ]).execute()
+    return [project["id"] for project in rows]
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_export_requires_a_token(client, company):
+    assert client.get(f"/export/projects?company={company}").status_code == 401
+
+
+def test_export_scopes_non_admins_to_their_company(client, data, company):
+    seed_comments(data, company, projects=2, per_project=0)
+    seed_comments(data, "someone-else", projects=1, per_project=0)
+    headers = bearer("client", company)
+
+    assert client.get("/export/projects?company=someone-else", headers=headers).status_code == 403
+    response = client.get("/export/projects", headers=headers)
+    assert response.status_code == 200
+    assert {row["company"] for row in ndjson(response)} == {company}
+
+
+def test_comments_export_batches_the_project_filter(client, data, company, monkeypatch):
+    monkeypatch.setattr(dataExport, "PROJECT_BATCH", 2)
+    project_ids = seed_comments(data, company, projects=5, per_project=3)
+    seed_comments(data, "someone-else", projects=1, per_project=2)
+
+    response = client.get(f"/export/comments?company={company}", headers=bearer("admin"))
+    rows = ndjson(response)
+    assert len(rows) == 15
+    assert {row["projectId"] for row in rows} == set(project_ids)
@@ -0,0 +1,35 @@
+import pytest
+
+from fieldsets import FieldsetError, select_fields
+
+
+def test_requested_columns_follow_the_required_ones_once():
+    assert select_fields("projects", {}) == "*"
+    assert select_fields("projects", {"fields": "name, id,name"}, required=("id",)) == "id, name"
+
+
+@pytest.mark.parametrize("fields", [",, ", "name,password"])
+def test_empty_and_unknown_fields_are_refused(fields):
+    with pytest.raises(FieldsetError):
+        select_fields("users", {"fields": fields})
+
+
+def test_routes_select_only_the_requested_columns(client, data, company, monkeypatch):
+    project = data.table("projects").insert({"name": "Sparse", "description": "long text", "company": company}) \
+        .execute().data[0]
+    selected = []
+    run = data.store.run
+    monkeypatch.setattr(data.store, "run", lambda query: selected.append(query._columns) or run(query))
+
+    response = client.get(f"/getProjectById?id={project['id']}&fields=name")
+    assert response.get_json() == {"project": {"name": "Sparse"}}
+    assert selected == [["name"]]
+
+    rows = client.get(f"/getProjectsByCompany?company_name={company}&fields=description").get_json()["projects"]
+    assert rows == [{"id": project["id"], "description": "long text"}]
+
+
+def test_unknown_fields_are_a_bad_request(client):
+    response = client.get("/getAllProjects?fields=name,secret")
+    assert response.status_code == 400
+    assert "secret" in response.get_json()["error"]
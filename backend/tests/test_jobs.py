@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import uuid
+
+import jobQueue
+from conftest import wait_for_job
+
+
+def new_user(company):
+    return {"username": "Test User", "company": company, "email": f"{uuid.uuid4().hex[:8]}@example.com",
+            "password": "s3cret-password", "role": "client"}
+
+
+def test_add_user_runs_as_a_job(client, data, company):
+    user = new_user(company)
+    response = client.post("/addUser", json=user)
+    assert response.status_code == 202
+    assert response.headers["Location"] == response.get_json()["status_url"]
+
+    job = wait_for_job(client, response.get_json()["status_url"])
+    assert job["status"] == jobQueue.SUCCEEDED
+    assert job["status_code"] == 201
+    rows = data.table("users").select("email, authId").eq("email", user["email"]).execute().data
+    assert len(rows) == 1 and rows[0]["authId"]
+
+
+def test_add_user_never_stores_the_password(client, company, monkeypatch, tmp_path):
+    import main
+    queue = jobQueue.JobQueue(jobQueue.SqliteJobStore(str(tmp_path / "jobs.sqlite3")))
+    monkeypatch.setattr(main, "jobs", queue)
+    stored = []
+    create = queue.store.create
+    monkeypatch.setattr(queue.store, "create", lambda kind, payload: stored.append(payload) or create(kind, payload))
+
+    user = new_user(company)
+    response = client.post("/addUser", json=user)
+    assert response.status_code == 202
+    wait_for_job(client, response.get_json()["status_url"])
+    assert stored and all(user["password"] not in repr(payload) for payload in stored)
+
+
+def test_add_user_reports_duplicates_from_the_job(client, company):
+    user = new_user(company)
+    wait_for_job(client, client.post("/addUser", json=user).get_json()["status_url"])
+
+    response = client.post("/addUser", json=user)
+    assert response.status_code == 202
+    job = wait_for_job(client, response.get_json()["status_url"])
+    assert job["status"] == jobQueue.FAILED
+    assert (job["status_code"], job["result"]["error"]) == (400, "Email already exists")
+
+
+def test_add_user_resumed_after_a_restart_asks_for_the_user_again(tmp_path, company):
+    import main
+    store = jobQueue.SqliteJobStore(str(tmp_path / "jobs.sqlite3"))
+    user = new_user(company)
+    job_id = store.create("addUser", {"user": {key: user[key] for key in ("company", "email", "role")}})
+
+    queue = jobQueue.JobQueue(store)
+    assert queue.resume() == 1
+    queue._workers().shutdown(wait=True)
+    job = queue.get(job_id)
+    assert (job["status"], job["status_code"]) == (jobQueue.FAILED, 409)
+    rows = main.supabaseClient.table("users").select("email").eq("email", user["email"]).execute().data
+    assert rows == []
+
+
+seen_in_parent = []
+
+
+def _remember_secret(payload, progress):
+    return {"pid": os.getpid(), "secret_seen": payload.get("secret") == "hunter2"}, 200
+
+
+jobQueue.task("test.remember_secret", finished=lambda payload, body: seen_in_parent.append((os.getpid(), body)))(
+    _remember_secret)
+
+
+def test_process_workers_get_secrets_and_finish_in_the_serving_process(tmp_path):
+    store = jobQueue.SqliteJobStore(str(tmp_path / "jobs.sqlite3"))
+    queue = jobQueue.JobQueue(store, executor="process", workers=1)
+    job_id = queue.submit("test.remember_secret", {"n": 1}, secrets={"secret": "hunter2"})
+    queue._workers().shutdown(wait=True)
+
+    job = queue.get(job_id)
+    assert job["status"] == jobQueue.SUCCEEDED
+    assert job["result"]["secret_seen"] and job["result"]["pid"] != os.getpid()
+    assert seen_in_parent == [(os.getpid(), job["result"])]
+    with sqlite3.connect(store.path) as conn:
+        assert "hunter2" not in repr(conn.execute("SELECT * FROM jobs").fetchall())
+
+
+def test_unknown_job(client):
+    assert client.get("/jobs/not-a-job").status_code == 404
+
+
+def test_add_users_to_project_rejects_ids_that_are_not_strings_or_integers(client):
+    for user_ids in ([{"id": 1}], [[1]], [True], [None]):
+        response = client.post("/addUsersToProject", json={"project_id": 1, "user_ids": user_ids})
+        assert response.status_code == 400
+
+
+def test_add_users_to_project_reports_each_user_once(client, data, company):
+    project = data.table("projects").insert({"name": "Members", "company": company}).execute().data[0]
+    user_id = str(uuid.uuid4())
+    data.table("users").insert({"id": user_id, "name": "Member", "company": company}).execute()
+
+    response = client.post("/addUsersToProject", json={"project_id": project["id"], "user_ids": [user_id, user_id, "missing"]})
+    job = wait_for_job(client, response.get_json()["status_url"])
+    assert job["status_code"] == 207
+    assert job["result"]["results"] == [{"id": user_id, "status": "added"}, {"id": "missing", "status": "not_found"}]
@@ -0,0 +1,36 @@
+import decimal
+import uuid
+from datetime import date, datetime, timezone
+
+import pytest
+from flask.json.provider import DefaultJSONProvider
+
+import jsonProvider
+
+SAMPLE = {
+    "b": [1, 2.5, None, True],
+    "a": "Zoë's café",
+    "when": datetime(2024, 3, 1, 12, 30, tzinfo=timezone.utc),
+    "day": date(2024, 3, 1),
+    "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+    "price": decimal.Decimal("9.99"),
+}
+
+
+@pytest.mark.skipif(jsonProvider.orjson is None, reason="orjson not installed")
+def test_orjson_and_stdlib_write_the_same_bytes(monkeypatch):
+    monkeypatch.setattr(jsonProvider, "ORJSON_ENABLED", True)
+    fast = jsonProvider.dumps_bytes(SAMPLE)
+    monkeypatch.setattr(jsonProvider, "ORJSON_ENABLED", False)
+    assert jsonProvider.dumps_bytes(SAMPLE) == fast
+
+
+def test_values_match_flasks_provider(app):
+    ours = jsonProvider.loads(jsonProvider.dumps_bytes(SAMPLE))
+    flasks = jsonProvider.loads(DefaultJSONProvider(app).dumps(SAMPLE))
+    assert ours == flasks
+
+
+def test_unknown_types_are_refused():
+    with pytest.raises(TypeError):
+        jsonProvider.dumps_bytes({"value": object()})
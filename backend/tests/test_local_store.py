@@ -0,0 +1,37 @@
+import threading
+import uuid
+
+import pytest
+
+import localStore
+
+
+def test_concurrent_first_sign_ins_share_one_account():
+    auth = localStore.LocalClient().auth
+    credentials = {"email": f"{uuid.uuid4().hex[:8]}@example.com", "password": "s3cret-password"}
+    start = threading.Barrier(8)
+    ids, errors = [], []
+
+    def sign_in():
+        start.wait()
+        try:
+            ids.append(auth.sign_in_with_password(credentials).user.id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=sign_in) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(ids) == 8 and len(set(ids)) == 1
+
+
+def test_sign_up_twice_is_refused():
+    auth = localStore.LocalClient().auth
+    credentials = {"email": f"{uuid.uuid4().hex[:8]}@example.com", "password": "s3cret-password"}
+    auth.sign_up(credentials)
+    with pytest.raises(localStore.LocalStoreError, match="already registered"):
+        auth.sign_up(credentials)
+    with pytest.raises(localStore.LocalStoreError, match="Invalid login"):
+        auth.sign_in_with_password(dict(credentials, password="wrong"))
@@ -0,0 +1,92 @@
+import uuid
+
+import pytest
+
+import membership
+from conftest import wait_for_job
+
+
+@pytest.fixture
+def selects(data, monkeypatch):
+    # (table, filter values) of every select, in order
+    calls = []
+    run = data.store.run
+
+    def record(query):
+        if query._op == "select":
+            calls.append((query._table, [params for _, params in query._filters]))
+        return run(query)
+
+    monkeypatch.setattr(data.store, "run", record)
+    return calls
+
+
+def add_project(data, company, name):
+    return data.table("projects").insert({"name": name, "company": company}).execute().data[0]["id"]
+
+
+def add_member(data, company, project_id, name="Member"):
+    user_id = str(uuid.uuid4())
+    data.table("users").insert({"id": user_id, "name": name, "email": f"{user_id[:8]}@example.com", "company": company}).execute()
+    if project_id is not None:
+        data.table("project_members").insert({"project_id": project_id, "user_id": user_id}).execute()
+    return user_id
+
+
+def member_loads(selects):
+    return [params for table, params in selects if table == "project_members"]
+
+
+def members(client, project_id):
+    return [user["name"] for user in client.get(f"/getUsersByProject?project_id={project_id}").get_json()["users"]]
+
+
+def test_adding_members_reloads_only_that_project(client, data, company, selects):
+    first, second = add_project(data, company, "First"), add_project(data, company, "Second")
+    add_member(data, company, first)
+    add_member(data, company, second)
+    members(client, first), members(client, second)
+    selects.clear()
+
+    newcomer = add_member(data, company, None, name="Newcomer")
+    response = client.post("/addUsersToProject", json={"project_id": first, "user_ids": [newcomer]})
+    assert wait_for_job(client, response.get_json()["status_url"])["status_code"] == 200
+    selects.clear()
+
+    assert "Newcomer" in members(client, first)
+    members(client, second)
+    assert len(member_loads(selects)) == 1
+
+
+def test_renaming_a_user_reloads_the_projects_listing_them(client, data, company, selects):
+    first, second = add_project(data, company, "First"), add_project(data, company, "Second")
+    renamed = add_member(data, company, first, name="Before")
+    add_member(data, company, second)
+    members(client, first), members(client, second)
+    selects.clear()
+
+    client.put("/api/update-user", json={"id": renamed, "name": "After", "company": company})
+    assert members(client, first) == ["After"]
+    members(client, second)
+    assert len(member_loads(selects)) == 1
+
+
+def test_ids_that_are_not_uuids_stay_out_of_the_users_filter(client, data, company, selects):
+    project = add_project(data, company, "Filtered")
+    member = add_member(data, company, None)
+
+    response = client.post("/addUsersToProject", json={"project_id": project, "user_ids": [member, "missing", 7]})
+    job = wait_for_job(client, response.get_json()["status_url"])
+    assert [result["status"] for result in job["result"]["results"]] == ["added", "not_found", "not_found"]
+    assert [params for table, params in selects if table == "users"] == [[[member]]]
+
+    selects.clear()
+    response = client.post("/addUsersToProject", json={"project_id": project, "user_ids": ["missing"]})
+    assert wait_for_job(client, response.get_json()["status_url"])["status_code"] == 404
+    assert [table for table, _ in selects] == ["projects"]
+
+
+def test_as_user_id():
+    user_id = uuid.uuid4()
+    assert membership.as_user_id(str(user_id).upper()) == str(user_id)
+    assert membership.as_user_id("missing") is None and membership.as_user_id(7) is None
@@ -0,0 +1,45 @@
+import metrics
+
+
+def test_histograms_render_cumulative_buckets_and_escaped_labels():
+    latency = metrics.Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0))
+    latency.observe(0.05, '/a"b')
+    latency.observe(0.5, '/a"b')
+    lines = latency.render()
+    assert 'demo_seconds_bucket{route="/a\\"b",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/a\\"b",le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{route="/a\\"b",le="+Inf"} 2' in lines
+    assert 'demo_seconds_count{route="/a\\"b"} 2' in lines
+
+
+def test_flask_routes_are_counted_by_rule_with_their_upstream_calls(client, data, company):
+    project = data.table("projects").insert({"name": "Timed", "company": company}).execute().data[0]
+    before = metrics.requests_total.value("/getProjectById", "GET", "200")
+    calls_before = metrics.upstream_calls_total.value("projects", "select", "ok")
+
+    response = client.get(f"/getProjectById?id={project['id']}")
+    assert response.status_code == 200
+    assert metrics.requests_total.value("/getProjectById", "GET", "200") == before + 1
+    assert metrics.upstream_calls_total.value("projects", "select", "ok") == calls_before + 1
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("app;dur=")
+    assert 'db;desc="1 calls"' in timing and 'db0;desc="projects select 1 rows"' in timing
+
+
+def test_unknown_paths_share_the_catch_all_label(client):
+    before = metrics.requests_total.value("/<path:url_path>", "GET", "404")
+    client.get("/no/such/route")
+    client.get("/another/missing/route")
+    assert metrics.requests_total.value("/<path:url_path>", "GET", "404") == before + 2
+
+
+def test_metrics_endpoint_serves_the_text_format(client):
+    client.get("/healthz")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert "# TYPE http_requests_total counter" in body
+    assert 'http_requests_total{route="/healthz",method="GET",status="200"}' in body
+    assert "# TYPE query_cache_hits_total counter" in body
+    assert "comment_stream_subscribers " in body
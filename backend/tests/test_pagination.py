@@ -0,0 +1,45 @@
+import uuid
+
+import pytest
+
+from pagination import PaginationError, decode_cursor, encode_cursor, page_params
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("id", 42), "id") == 42
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", encode_cursor("user_id", 1)])
+def test_foreign_or_broken_cursors_are_rejected(cursor):
+    with pytest.raises(PaginationError):
+        decode_cursor(cursor, "id")
+
+
+@pytest.mark.parametrize("limit", ["0", "ten"])
+def test_bad_limits_are_rejected(limit):
+    with pytest.raises(PaginationError):
+        page_params({"limit": limit})
+
+
+def test_following_next_cursor_returns_every_row(client, data, company):
+    data.table("users").insert([
+        {"id": str(uuid.uuid4()), "name": f"User {n}", "company": company} for n in range(7)
+    ]).execute()
+
+    names, cursor = [], None
+    while True:
+        url = f"/getUsersByCompany?company_name={company}&limit=3"
+        response = client.get(url + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200
+        body = response.get_json()
+        assert len(body["users"]) <= 3
+        names += [user["name"] for user in body["users"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(names) == sorted(f"User {n}" for n in range(7))
+
+
+def test_invalid_cursor_answers_400(client, company):
+    response = client.get(f"/getUsersByCompany?company_name={company}&cursor=garbage")
+    assert response.status_code == 400
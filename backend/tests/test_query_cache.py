@@ -0,0 +1,99 @@
+import time
+import uuid
+
+import pytest
+
+from queryCache import QueryCache
+
+
+def test_loads_once_until_the_ttl_runs_out(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    loads = []
+    local = QueryCache(ttls={"companies": 10})
+
+    def load():
+        loads.append(1)
+        return ["acme"]
+
+    assert local.get_or_load("companies", "names", load) == ["acme"]
+    assert local.get_or_load("companies", "names", load) == ["acme"]
+    now[0] += 11
+    local.get_or_load("companies", "names", load)
+    assert len(loads) == 2
+    assert (local.hits, local.misses) == (1, 2)
+
+
+def test_invalidating_a_table_leaves_the_others():
+    local = QueryCache()
+    local.set("users", "a", 1)
+    local.set("users", "b", 2)
+    local.set("companies", "names", 3)
+    local.invalidate("users")
+    assert local.get("users", "a") == (False, None)
+    assert local.get("companies", "names") == (True, 3)
+    local.invalidate("companies", "names")
+    assert local.get("companies", "names") == (False, None)
+
+
+def test_evicts_the_least_recently_used_past_the_budget():
+    local = QueryCache(max_bytes=30, sizer=lambda value: 10)
+    for key in "abc":
+        local.set("users", key, key)
+    local.get("users", "a")
+    local.set("users", "d", "d")
+    assert [key for key in "abcd" if local.get("users", key)[0]] == ["a", "c", "d"]
+    assert local.evictions == 1
+
+
+def test_zero_ttl_and_oversized_values_are_not_cached():
+    local = QueryCache(max_bytes=5, ttls={"comments": 0}, sizer=len)
+    local.set("comments", "k", "v")
+    local.set("users", "k", "too large")
+    assert local.stats()["entries"] == 0
+
+
+@pytest.fixture
+def table_calls(data, monkeypatch):
+    calls = []
+    run = data.store.run
+    monkeypatch.setattr(data.store, "run", lambda query: calls.append((query._table, query._op)) or run(query))
+    return calls
+
+
+def test_a_user_write_drops_the_cached_name(client, data, company, table_calls):
+    user = {"id": str(uuid.uuid4()), "authId": str(uuid.uuid4()), "name": "Before", "company": company}
+    data.table("users").insert(user).execute()
+    table_calls.clear()
+
+    for _ in range(3):
+        assert client.get(f"/getUserNameById?user_id={user['authId']}").get_json() == {"name": "Before"}
+    assert table_calls == [("users", "select")]
+
+    client.put("/api/update-user", json=dict(user, name="After"))
+    assert client.get(f"/getUserNameById?user_id={user['authId']}").get_json() == {"name": "After"}
+
+
+def test_a_load_overlapping_an_invalidation_is_not_stored():
+    local = QueryCache()
+
+    def load_then_write():
+        value = ["before"]
+        local.invalidate("companies")  # the write lands while the read is in flight
+        return value
+
+    assert local.get_or_load("companies", "names", load_then_write) == ["before"]
+    assert local.get("companies", "names") == (False, None)
+    assert local.get_or_load("companies", "names", lambda: ["after"]) == ["after"]
+    assert local.get("companies", "names") == (True, ["after"])
+
+
+def test_invalidating_one_key_leaves_loads_of_other_keys():
+    local = QueryCache()
+
+    def load():
+        local.invalidate("users", "b")
+        return 1
+
+    local.get_or_load("users", "a", load)
+    assert local.get("users", "a") == (True, 1)
@@ -0,0 +1,130 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+import resilience
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class Flaky:
+    # Fails the first `failures` calls with `error`, then answers
+    def __init__(self, failures, error=ConnectionError, delay=0.0):
+        self.calls = 0
+        self.failures = failures
+        self.error = error
+        self.delay = delay
+
+    def __call__(self):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.calls <= self.failures:
+            raise self.error("upstream down")
+        return Response(f"answer {self.calls}")
+
+
+@pytest.fixture
+def request_budget():
+    # Runs the test's calls as if inside a request to `endpoint` with `seconds` of budget
+    tokens = []
+
+    def start(seconds, endpoint="get_all_projects"):
+        tokens.append(resilience.start_deadline(seconds, endpoint))
+
+    yield start
+    for token in reversed(tokens):
+        resilience.reset_deadline(token)
+
+
+@pytest.fixture(autouse=True)
+def fresh_breaker(monkeypatch):
+    monkeypatch.setitem(resilience.breakers, "data", resilience.CircuitBreaker("data", failures=3, cooldown=60))
+    monkeypatch.setattr(resilience, "RETRY_BASE", 0.001)
+
+
+def test_reads_are_retried():
+    run = Flaky(failures=2)
+    assert resilience.call(run, idempotent=True).data == "answer 3"
+    assert run.calls == 3
+
+
+def test_writes_are_not_retried():
+    run = Flaky(failures=1)
+    with pytest.raises(ConnectionError):
+        resilience.call(run, idempotent=False)
+    assert run.calls == 1
+
+
+def test_refused_requests_are_not_retried():
+    run = Flaky(failures=1, error=ValueError)
+    with pytest.raises(ValueError):
+        resilience.call(run, idempotent=True)
+    assert run.calls == 1
+    assert resilience.breakers["data"].state == resilience.CircuitBreaker.CLOSED
+
+
+def test_timeouts_are_not_retried_without_room_for_another_attempt(monkeypatch, request_budget):
+    monkeypatch.setattr(resilience, "ATTEMPT_TIMEOUT", 0.2)
+    request_budget(0.3)
+    run = Flaky(failures=0, delay=0.5)
+    with pytest.raises(resilience.UpstreamTimeout):
+        resilience.call(run, idempotent=True)
+    assert run.calls == 1
+
+
+def test_attempts_run_inline_when_the_client_times_out_by_itself(monkeypatch, request_budget):
+    monkeypatch.setattr(resilience, "CLIENT_TIMEOUT", 5)
+    monkeypatch.setattr(resilience, "ATTEMPT_TIMEOUT", 5)
+    request_budget(10)
+    threads = []
+    resilience.call(lambda: threads.append(threading.current_thread()), idempotent=True)
+    assert threads == [threading.current_thread()]
+
+
+def test_breaker_opens_and_fails_fast():
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            resilience.call(Flaky(failures=10), idempotent=False)
+    run = Flaky(failures=0)
+    with pytest.raises(resilience.UpstreamUnavailable):
+        resilience.call(run)
+    assert run.calls == 0
+
+
+def test_stale_answers_stand_in_for_polled_reads(request_budget):
+    key = ("projects", uuid.uuid4().hex)
+    request_budget(10, "get_all_projects")
+    assert resilience.call(Flaky(failures=0), idempotent=True, stale_key=key).data == "answer 1"
+    assert resilience.call(Flaky(failures=10), idempotent=True, stale_key=key).data == "answer 1"
+
+
+def test_other_reads_are_not_kept(request_budget):
+    key = ("projects", uuid.uuid4().hex)
+    request_budget(0, "export_table")
+    resilience.call(Flaky(failures=0), idempotent=True, stale_key=key)
+    assert resilience.stale.get("reads", key) == (False, None)
+
+
+def test_failed_route_answers_503(client, data, company):
+    data.store.faults.configure(error_rate=1.0, tables=["users"])
+    response = client.get(f"/getUsersByCompany?company_name={company}")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
+
+
+def test_polled_route_serves_a_stale_answer(client, data, company):
+    data.table("users").insert({"id": str(uuid.uuid4()), "name": "Ada", "company": company}).execute()
+    url = f"/getUsersByCompany?company_name={company}"
+    assert client.get(url).status_code == 200
+
+    data.store.faults.configure(error_rate=1.0, tables=["users"])
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["Warning"] == resilience.STALE_WARNING
+    assert [user["name"] for user in response.get_json()["users"]] == ["Ada"]
@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+from searchIndex import SearchIndex
+
+
+@pytest.fixture
+def project(data, company):
+    return data.table("projects").insert({"name": "Harbour bridge", "description": "Steel repaint", "company": company}) \
+        .execute().data[0]
+
+
+def names(hits):
+    return [hit.get("name") or hit.get("content") for hit in hits]
+
+
+def test_ranks_name_matches_first_and_pages(data, company, project):
+    data.table("projects").insert({"name": "Depot", "description": "bridge inspection", "company": company}).execute()
+    index = SearchIndex(directory="")
+    hits, total, next_cursor = index.search(data, company, "bridge", limit=1)
+    assert (names(hits), total) == (["Harbour bridge"], 2)
+    rest, _, last = index.search(data, company, "bridge", limit=1, after=[-hits[0]["score"], f"project:{project['id']}"])
+    assert names(rest) == ["Depot"] and last is None
+    assert next_cursor is not None
+
+
+def test_last_word_matches_as_a_prefix(data, company, project):
+    hits, _, _ = SearchIndex(directory="").search(data, company, "harb", limit=10)
+    assert names(hits) == ["Harbour bridge"]
+
+
+def test_other_companies_are_not_searched(data, company, project):
+    assert SearchIndex(directory="").search(data, "someone-else", "bridge", limit=10) == ([], 0, None)
+
+
+def test_writes_through_one_process_reach_another(tmp_path, data, company, project):
+    first, second = SearchIndex(str(tmp_path)), SearchIndex(str(tmp_path))
+    first.search(data, company, "bridge", limit=10)
+    second.search(data, company, "bridge", limit=10)
+    first.add([SearchIndex.project_doc({"id": 10**6, "name": "Canal lock", "company": company})])
+    hits, _, _ = second.search(data, company, "canal", limit=10)
+    assert names(hits) == ["Canal lock"]
+
+
+def test_compaction_rotates_the_journal(tmp_path, data, company, project):
+    writer, reader = SearchIndex(str(tmp_path), compact_every=3), SearchIndex(str(tmp_path), compact_every=3)
+    reader.search(data, company, "bridge", limit=10)
+    for i in range(7):
+        writer.add([SearchIndex.project_doc({"id": 10**6 + i, "name": f"Tunnel {i}", "company": company})])
+        writer.search(data, company, "tunnel", limit=10)
+    journals = [name for name in os.listdir(tmp_path) if name.endswith(".ndjson")]
+    assert len(journals) == 1
+    assert os.path.getsize(tmp_path / journals[0]) < 3 * 200
+    # A process that was reading the old journal follows the rotation; a new one loads the snapshots
+    for index in (reader, SearchIndex(str(tmp_path))):
+        _, total, _ = index.search(data, company, "tunnel", limit=10)
+        assert total == 7
+
+
+def test_only_searched_companies_are_loaded(tmp_path, data, company, project):
+    data.table("projects").insert({"name": "Other bridge", "company": company + "-b"}).execute()
+    builder = SearchIndex(str(tmp_path))
+    builder.search(data, company, "bridge", limit=10)
+    index = SearchIndex(str(tmp_path), max_tenants=1)
+    index.search(data, company, "bridge", limit=10)
+    assert list(index.partitions) == [company]
+    hits, _, _ = index.search(data, company + "-b", "bridge", limit=10)
+    assert names(hits) == ["Other bridge"]
+    assert list(index.partitions) == [company + "-b"]
+
+
+def test_unreadable_journal_position_reloads(tmp_path, data, company, project):
+    index = SearchIndex(str(tmp_path))
+    index.search(data, company, "bridge", limit=10)
+    index.add([SearchIndex.project_doc({"id": 10**6, "name": "Canal lock", "company": company})])
+    index._offset += 3  # lands mid-line, as a stale position would
+    index.add([SearchIndex.project_doc({"id": 10**6 + 1, "name": "Canal gate", "company": company})])
+    _, total, _ = index.search(data, company, "canal", limit=10)
+    assert total == 2
+
+
+def test_rebuild_replaces_the_build_for_every_process(tmp_path, data, company, project):
+    first, second = SearchIndex(str(tmp_path)), SearchIndex(str(tmp_path))
+    second.search(data, company, "bridge", limit=10)
+    data.table("projects").insert({"name": "Ferry bridge", "company": company}).execute()
+    assert first.rebuild(data) >= 2
+    _, total, _ = second.search(data, company, "bridge", limit=10)
+    assert total == 2
+    assert len(os.listdir(tmp_path / "snapshots")) == 1
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g
+
+import resilience
+from singleFlight import SingleFlight, normalized_args
+
+
+def run_together(flight, fn, callers=4, wrap=lambda call: call()):
+    # Starts one leader, then the followers while it is still running; returns each caller's outcome
+    started = threading.Event()
+
+    def leader_fn():
+        started.set()
+        time.sleep(0.1)
+        return fn()
+
+    def caller(index):
+        def call():
+            try:
+                return flight.do("key", leader_fn if index == 0 else fn)
+            except Exception as e:
+                return e
+        if index:
+            started.wait()
+        return wrap(call)
+
+    with ThreadPoolExecutor(callers) as pool:
+        return list(pool.map(caller, range(callers)))
+
+
+def test_followers_share_the_leaders_result():
+    calls = []
+    results = run_together(SingleFlight(), lambda: calls.append(1) or "rows")
+    assert len(calls) == 1
+    assert [result for result, _ in results] == ["rows"] * 4
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+
+
+def test_each_follower_raises_its_own_copy():
+    def fail():
+        raise resilience.UpstreamUnavailable("data", 3)
+
+    errors = run_together(SingleFlight(), fail)
+    assert all(isinstance(error, resilience.UpstreamUnavailable) for error in errors)
+    assert all(error.retry_after == 3 for error in errors)
+    assert len({id(error) for error in errors}) == 4
+
+
+def test_followers_adopt_the_leaders_upstream_outcome(app):
+    failure = ConnectionError("upstream down")
+
+    def load():
+        resilience._mark("stale", True)
+        resilience._mark("failure", failure)
+        return "rows"
+
+    def in_request(call):
+        with app.test_request_context("/getAllProjects"):
+            call()
+            return g.get("upstream_stale"), g.get("upstream_failure")
+
+    outcomes = run_together(SingleFlight(), load, wrap=in_request)
+    assert outcomes == [(True, failure)] * 4
+
+
+def test_async_followers_adopt_the_leaders_upstream_outcome():
+    flight = SingleFlight()
+
+    async def load():
+        resilience._mark("stale", True)
+        await asyncio.sleep(0.05)
+        return "rows"
+
+    async def request():
+        outcome = {}
+        resilience._outcome.set(outcome)
+        result, _ = await flight.do_async("key", load)
+        return result, outcome
+
+    async def main():
+        return await asyncio.gather(*(request() for _ in range(3)))
+
+    assert asyncio.run(main()) == [("rows", {"stale": True})] * 3
+
+
+def test_argument_order_and_field_order_do_not_matter():
+    assert normalized_args([("fields", "name, id"), ("limit", "5")]) == \
+        normalized_args([("limit", "5"), ("fields", "id,name")])
+
+
+def test_coalesced_route_answers_like_an_uncoalesced_one(client, data, company):
+    data.table("projects").insert({"name": "Shared", "company": company}).execute()
+    url = f"/getProjectsByCompany?company_name={company}"
+    with ThreadPoolExecutor(4) as pool:
+        responses = list(pool.map(lambda _: client.get(url), range(4)))
+    assert {response.status_code for response in responses} == {200}
+    assert all(response.get_json()["projects"][0]["name"] == "Shared" for response in responses)
@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import importProfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_main_leaves_logging_and_lazy_modules_alone():
+    check = (
+        "import logging, sys, main\n"
+        "assert not logging.getLogger().handlers, logging.getLogger().handlers\n"
+        "loaded = [m for m in ('bulkImport', 'dataExport', 'jwt', 'httpx', 'supabase') if m in sys.modules]\n"
+        "assert not loaded, loaded\n"
+    )
+    env = dict(os.environ, DATA_BACKEND="sqlite")
+    completed = subprocess.run([sys.executable, "-c", check], cwd=BACKEND, env=env, capture_output=True, text=True)
+    assert completed.returncode == 0, completed.stderr
+
+
+def test_healthz_never_needs_the_upstream(client, data):
+    data.store.faults.configure(error_rate=1.0)
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "ok"
+
+
+def test_readyz_warms_up_and_reports_ready(client):
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.get_json()["ready"] is True
+    assert response.headers["Cache-Control"] == "no-store"
+
+
+def test_import_profile_reads_the_importtime_tree():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   _json\n"
+        "import time:      1500 |       1620 | json\n"
+        "some other warning\n"
+    )
+    assert importProfile._parse(stderr) == [
+        {"module": "_json", "self_ms": 0.12, "cumulative_ms": 0.12, "depth": 1},
+        {"module": "json", "self_ms": 1.5, "cumulative_ms": 1.62, "depth": 0},
+    ]
+
+
+def test_import_profile_enforces_its_budget(tmp_path, capsys):
+    output = tmp_path / "imports.json"
+    assert importProfile.main(["fieldsets", "--runs", "1", "--output", str(output), "--budget-ms", "0"]) == 1
+    assert "over the 0 ms budget" in capsys.readouterr().out
+    written = json.loads(output.read_text())
+    assert written["module"] == "fieldsets" and written["total_ms"] > 0
+    assert any(entry["module"] == "fieldsets" and entry["depth"] == 0 for entry in written["modules"])
+
+    assert importProfile.main(["fieldsets", "--runs", "1", "--budget-ms", "60000"]) == 0
+
+
+def test_import_profile_reports_a_failed_import():
+    with pytest.raises(RuntimeError, match="no_such_module"):
+        importProfile.profile("no_such_module")
@@ -0,0 +1,80 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+import staticAssets
+
+SCRIPT = b"export const greeting = 'hello';\n" * 200
+INDEX = b"<!doctype html><div id=root></div>" + b" " * 2000
+
+
+@pytest.fixture
+def dist(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "index-Bx3kQ9aZ.js").write_bytes(SCRIPT)
+    (tmp_path / "index.html").write_bytes(INDEX)
+    (tmp_path / "favicon.ico").write_bytes(b"\x00\x01" * 10)
+    return tmp_path
+
+
+def frontend(root):
+    app = Flask(__name__, static_folder=None)
+    staticAssets.init_app(app, root=str(root))
+    return app.test_client()
+
+
+def test_hashed_bundles_are_immutable_and_tagged_per_encoding(dist):
+    client = frontend(dist)
+    plain = client.get("/assets/index-Bx3kQ9aZ.js", headers={"Accept-Encoding": "identity"})
+    packed = client.get("/assets/index-Bx3kQ9aZ.js", headers={"Accept-Encoding": "gzip"})
+
+    assert plain.data == SCRIPT and "Content-Encoding" not in plain.headers
+    assert gzip.decompress(packed.data) == SCRIPT and packed.headers["Content-Encoding"] == "gzip"
+    for response in (plain, packed):
+        assert response.headers["Cache-Control"] == staticAssets.IMMUTABLE_CACHE_CONTROL
+        assert response.headers["Vary"] == "Accept-Encoding"
+    assert packed.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+
+    again = client.get("/assets/index-Bx3kQ9aZ.js", headers={
+        "Accept-Encoding": "gzip", "If-None-Match": packed.headers["ETag"]})
+    assert again.status_code == 304
+    mismatched = client.get("/assets/index-Bx3kQ9aZ.js", headers={
+        "Accept-Encoding": "identity", "If-None-Match": packed.headers["ETag"]})
+    assert mismatched.status_code == 200
+
+
+def test_small_and_unhashed_files_are_sent_as_is_for_an_hour(dist):
+    response = frontend(dist).get("/favicon.ico", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Cache-Control"] == staticAssets.DEFAULT_CACHE_CONTROL
+    assert "Content-Encoding" not in response.headers and "Vary" not in response.headers
+
+
+def test_client_side_routes_get_the_app_shell(dist):
+    response = frontend(dist).get("/projects/42/settings", headers={"Accept": "text/html,*/*"})
+    assert response.status_code == 200 and response.data == INDEX
+    assert response.headers["Cache-Control"] == staticAssets.INDEX_CACHE_CONTROL
+
+
+@pytest.mark.parametrize("path, accept", [
+    ("/assets/index-missing1.js", "text/html"),  # a missing file is never the shell
+    ("/api/unknown", "application/json"),  # nor is an unknown API route
+])
+def test_missing_files_and_non_navigations_are_404(dist, path, accept):
+    assert frontend(dist).get(path, headers={"Accept": accept}).status_code == 404
+
+
+def test_without_a_build_everything_is_404(tmp_path):
+    assert frontend(tmp_path / "missing").get("/projects", headers={"Accept": "text/html"}).status_code == 404
+
+
+def test_precompressed_variants_are_served_from_disk(dist):
+    assert staticAssets.precompress(str(dist)) >= 2
+    variant = dist / "assets" / "index-Bx3kQ9aZ.js.gz"
+    variant.write_bytes(gzip.compress(SCRIPT, mtime=0))
+    assets = staticAssets.StaticAssets(str(dist)).scan()
+    assert "assets/index-Bx3kQ9aZ.js.gz" not in assets.assets
+    assert assets.lookup("assets/index-Bx3kQ9aZ.js").variants["gzip"] == str(variant)
+
+    response = frontend(dist).get("/assets/index-Bx3kQ9aZ.js", headers={"Accept-Encoding": "gzip"})
+    assert response.data == variant.read_bytes()
@@ -0,0 +1,73 @@
+import logging
+import threading
+import time
+import uuid
+
+from starlette.testclient import TestClient
+
+import asyncApp
+import structuredLog
+
+
+class Collecting(logging.Handler):
+    def __init__(self, block=None):
+        super().__init__()
+        self.records = []
+        self.started = threading.Event()
+        self.block = block
+
+    def emit(self, record):
+        self.started.set()
+        if self.block is not None:
+            self.block.wait(2)
+        self.records.append(record)
+
+
+def test_native_routes_are_sampled_by_their_endpoint(data, company, monkeypatch):
+    monkeypatch.setattr(structuredLog, "SAMPLE_RATES", {"get_staff": 0.0})
+    decisions = []
+    sample = structuredLog.sample
+    monkeypatch.setattr(structuredLog, "sample", lambda endpoint: decisions.append(endpoint) or sample(endpoint))
+
+    with TestClient(asyncApp.app) as client:
+        client.get(f"/getStaff?user_id={uuid.uuid4()}&company_name={company}")
+    assert decisions[0] == "get_staff"
+    assert not sample("get_staff") and sample("company_dashboard")
+
+
+def test_unsampled_requests_keep_their_warnings(monkeypatch):
+    target = Collecting()
+    handler = structuredLog.QueueHandler(target)
+    logger = logging.getLogger("test.sampling")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    token = structuredLog.sampled.set(False)
+    try:
+        logger.info("dropped")
+        logger.warning("kept")
+    finally:
+        structuredLog.sampled.reset(token)
+        logger.removeHandler(handler)
+        handler.flush()
+    assert [record.getMessage() for record in target.records] == ["kept"]
+
+
+def test_a_full_queue_drops_records_instead_of_blocking():
+    release = threading.Event()
+    target = Collecting(block=release)
+    handler = structuredLog.QueueHandler(target, maxsize=1)
+    record = logging.LogRecord("test", logging.WARNING, __file__, 0, "busy", (), None)
+
+    handler.emit(record)  # taken by the writer thread, which then blocks
+    assert target.started.wait(2)
+    handler.emit(record)  # fills the queue
+    handler.emit(record)
+    handler.emit(record)
+    assert handler.dropped == 2
+
+    release.set()
+    deadline = time.monotonic() + 2
+    while len(target.records) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    handler.flush()
+    assert len(target.records) == 2
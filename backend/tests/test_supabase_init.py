@@ -0,0 +1,67 @@
+import os
+import threading
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import supabaseInit
+
+
+@pytest.fixture
+def built(monkeypatch):
+    # Records client builds; the suite's shared client is put back afterwards
+    clients = []
+
+    def create():
+        clients.append(SimpleNamespace(number=len(clients)))
+        return clients[-1]
+
+    monkeypatch.setattr(supabaseInit, "_client", None)
+    monkeypatch.setattr(supabaseInit, "_client_pid", None)
+    monkeypatch.setattr(supabaseInit, "create_supabase", create)
+    return clients
+
+
+def test_threads_of_one_process_share_one_client(built):
+    barrier = threading.Barrier(8)
+    seen = []
+
+    def first_use():
+        barrier.wait()
+        seen.append(supabaseInit.get_supabase())
+
+    threads = [threading.Thread(target=first_use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1 and all(client is built[0] for client in seen)
+
+
+def test_a_forked_worker_builds_its_own_client(built, monkeypatch):
+    assert supabaseInit.supabase.number == 0
+    monkeypatch.setattr(os, "getpid", lambda: -1)
+    assert supabaseInit.supabase.number == 1
+
+    supabaseInit._forget_client_after_fork()
+    assert supabaseInit.supabase.number == 2
+    assert supabaseInit.supabase.number == 2
+
+
+def test_pool_settings_come_from_the_environment_settings(monkeypatch):
+    monkeypatch.setattr(supabaseInit, "HTTP_MAX_CONNECTIONS", 7)
+    monkeypatch.setattr(supabaseInit, "HTTP_MAX_KEEPALIVE", 3)
+    monkeypatch.setattr(supabaseInit, "HTTP_TIMEOUT", 2.5)
+    monkeypatch.setattr(supabaseInit, "HTTP2", False)
+    settings = supabaseInit._http_settings()
+    assert settings["limits"] == httpx.Limits(
+        max_connections=7, max_keepalive_connections=3, keepalive_expiry=supabaseInit.HTTP_KEEPALIVE_EXPIRY)
+    assert settings["timeout"] == httpx.Timeout(2.5, connect=supabaseInit.HTTP_CONNECT_TIMEOUT)
+    assert settings["http2"] is False
+
+
+def test_an_unknown_backend_is_refused(monkeypatch):
+    monkeypatch.setattr(supabaseInit, "DATA_BACKEND", "mysql")
+    with pytest.raises(ValueError, match="mysql"):
+        supabaseInit.create_supabase()
@@ -0,0 +1,140 @@
+import inspect
+import time
+
+import admission
+import metrics
+import resilience
+
+# Wraps the data client (Supabase or localStore) so every call the routes make goes through
+# one place. Query builders are proxied call-for-call; execute() and auth calls are timed and
+# reported to metrics.record_upstream with the table, operation and number of rows. Each call runs
+# under resilience.py's deadlines, retries (selects only) and circuit breakers, and each attempt it
+# makes holds one of admission.py's upstream slots from the moment it is sent until it returns:
+# not while backing off before a retry, and still after resilience has stopped waiting for it.
+
+OPERATIONS = ("select", "insert", "upsert", "update", "delete")
+
+
+def _in_slot(run):
+    def attempt():
+        with admission.upstream_slot():
+            return run()
+    return attempt
+
+
+def _in_slot_async(run):
+    async def attempt():
+        async with admission.upstream_slot_async():
+            return await run()
+    return attempt
+
+
+def _row_count(response):
+    data = getattr(response, "data", None)
+    if isinstance(data, list):
+        return len(data)
+    return 1 if data else 0
+
+
+class UpstreamQuery:
+    def __init__(self, table, query):
+        self.table = table
+        self.operation = "select"
+        self.calls = []  # (method, args, kwargs) applied to the builder, in order
+        self._query = query
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if not callable(attr):
+            return attr
+
+        def chain(*args, **kwargs):
+            if name in OPERATIONS:
+                self.operation = name
+            self.calls.append((name, args, kwargs))
+            result = attr(*args, **kwargs)
+            # Builders return themselves or a new builder; keep the proxy in front either way
+            if hasattr(result, "execute"):
+                self._query = result
+                return self
+            return result
+        return chain
+
+    def _stale_key(self):
+        # Reads are keyed on the query as built, so identical reads share their last good answer
+        return (self.table, repr(self.calls)) if self.operation == "select" else None
+
+    def execute(self):
+        if inspect.iscoroutinefunction(self._query.execute):
+            return self._execute_async()
+        started = time.perf_counter()
+        try:
+            result = resilience.call(
+                _in_slot(self._query.execute), idempotent=self.operation == "select", stale_key=self._stale_key()
+            )
+        except Exception as e:
+            metrics.record_upstream(self.table, self.operation, time.perf_counter() - started, 0, e)
+            raise
+        metrics.record_upstream(self.table, self.operation, time.perf_counter() - started, _row_count(result))
+        return result
+
+    async def _execute_async(self):
+        started = time.perf_counter()
+        try:
+            result = await resilience.call_async(
+                _in_slot_async(self._query.execute), idempotent=self.operation == "select", stale_key=self._stale_key()
+            )
+        except Exception as e:
+            metrics.record_upstream(self.table, self.operation, time.perf_counter() - started, 0, e)
+            raise
+        metrics.record_upstream(self.table, self.operation, time.perf_counter() - started, _row_count(result))
+        return result
+
+
+class UpstreamAuth:
+    def __init__(self, auth):
+        self._auth = auth
+
+    def __getattr__(self, name):
+        attr = getattr(self._auth, name)
+        if not callable(attr):
+            return attr
+
+        if inspect.iscoroutinefunction(attr):
+            async def call_async(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    result = await resilience.call_async(_in_slot_async(lambda: attr(*args, **kwargs)), upstream="auth")
+                except Exception as e:
+                    metrics.record_upstream("auth", name, time.perf_counter() - started, 0, e)
+                    raise
+                metrics.record_upstream("auth", name, time.perf_counter() - started, 1)
+                return result
+            return call_async
+
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = resilience.call(_in_slot(lambda: attr(*args, **kwargs)), upstream="auth")
+            except Exception as e:
+                metrics.record_upstream("auth", name, time.perf_counter() - started, 0, e)
+                raise
+            metrics.record_upstream("auth", name, time.perf_counter() - started, 1)
+            return result
+        return call
+
+
+class UpstreamClient:
+    def __init__(self, client):
+        self.client = client
+
+    @property
+    def auth(self):
+        # Resolved per use: the underlying client is per process (see supabaseInit.get_supabase)
+        return UpstreamAuth(self.client.auth)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def table(self, name):
+        return UpstreamQuery(name, self.client.table(name))
@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { useLocation, useNavigate } from 'react-router-dom';
 import { Layout, Card, List, Spin, Button, notification, Modal, Form, Input, Select, DatePicker } from 'antd';
+import { fetchAllPages, fetchCompanyDashboard, waitForJob } from './api';
 
 const { Content } = Layout;
 
@@ -28,54 +29,41 @@ const CompanyDetails = () => {
       return;
     }
 
-    const fetchUsers = async () => {
+    // Members and projects for this company arrive together from the dashboard endpoint
+    const fetchDashboard = async () => {
       setLoadingUsers(true);
-      try {
-        const response = await fetch(
-          `http://127.0.0.1:8080/getUsersByCompany?company_name=${company.name}`
-        );
-        const data = await response.json();
-
-        if (response.ok) {
-          setUsers(data.users);
-        } else {
-          throw new Error(data.error || 'Failed to fetch users');
-        }
-      } catch (err) {
-        notification.error({
-          message: 'Error',
-          description: err.message || 'Failed to fetch users',
-        });
-      } finally {
-        setLoadingUsers(false);
-      }
-    };
-
-    const fetchProjects = async () => {
       setLoadingProjects(true);
       try {
-        const response = await fetch(
-          `http://127.0.0.1:8080/getProjectsByCompany?company_name=${company.name}`
-        );
-        const data = await response.json();
+        const { data } = await fetchCompanyDashboard(company.name);
 
-        if (response.ok) {
-          setProjects(data.projects);
-        } else {
-          throw new Error(data.error || 'Failed to fetch projects');
+        // The dashboard holds the first page of each list; the list routes continue from its cursors
+        const companyParam = encodeURIComponent(company.name);
+        const [moreMembers, moreProjects] = await Promise.all([
+          data.members_next_cursor
+            ? fetchAllPages(`http://127.0.0.1:8080/getUsersByCompany?company_name=${companyParam}`, 'users', data.members_next_cursor)
+            : { ok: true, data: { users: [] } },
+          data.projects_next_cursor
+            ? fetchAllPages(`http://127.0.0.1:8080/getProjectsByCompany?company_name=${companyParam}`, 'projects', data.projects_next_cursor)
+            : { ok: true, data: { projects: [] } },
+        ]);
+        if (!moreMembers.ok || !moreProjects.ok) {
+          throw new Error(moreMembers.data.error || moreProjects.data.error || 'Failed to fetch company details');
         }
+        setUsers([...data.members, ...moreMembers.data.users]);
+        setProjects([...data.projects, ...moreProjects.data.projects]);
       } catch (err) {
         notification.error({
           message: 'Error',
-          description: err.message || 'Failed to fetch projects',
+          // axios rejects non-2xx answers; the route's own message is in the response body
+          description: err.response?.data?.error || err.message || 'Failed to fetch company details',
         });
       } finally {
+        setLoadingUsers(false);
         setLoadingProjects(false);
       }
     };
 
-    fetchUsers();
-    fetchProjects();
+    fetchDashboard();
   }, [company, navigate]);
 
   // Handle Modal visibility for User
@@ -101,9 +89,18 @@ const CompanyDetails = () => {
       });
 
       const data = await response.json();
+      if (!response.ok) {
+        throw new Error(data.error || 'Failed to add user');
+      }
+
+      // The users row is written by a background job; wait for its report
+      const job = await waitForJob(data.status_url);
+      if (job.status !== 'succeeded') {
+        throw new Error(job.result?.error || job.error || 'Failed to add user');
+      }
       notification.success({
         message: 'User Added',
-        description: data.message || 'User has been successfully added.',
+        description: 'User has been successfully added.',
       });
 
       setIsUserModalVisible(false); // Close the modal
@@ -159,10 +156,12 @@ const CompanyDetails = () => {
         // After adding project, refetch the project list
         const fetchProjects = async () => {
           try {
-            const response = await fetch(
-              `http://127.0.0.1:8080/getProjectsByCompany?company_name=${company.name}`
+            const { ok, data } = await fetchAllPages(
+              `http://127.0.0.1:8080/getProjectsByCompany?company_name=${encodeURIComponent(company.name)}`, 'projects'
             );
-            const data = await response.json();
+            if (!ok) {
+              throw new Error(data.error || 'Failed to fetch projects');
+            }
             setProjects(data.projects);
           } catch (err) {
             notification.error({
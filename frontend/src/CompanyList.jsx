@@ -2,6 +2,7 @@ import React, { useEffect, useState } from 'react';
 import { Layout, Card, Row, Col, Spin, notification, Modal, Input, Button } from 'antd';
 import { useNavigate } from 'react-router-dom';
 import Sidebar from './Sidebar';
+import { fetchAllPages } from './api';
 
 const { Sider, Content } = Layout;
 
@@ -17,9 +18,8 @@ const CompanyList = () => {
     const fetchCompanies = async () => {
       setLoading(true);
       try {
-        const response = await fetch('http://127.0.0.1:8080/getAllCompanies');
-        const data = await response.json();
-        if (response.ok) {
+        const { ok, data } = await fetchAllPages('http://127.0.0.1:8080/getAllCompanies', 'companies');
+        if (ok) {
           setCompanies(data.companies);
         } 
       } catch (err) {
@@ -3,6 +3,7 @@ import { useLocation, useNavigate } from 'react-router-dom';
 import { Layout, Button, Card, List, Spin, notification, Modal, Select, Input, message } from 'antd';
 import { SendOutlined } from '@ant-design/icons';
 import { useParams } from 'react-router-dom';
+import { fetchAllPages, waitForJob } from './api';
 
 const { Content } = Layout;
 
@@ -42,11 +43,10 @@ const ProjectDetails = () => {
       if (hasFetchedUsers.current) return; // Prevent fetching users again
       setLoading(true);
       try {
-        const response = await fetch(
-          `http://127.0.0.1:8080/getUsersByProject?project_id=${project.id}`
+        const { ok, data } = await fetchAllPages(
+          `http://127.0.0.1:8080/getUsersByProject?project_id=${project.id}`, 'users'
         );
-        const data = await response.json();
-        if (response.ok) {
+        if (ok) {
           setUsers(data.users);
           hasFetchedUsers.current = true;
         } else {
@@ -65,11 +65,10 @@ const ProjectDetails = () => {
     const fetchCompanyUsers = async () => {
       if (hasFetchedCompanyUsers.current) return; // Prevent fetching company users again
       try {
-        const response = await fetch(
-          `http://127.0.0.1:8080/getUsersByCompany?company_name=${project.company}`
+        const { ok, data } = await fetchAllPages(
+          `http://127.0.0.1:8080/getUsersByCompany?company_name=${project.company}`, 'users'
         );
-        const data = await response.json();
-        if (response.ok) {
+        if (ok) {
           const filteredUsers = data.users.filter(
             (user) => !users.some((assignedUser) => assignedUser.id === user.id)
           );
@@ -98,13 +97,11 @@ const ProjectDetails = () => {
         }
     
         // Fetch comments by projectId and userId
-        const response = await fetch(
-          `http://127.0.0.1:8080/getCommentsByProject?project_id=${project.id}&user_id=${userId}`
+        const { ok, data } = await fetchAllPages(
+          `http://127.0.0.1:8080/getCommentsByProject?project_id=${project.id}&user_id=${userId}`, 'comments'
         );
     
-        const data = await response.json();
-    
-        if (response.ok) {
+        if (ok) {
           setMessages(data.comments); // Set the messages state with the fetched comments
           hasFetchedMessages.current = true; // Prevent further fetching
         } else {
@@ -178,20 +175,29 @@ const ProjectDetails = () => {
       });
 
       const data = await response.json();
-
-      if (response.ok) {
-        notification.success({
-          message: 'Users Added',
-          description: 'The users have been added to the project.',
-        });
-        setUsers((prev) => [
-          ...prev,
-          ...allCompanyUsers.filter((user) => selectedUsers.includes(user.id)),
-        ]);
-        setModalVisible(false);
-      } else {
+      if (!response.ok) {
         throw new Error(data.error || 'Failed to add users');
       }
+
+      // The update runs as a background job; wait for its report
+      setModalVisible(false);
+      const job = await waitForJob(data.status_url);
+      if (job.status !== 'succeeded') {
+        throw new Error(job.result?.error || job.error || 'Failed to add users');
+      }
+
+      const addedIds = job.result.updated_users.map((user) => user.id);
+      notification.success({
+        message: 'Users Added',
+        description: job.result.message || 'The users have been added to the project.',
+      });
+      // Users who were already members come back in updated_users too; list them once
+      setUsers((prev) => [
+        ...prev,
+        ...allCompanyUsers.filter(
+          (user) => addedIds.includes(user.id) && !prev.some((member) => member.id === user.id)
+        ),
+      ]);
     } catch (error) {
       notification.error({
         message: 'Error',
@@ -3,6 +3,7 @@ import { Table, Input, Space, Spin, notification, Layout, Modal, Form, Select, B
 import { SearchOutlined, PlusOutlined } from '@ant-design/icons';
 import { useNavigate } from 'react-router-dom';
 import Sidebar from './Sidebar';
+import { fetchAllPages } from './api';
 
 const { Sider, Content } = Layout;
 const { Option } = Select;
@@ -23,10 +24,12 @@ const ProjectList = () => {
     const fetchProjectsAndCompanies = async () => {
       setLoading(true);
       try {
-        const projectResponse = await fetch('http://127.0.0.1:8080/getAllProjects');
-        const companyResponse = await fetch('http://127.0.0.1:8080/getAllCompanies');
-        const projectData = await projectResponse.json();
-        const companyData = await companyResponse.json();
+        const [projectResponse, companyResponse] = await Promise.all([
+          fetchAllPages('http://127.0.0.1:8080/getAllProjects', 'projects'),
+          fetchAllPages('http://127.0.0.1:8080/getAllCompanies', 'companies'),
+        ]);
+        const projectData = projectResponse.data;
+        const companyData = companyResponse.data;
   
         if (projectResponse.ok && companyResponse.ok) {
           // Map company name to each project based on company_id
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { Card, Button, Select, Row, Col, Spin, Layout, Modal, notification, Form, Input } from 'antd';
 import Sidebar from './Sidebar'; // Assuming Sidebar component is in the same folder
 import { useNavigate } from 'react-router-dom';
+import { fetchAllPages, waitForJob } from './api';
 
 const { Sider, Content } = Layout;
 
@@ -53,10 +54,9 @@ export default function Users() {
   
       setLoading(true);
       const apiUrl = `http://127.0.0.1:8080/getUsersByCompany?company_name=${selectedCompany}`;
-      const response = await fetch(apiUrl);
-      const data = await response.json();
+      const { ok, data } = await fetchAllPages(apiUrl, 'users');
   
-      if (response.ok) {
+      if (ok) {
         setUsers(data.users);
         if (data.users.length === 0) {
           notification.warning({
@@ -115,9 +115,18 @@ export default function Users() {
       });
 
       const data = await response.json();
+      if (!response.ok) {
+        throw new Error(data.error || 'Failed to add user');
+      }
+
+      // The users row is written by a background job; wait for its report
+      const job = await waitForJob(data.status_url);
+      if (job.status !== 'succeeded') {
+        throw new Error(job.result?.error || job.error || 'Failed to add user');
+      }
       notification.success({
         message: 'Form Submitted',
-        description: data.message || 'User has been successfully added.',
+        description: 'User has been successfully added.',
       });
       setIsModalVisible(false); // Close the modal
       form.resetFields(); // Reset form fields after submission
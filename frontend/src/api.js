@@ -14,3 +14,54 @@ export const fetchUsersByCompany = (companyName) => {
 export const fetchUserDetails = (userId) => {
   return api.get(`/getUser?user_id=${userId}`);
 };
+
+// API request for a company's projects (with comment counts) and members in one round trip
+export const fetchCompanyDashboard = (companyName) => {
+  return api.get(`/dashboard/${encodeURIComponent(companyName)}`);
+};
+
+// The backend's largest page (PAGE_SIZE_MAX). Walking a list in pages this size keeps a whole walk
+// inside the list routes' rate-limit bursts, which the default page size of 100 would not.
+export const PAGE_SIZE_MAX = 1000;
+
+// Fetches every page of a list route by following next_cursor, optionally continuing from `cursor`.
+// Resolves like fetch: { ok, data }, where data is the first page's body with `key` holding the rows
+// of all pages, or the failing page's error body.
+export const fetchAllPages = async (url, key, cursor = null) => {
+  const rows = [];
+  let first = null;
+  do {
+    const pageUrl = new URL(url);
+    if (!pageUrl.searchParams.has('limit')) {
+      pageUrl.searchParams.set('limit', PAGE_SIZE_MAX);
+    }
+    if (cursor) {
+      pageUrl.searchParams.set('cursor', cursor);
+    }
+    const response = await fetch(pageUrl);
+    const data = await response.json();
+    if (!response.ok) {
+      return { ok: false, data };
+    }
+    first = first || data;
+    rows.push(...(data[key] || []));
+    cursor = data.next_cursor;
+  } while (cursor);
+  return { ok: true, data: { ...first, [key]: rows, next_cursor: null } };
+};
+
+// Polls a background job (the status_url of a 202 response) until it has finished, giving up
+// after timeoutMs; the job may still finish on the server after that
+export const waitForJob = async (statusUrl, { intervalMs = 500, timeoutMs = 60000 } = {}) => {
+  const deadline = Date.now() + timeoutMs;
+  for (;;) {
+    const { data } = await api.get(statusUrl);
+    if (data.status !== 'queued' && data.status !== 'running') {
+      return data;
+    }
+    if (Date.now() + intervalMs > deadline) {
+      throw new Error('Still working on it. Refresh in a moment to see the result.');
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+};